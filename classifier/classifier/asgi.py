@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'classifier.settings')
 
 application = get_asgi_application()
+
+# Run representative shapes through the model before accepting traffic
+from core.warmup import start_model_watcher, warm_up_classifier  # noqa: E402
+
+warm_up_classifier()
+start_model_watcher()
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -27,6 +28,8 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+TESTING = sys.argv[1:2] == ['test']
+
 
 # Application definition
 
@@ -81,6 +84,67 @@ AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Request profiling for /api/classify/ (see core.profiling)
+CLASSIFY_PROFILE_ENABLED = False
+CLASSIFY_PROFILE_SAMPLE_RATE = 0.01  # Fraction of requests fully profiled
+CLASSIFY_PROFILE_SLOW_MS = 1000  # Keep stack samples of requests slower than this
+CLASSIFY_PROFILE_DIR = BASE_DIR / 'profiles'
+CLASSIFY_PROFILE_MAX_FILES = 200
+
+# Classification
+CLASSIFY_MAX_CHUNKS = 8  # Chunks evaluated per request; longer pages are finished in the background
+CLASSIFY_DEADLINE_MS = 1500  # Per-request budget; clients may ask for less via X-Request-Deadline-Ms
+CLASSIFY_MAX_TOKENS = 16384  # Tokens read from one page; the rest is ignored to bound worker memory
+CLASSIFY_LOW_CONFIDENCE = 0.6  # Results below this are queued for reclassification
+CLASSIFY_RESULT_MAX_AGE_DAYS = 30  # Automatic results older than this are revisited
+RECLASSIFY_MAX_TEXT_LENGTH = 200000
+RECLASSIFY_MAX_CHUNKS = 64  # Chunks a background reclassification may evaluate, bounding one page's inference time
+CLASSIFY_CLIENT_CACHE_SECONDS = 900  # max-age hint for extension-side caching of verdicts
+CLASSIFY_CLIENT_CACHE_PROVISIONAL_SECONDS = 60  # Shorter hint while a better verdict is pending
+CLASSIFY_MAX_BODY_BYTES = 2 * 1024 * 1024  # Limit on decompressed classify request bodies
+CLASSIFY_FALLBACK_MAX_IN_FLIGHT = 4  # Concurrent full-model predictions before using the fallback model
+CLASSIFY_FALLBACK_LATENCY_MS = 2000  # Or when the oldest running prediction exceeds this
+CLASSIFY_MAX_CONCURRENT = 16  # Inferences per worker before answering 429; None for no cap
+
+# Per-device token bucket on /api/classify/
+CLASSIFY_RATE_LIMIT = 2  # Tokens per second; None disables rate limiting
+CLASSIFY_RATE_BURST = 20  # Bucket size
+CLASSIFY_RATE_LIMIT_CACHE = None  # Django cache alias to share buckets across workers; None keeps them in memory
+# 'model' serves the fine-tuned weights; 'stand-in' serves ml_model/standin.py, which needs no weights
+CLASSIFIER_BACKEND = os.environ.get('CLASSIFIER_BACKEND', 'stand-in' if TESTING else 'model')
+CLASSIFIER_STAND_IN_MS_PER_TOKEN = 0  # Simulated inference cost of the stand-in
+CLASSIFIER_WARMUP_ENABLED = True  # Warm the model up when a worker boots
+CLASSIFIER_WARMUP_ROUNDS = 2
+MODEL_RELOAD_POLL_INTERVAL = 30  # Seconds between checks of ml_model/versions/CURRENT; None disables hot reload
+
+# In-process cache of device id / token → user lookups (see core.identity)
+IDENTITY_CACHE_SIZE = 10000
+IDENTITY_CACHE_TTL = 300  # Seconds; bounds staleness across workers
+
+# Device fingerprint writes (see User.update_device_metadata)
+DEVICE_METADATA_MIN_INTERVAL = 300  # Seconds between writes for one user
+DEVICE_METADATA_DEFERRED = False  # Batch writes in a background flush thread
+DEVICE_METADATA_FLUSH_INTERVAL = 10
+
+# In-process cache of per-user allowed categories (see core.policy)
+POLICY_CACHE_SIZE = 10000
+POLICY_CACHE_TTL = 300  # Seconds; bounds staleness across workers
+
+# Dashboard
+BLOCKED_DOMAINS_PAGE_SIZE = 50
+
+# Blocked domain retention (prune_blocked_domains); manual blocks are never pruned
+BLOCKED_DOMAIN_RETENTION_DAYS = 180  # Days to keep automatic blocks; None keeps them all
+BLOCKED_DOMAIN_MAX_PER_USER = 5000  # Newest automatic blocks kept per user; None for no cap
+
+# Classification audit log
+CLASSIFICATION_AUDIT_ENABLED = True
+CLASSIFICATION_AUDIT_BACKEND = 'database'  # 'database' or 'jsonl' (gzipped files in CLASSIFICATION_AUDIT_DIR)
+CLASSIFICATION_AUDIT_DIR = BASE_DIR / 'audit'
+CLASSIFICATION_AUDIT_BUFFER_SIZE = 10000  # Events held in memory; extras are dropped and counted
+CLASSIFICATION_AUDIT_FLUSH_INTERVAL = 5  # Seconds between bulk writes
+CLASSIFICATION_ROLLUPS_ENABLED = True  # Maintain hourly/daily counts as events are flushed
+
 # Session Settings
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = True  # Requires HTTPS
@@ -116,6 +180,10 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+if TESTING:
+    # Test users don't need slow, secure hashes
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -146,6 +214,6 @@ LOGOUT_REDIRECT_URL = 'login'
 # API Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.auth_backend.CachedTokenAuthentication',
     ]
 }
\ No newline at end of file
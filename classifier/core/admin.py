@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, WebCategory, UserAllowedCategory, BlockedDomain
+from .models import (
+    User, WebCategory, UserAllowedCategory, BlockedDomain, DomainClassification, ReclassificationTask,
+    PolicyGroup, PolicyGroupBlockedDomain, ClassificationEvent,
+    ClassificationRollup
+)
 from django.utils.translation import gettext_lazy as _
 
 class CustomUserAdmin(UserAdmin):
@@ -11,14 +15,19 @@ class CustomUserAdmin(UserAdmin):
             'fields': ('uuid', 'hashed_mac', 'requires_device_auth'),
             'classes': ('collapse',),
         }),
+        (_('Policy'), {
+            'fields': ('policy_group',),
+            'classes': ('collapse',),
+        }),
         (_('Permissions'), {
             'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions'),
             'classes': ('collapse',),
         }),
         (_('Important dates'), {'fields': ('last_login', 'date_joined')}),
     )
-    list_display = ('username', 'email', 'uuid', 'is_staff', 'requires_device_auth')
-    list_filter = ('is_staff', 'is_superuser', 'is_active', 'requires_device_auth')
+    list_display = ('username', 'email', 'uuid', 'policy_group', 'is_staff', 'requires_device_auth')
+    list_filter = ('is_staff', 'is_superuser', 'is_active', 'requires_device_auth', 'policy_group')
+    list_select_related = ('policy_group',)
     search_fields = ('username', 'first_name', 'last_name', 'email', 'uuid')
     readonly_fields = ('uuid',)
 
@@ -28,10 +37,11 @@ class WebCategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}  # Add slug field if needed
 
 class UserAllowedCategoryAdmin(admin.ModelAdmin):
-    list_display = ('user', 'category', 'created_at')
-    list_filter = ('category',)
+    list_display = ('user', 'category', 'is_allowed', 'created_at')
+    list_filter = ('category', 'is_allowed')
     search_fields = ('user__username', 'category__name')
     raw_id_fields = ('user',)
+    list_select_related = ('user', 'category')
 
 class BlockedDomainAdmin(admin.ModelAdmin):
     list_display = ('user', 'domain', 'original_category', 'blocked_at')
@@ -39,12 +49,64 @@ class BlockedDomainAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'domain', 'original_category__name')
     raw_id_fields = ('user',)
     date_hierarchy = 'blocked_at'
+    list_select_related = ('user', 'original_category')
+
+class DomainClassificationAdmin(admin.ModelAdmin):
+    list_display = ('domain', 'category', 'confidence', 'model_version', 'classified_at')
+    list_filter = ('category', 'model_version')
+    search_fields = ('domain',)
+    list_select_related = ('category',)
+
+class ReclassificationTaskAdmin(admin.ModelAdmin):
+    list_display = ('domain', 'reason', 'status', 'attempts', 'enqueued_at', 'updated_at')
+    list_filter = ('status', 'reason')
+    search_fields = ('domain',)
+    exclude = ('text_content',)
+
+class PolicyGroupBlockedDomainInline(admin.TabularInline):
+    model = PolicyGroupBlockedDomain
+    extra = 1
+
+class PolicyGroupAdmin(admin.ModelAdmin):
+    list_display = ('name', 'description', 'updated_at')
+    search_fields = ('name',)
+    filter_horizontal = ('allowed_categories',)
+    inlines = [PolicyGroupBlockedDomainInline]
+
+class ClassificationEventAdmin(admin.ModelAdmin):
+    list_display = ('domain', 'user_id', 'category', 'decision', 'source', 'confidence', 'latency_ms', 'created_at')
+    list_filter = ('decision', 'source', 'cache_hit')
+    search_fields = ('domain',)
+    date_hierarchy = 'created_at'
+    show_full_result_count = False  # Avoid COUNT(*) over the whole log
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class ClassificationRollupAdmin(admin.ModelAdmin):
+    list_display = ('period', 'period_start', 'user_id', 'category', 'count', 'blocked_count')
+    list_filter = ('period', 'category')
+    date_hierarchy = 'period_start'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 # Register your models here
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(WebCategory, WebCategoryAdmin)
 admin.site.register(UserAllowedCategory, UserAllowedCategoryAdmin)
 admin.site.register(BlockedDomain, BlockedDomainAdmin)
+admin.site.register(DomainClassification, DomainClassificationAdmin)
+admin.site.register(ReclassificationTask, ReclassificationTaskAdmin)
+admin.site.register(PolicyGroup, PolicyGroupAdmin)
+admin.site.register(ClassificationEvent, ClassificationEventAdmin)
+admin.site.register(ClassificationRollup, ClassificationRollupAdmin)
 
 # Optional: Customize admin site header
 admin.site.site_header = "Website Classifier Administration"
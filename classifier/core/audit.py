@@ -0,0 +1,137 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import ClassificationEvent
+from .rollups import apply_events
+
+logger = logging.getLogger(__name__)
+
+EVENT_FIELDS = (
+    'user_id', 'domain', 'category', 'confidence', 'decision', 'source',
+    'cache_hit', 'latency_ms', 'model_version', 'created_at'
+)
+
+
+class ClassificationAuditLog:
+    """Buffer classification events in memory and append them in bulk.
+
+    The buffer is bounded; when it is full new events are dropped and
+    counted rather than slowing the request path down.
+    """
+
+    def __init__(self, backend: str, max_events: int, interval: float,
+                 batch_size: int = 1000, directory=None):
+        self.backend = backend
+        self.max_events = max_events
+        self.interval = interval
+        self.batch_size = batch_size
+        self.directory = Path(directory) if directory else None
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def record(self, **event):
+        event.setdefault('created_at', timezone.now())
+        with self._lock:
+            if len(self._pending) >= self.max_events:
+                self.dropped += 1
+                return
+            self._pending.append(event)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='classification-audit-flush',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                events, self._pending = list(self._pending), deque()
+            if not events:
+                return 0
+            try:
+                if self.backend == 'jsonl':
+                    self._write_jsonl(events)
+                else:
+                    self._write_database(events)
+            except Exception:
+                self.failed += len(events)
+                raise
+            self.written += len(events)
+            if getattr(settings, 'CLASSIFICATION_ROLLUPS_ENABLED', True):
+                try:
+                    apply_events(events)
+                except Exception as e:
+                    logger.error(f"Classification rollup update failed: {str(e)}")
+            return len(events)
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._pending),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed
+        }
+
+    def _write_database(self, events):
+        ClassificationEvent.objects.bulk_create(
+            [ClassificationEvent(**event) for event in events],
+            batch_size=self.batch_size
+        )
+
+    def _write_jsonl(self, events):
+        # One file per process and hour; closed files can be shipped or deleted freely
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"classifications-{timezone.now():%Y%m%d%H}-{os.getpid()}.jsonl.gz"
+        with gzip.open(path, 'at') as f:
+            for event in events:
+                row = {field: event.get(field) for field in EVENT_FIELDS}
+                row['created_at'] = row['created_at'].isoformat()
+                f.write(json.dumps(row) + '\n')
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self._safe_flush()
+
+    def _safe_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Classification audit flush failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+audit_log = ClassificationAuditLog(
+    backend=getattr(settings, 'CLASSIFICATION_AUDIT_BACKEND', 'database'),
+    max_events=getattr(settings, 'CLASSIFICATION_AUDIT_BUFFER_SIZE', 10000),
+    interval=getattr(settings, 'CLASSIFICATION_AUDIT_FLUSH_INTERVAL', 5),
+    directory=getattr(settings, 'CLASSIFICATION_AUDIT_DIR', None)
+)
+
+# Write whatever is buffered when the worker shuts down
+atexit.register(audit_log._safe_flush)
+
+
+def record_classification(**event):
+    """Queue an audit event unless auditing is disabled"""
+    if getattr(settings, 'CLASSIFICATION_AUDIT_ENABLED', True):
+        audit_log.record(**event)
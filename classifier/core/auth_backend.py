@@ -1,5 +1,9 @@
 from django.contrib.auth.backends import ModelBackend
 from django.core.exceptions import PermissionDenied
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
 from .models import User
 import logging
 
@@ -28,4 +32,18 @@ class DeviceAwareAuthBackend(ModelBackend):
         if request:
             user.update_device_metadata(request)
             
-        return user
\ No newline at end of file
+        return user
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """DRF token authentication resolved through the in-process identity cache"""
+
+    def authenticate_credentials(self, key):
+        from .identity import get_identity_by_token
+
+        identity = get_identity_by_token(key)
+        if identity is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not identity.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (identity.as_user(), Token(key=key, user_id=identity.id))
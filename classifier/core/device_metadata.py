@@ -0,0 +1,63 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+class DeferredMetadataWriter:
+    """Coalesce device metadata writes and flush them in bulk from a thread"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def queue(self, user_id: int, metadata: dict):
+        with self._lock:
+            # Only the newest fingerprint per user is ever written
+            self._pending[user_id] = metadata
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='device-metadata-flush',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        users = [User(pk=user_id, device_metadata=metadata) for user_id, metadata in pending.items()]
+        User.objects.bulk_update(users, ['device_metadata'], batch_size=500)
+        return len(users)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self._safe_flush()
+
+    def _safe_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Device metadata flush failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+metadata_writer = DeferredMetadataWriter(
+    getattr(settings, 'DEVICE_METADATA_FLUSH_INTERVAL', 10)
+)
+
+# Don't lose queued fingerprints when the worker shuts down
+atexit.register(metadata_writer._safe_flush)
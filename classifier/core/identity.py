@@ -0,0 +1,107 @@
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .cache import TTLCache
+from .models import User
+
+
+class CachedIdentity(NamedTuple):
+    """Lightweight user record used to resolve API callers"""
+    id: int
+    username: str
+    is_active: bool
+    # Read by DRF permission checks such as IsAdminUser
+    is_staff: bool
+    is_superuser: bool
+    requires_device_auth: bool
+    hashed_mac: Optional[str]
+
+    def as_user(self) -> User:
+        """Build a User with only these fields loaded; others load on access"""
+        # from_db expects values in the model's field order
+        values = self._asdict()
+        fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+        return User.from_db('default', fields, [values[field] for field in fields])
+
+
+IDENTITY_FIELDS = list(CachedIdentity._fields)
+
+
+class IdentityCache(TTLCache):
+    """Bounded LRU with TTL mapping device ids and token keys to users"""
+
+    def __init__(self, max_size: int, ttl: float):
+        super().__init__(max_size, ttl)
+        self._keys_by_user = {}
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def _added(self, key, identity):
+        self._keys_by_user.setdefault(identity.id, set()).add(key)
+
+    def _remove(self, key):
+        entry = super()._remove(key)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[1].id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[1].id]
+        return entry
+
+
+identity_cache = IdentityCache(
+    max_size=getattr(settings, 'IDENTITY_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'IDENTITY_CACHE_TTL', 300)
+)
+
+
+def get_identity_by_device(device_id: str) -> CachedIdentity:
+    """Resolve a device id, raising User.DoesNotExist for unknown devices"""
+    key = ('device', device_id)
+    identity = identity_cache.get(key)
+    if identity is None:
+        values = User.objects.filter(device_id=device_id).values_list(*IDENTITY_FIELDS).first()
+        if values is None:
+            raise User.DoesNotExist(f"No user with device_id {device_id}")
+        identity = CachedIdentity(*values)
+        identity_cache.set(key, identity)
+    return identity
+
+
+def get_identity_by_token(key: str) -> Optional[CachedIdentity]:
+    """Resolve an API token key, returning None for unknown keys"""
+    cache_key = ('token', key)
+    identity = identity_cache.get(cache_key)
+    if identity is None:
+        values = Token.objects.filter(key=key).values_list(
+            *[f'user__{field}' for field in IDENTITY_FIELDS]
+        ).first()
+        if values is None:
+            return None
+        identity = CachedIdentity(*values)
+        identity_cache.set(cache_key, identity)
+    return identity
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_identity(sender, instance=None, update_fields=None, **kwargs):
+    # Covers rotate_identifiers, which saves the user; partial saves of
+    # unrelated fields (last_login, device_metadata) keep the entry
+    if update_fields and not set(update_fields) & {'device_id', *IDENTITY_FIELDS}:
+        return
+    identity_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_identity(sender, instance=None, **kwargs):
+    identity_cache.invalidate(('token', instance.key))
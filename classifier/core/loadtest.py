@@ -0,0 +1,179 @@
+"""Synthetic extension traffic for capacity testing classify_website.
+
+A Workload picks (device, domain) pairs with Zipf-distributed domain
+popularity and gives each domain a deterministic page whose length follows
+a log-normal distribution. run_stage drives it the way the extension does
+(precheck, then classify when content is needed) from a fixed number of
+closed-loop clients; summarize and find_saturation turn the samples into
+a throughput/latency curve.
+"""
+import bisect
+import gzip
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+SYNTHETIC_DOMAIN_PREFIX = 'loadtest-'
+PAGE_CACHE_SIZE = 2048
+
+
+def synthetic_domains(count: int) -> list:
+    """Domains ordered from most to least popular"""
+    return [f"{SYNTHETIC_DOMAIN_PREFIX}site{rank}.com" for rank in range(1, count + 1)]
+
+
+class Workload:
+    """Request mix: who asks about which domain, and what the page looks like"""
+
+    def __init__(self, domains: list, device_ids: list, zipf: float = 1.1,
+                 median_words: int = 1200, sigma: float = 1.0, max_words: int = 50000, seed: int = 0):
+        self.domains = domains
+        self.device_ids = device_ids
+        self.median_words = median_words
+        self.sigma = sigma
+        self.max_words = max_words
+        self.seed = seed
+        self._cumulative = list(itertools.accumulate(1 / rank ** zipf for rank in range(1, len(domains) + 1)))
+        vocabulary_rng = random.Random(seed)
+        self._vocabulary = [
+            ''.join(vocabulary_rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(vocabulary_rng.randint(2, 10)))
+            for _ in range(20000)
+        ]
+        self._pages = OrderedDict()
+        self._pages_lock = threading.Lock()
+
+    def next_request(self, rng: random.Random) -> tuple:
+        """(device_id, domain) for the next page view"""
+        index = bisect.bisect_left(self._cumulative, rng.random() * self._cumulative[-1])
+        return rng.choice(self.device_ids), self.domains[min(index, len(self.domains) - 1)]
+
+    def page(self, domain: str) -> dict:
+        """Compact payload the extension would send for this domain, always the same"""
+        with self._pages_lock:
+            if domain in self._pages:
+                self._pages.move_to_end(domain)
+                return self._pages[domain]
+        page = self._build_page(domain)
+        with self._pages_lock:
+            self._pages[domain] = page
+            while len(self._pages) > PAGE_CACHE_SIZE:
+                self._pages.popitem(last=False)
+        return page
+
+    def _build_page(self, domain: str) -> dict:
+        rng = random.Random(f"{self.seed}:{domain}")
+        words = min(self.max_words, max(20, int(rng.lognormvariate(math.log(self.median_words), self.sigma))))
+        # Each site draws mostly from its own slice of the vocabulary
+        topic = rng.sample(self._vocabulary, 300)
+        text = [rng.choice(topic) if rng.random() < 0.7 else rng.choice(self._vocabulary) for _ in range(words)]
+        return {
+            'title': ' '.join(text[:6]),
+            'description': ' '.join(text[6:30]),
+            'headings': [' '.join(text[i:i + 4]) for i in range(30, min(words, 70), 8)],
+            'text': ' '.join(text)
+        }
+
+
+def _view_page(base_url: str, workload: Workload, rng: random.Random, timeout: float) -> dict:
+    """One page view: precheck, then classify if the server needs the content"""
+    device_id, domain = workload.next_request(rng)
+    started = time.perf_counter()
+    sample = {'domain': domain, 'classified': False}
+    try:
+        body = gzip.compress(json.dumps({'domain': domain, 'device_id': device_id}).encode())
+        status, need_content = _request(f"{base_url}/api/classify/precheck/", body, timeout)
+        if status == 200 and need_content:
+            payload = dict(workload.page(domain), domain=domain, device_id=device_id)
+            classify_started = time.perf_counter()
+            status, _ = _request(f"{base_url}/api/classify/", gzip.compress(json.dumps(payload).encode()), timeout)
+            sample['classified'] = True
+            sample['classify_ms'] = (time.perf_counter() - classify_started) * 1000
+        sample['status'] = status
+    except OSError:
+        # Timeouts and refused connections
+        sample['status'] = 0
+    sample['latency_ms'] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+def _request(url: str, body: bytes, timeout: float) -> tuple:
+    """(status, need_content) of a gzip-encoded JSON POST"""
+    request = urllib.request.Request(url, data=body, headers={
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'gzip'
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read()).get('need_content', False)
+    except urllib.error.HTTPError as e:
+        e.close()
+        return e.code, False
+
+
+def run_stage(base_url: str, workload: Workload, concurrency: int, seconds: float,
+              seed: int = 0, timeout: float = 30) -> list:
+    """Page-view samples from `concurrency` clients looping for `seconds`"""
+    samples = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def client(index):
+        rng = random.Random(f"{seed}:{concurrency}:{index}")
+        while time.monotonic() < stop_at:
+            sample = _view_page(base_url, workload, rng, timeout)
+            with lock:
+                samples.append(sample)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(float(p50), 1), 'p95': round(float(p95), 1), 'p99': round(float(p99), 1)}
+
+
+def summarize(samples: list, concurrency: int, seconds: float) -> dict:
+    """Throughput, latency percentiles and error rates of one stage"""
+    ok = [s for s in samples if s['status'] == 200]
+    limited = sum(1 for s in samples if s['status'] == 429)
+    return {
+        'concurrency': concurrency,
+        'page_views': len(samples),
+        'throughput_rps': round(len(ok) / seconds, 2),
+        'classified_share': round(sum(s['classified'] for s in samples) / len(samples), 3) if samples else 0,
+        'latency_ms': _percentiles([s['latency_ms'] for s in ok]),
+        'classify_ms': _percentiles([s['classify_ms'] for s in ok if 'classify_ms' in s]),
+        'rejected_rate': round(limited / len(samples), 4) if samples else 0,
+        'error_rate': round((len(samples) - len(ok) - limited) / len(samples), 4) if samples else 0,
+        # 0 stands for timeouts and refused connections
+        'statuses': dict(Counter(s['status'] for s in samples))
+    }
+
+
+def find_saturation(stages: list, min_gain: float = 0.1, max_error_rate: float = 0.01) -> int:
+    """Concurrency beyond which throughput stops growing, or None if it never does.
+
+    A stage saturates when it adds less than min_gain throughput over the
+    previous one, or when errors and rejections exceed max_error_rate.
+    """
+    for previous, stage in zip(stages, stages[1:]):
+        if stage['error_rate'] + stage['rejected_rate'] > max_error_rate:
+            return previous['concurrency']
+        if stage['throughput_rps'] < previous['throughput_rps'] * (1 + min_gain):
+            return previous['concurrency']
+    return None
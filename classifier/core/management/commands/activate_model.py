@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Paths only: importing ml_model.classifier would load the served model
+from ml_model import paths
+
+
+class Command(BaseCommand):
+    help = (
+        "Point ml_model/versions/CURRENT at a model directory. Running workers "
+        "load and warm the new version alongside the old one, then switch "
+        "without dropping requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help="Directory under ml_model/versions to serve")
+        parser.add_argument('--list', action='store_true', help="List available versions")
+
+    def handle(self, *args, **options):
+        current = paths.current_model_paths()[0]
+        if options['list'] or not options['name']:
+            versions = sorted(
+                entry.name for entry in os.scandir(paths.MODEL_VERSIONS_DIR) if entry.is_dir()
+            ) if os.path.isdir(paths.MODEL_VERSIONS_DIR) else []
+            for name in versions:
+                self.stdout.write(f"{'*' if name == current else ' '} {name}")
+            if not versions:
+                self.stdout.write(f"No versions in {paths.MODEL_VERSIONS_DIR}; serving {current}")
+            return
+
+        name = options['name']
+        model_dir = os.path.join(paths.MODEL_VERSIONS_DIR, name)
+        for required in ('config.json', 'label_encoder.joblib'):
+            if not os.path.exists(os.path.join(model_dir, required)):
+                raise CommandError(f"{model_dir} has no {required}")
+        if not paths.weight_files(model_dir):
+            raise CommandError(
+                f"{model_dir} has no weight files ({', '.join(paths.WEIGHT_FILE_SUFFIXES)})"
+            )
+
+        # Write then rename so workers never read a half-written pointer
+        with tempfile.NamedTemporaryFile('w', dir=paths.MODEL_VERSIONS_DIR, delete=False) as f:
+            f.write(name + '\n')
+        os.replace(f.name, paths.CURRENT_VERSION_FILE)
+        self.stdout.write(self.style.SUCCESS(
+            f"Activated {name} (was {current}); workers switch on their next version check"
+        ))
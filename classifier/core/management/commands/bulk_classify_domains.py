@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import DomainClassification
+from core.utils import extract_main_domain, get_or_create_category
+from ml_model.classifier import classifier
+
+
+class Command(BaseCommand):
+    help = (
+        "Populate the domain classification index from local text dumps. "
+        "Each domain is read from <dumps-dir>/<domain>.txt; domains already "
+        "indexed by the current model version are skipped, so the job can be "
+        "interrupted and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('domains_file', help="File with one domain per line")
+        parser.add_argument('--dumps-dir', required=True, help="Directory of <domain>.txt page dumps")
+        parser.add_argument('--workers', type=int, default=4, help="Parallel classification threads")
+        parser.add_argument('--batch-size', type=int, default=100, help="Results written per transaction")
+        parser.add_argument('--force', action='store_true', help="Reclassify already indexed domains")
+
+    def handle(self, *args, **options):
+        dumps_dir = Path(options['dumps_dir'])
+        if not dumps_dir.is_dir():
+            raise CommandError(f"Dumps directory {dumps_dir} does not exist")
+
+        with open(options['domains_file']) as f:
+            domains = list(dict.fromkeys(
+                extract_main_domain(line.strip()) for line in f if line.strip()
+            ))
+
+        if not options['force']:
+            done = set(
+                DomainClassification.objects.filter(
+                    domain__in=domains,
+                    model_version=classifier.model_version
+                ).values_list('domain', flat=True)
+            )
+            domains = [domain for domain in domains if domain not in done]
+
+        self.stdout.write(f"Classifying {len(domains)} domains with model {classifier.model_version}")
+        categories = {}
+        pending = []
+        stats = {'classified': 0, 'missing': 0, 'failed': 0}
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for domain, result in executor.map(lambda d: (d, self._classify(dumps_dir, d)), domains):
+                if result is None:
+                    stats['missing'] += 1
+                    continue
+                if 'error' in result:
+                    stats['failed'] += 1
+                    self.stderr.write(f"{domain}: {result['error']}")
+                    continue
+
+                name = result['category']
+                if name not in categories:
+                    categories[name] = get_or_create_category(name)
+                pending.append(DomainClassification(
+                    domain=domain,
+                    category=categories[name],
+                    confidence=result['confidence'],
+                    model_version=result['model_version'],
+                    classified_at=timezone.now()
+                ))
+                stats['classified'] += 1
+
+                if len(pending) >= options['batch_size']:
+                    self._flush(pending)
+
+        self._flush(pending)
+        self.stdout.write(self.style.SUCCESS(
+            "Done: " + ", ".join(f"{key}={value}" for key, value in stats.items())
+        ))
+
+    def _classify(self, dumps_dir, domain):
+        path = dumps_dir / f"{domain}.txt"
+        if not path.exists():
+            return None
+        return classifier.predict(path.read_text(errors='ignore'))
+
+    def _flush(self, pending):
+        """Upsert a batch so completed work survives an interruption"""
+        if not pending:
+            return
+        DomainClassification.objects.bulk_create(
+            pending,
+            update_conflicts=True,
+            unique_fields=['domain'],
+            update_fields=['category', 'confidence', 'model_version', 'classified_at']
+        )
+        self.stdout.write(f"  indexed {len(pending)} domains")
+        pending.clear()
@@ -0,0 +1,197 @@
+import json
+import random
+import threading
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import transaction
+
+from core import loadtest
+from core.audit import audit_log
+from core.models import (
+    ClassificationEvent, ClassificationRollup, DomainClassification, ReclassificationTask,
+    User, UserAllowedCategory
+)
+from core.utils import extract_main_domain, get_or_create_category
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay synthetic extension traffic against /api/classify/ at rising "
+        "concurrency and report throughput, latency and the saturation point. "
+        "By default the app is served in this process, with temporary users "
+        "that are removed afterwards; --stand-in swaps the model for a "
+        "deterministic one that costs a fixed time per token. The extension's "
+        "own result cache is not simulated: the mix is what reaches the server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server instead of an in-process one")
+        parser.add_argument('--devices-file', help="Device ids to use with --url, one per line")
+        parser.add_argument('--devices', type=int, default=200, help="Temporary devices to create in-process")
+        parser.add_argument('--domains', type=int, default=5000, help="Number of synthetic domains")
+        parser.add_argument('--domains-file', help="Real domains, most popular first, instead of synthetic ones")
+        parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of domain popularity")
+        parser.add_argument('--median-words', type=int, default=1200, help="Median page length in words")
+        parser.add_argument('--max-words', type=int, default=50000, help="Longest page sent")
+        parser.add_argument('--ramp', default='1,2,4,8,16,32', help="Comma-separated client counts, one stage each")
+        parser.add_argument('--stage-seconds', type=float, default=20, help="Duration of each stage")
+        parser.add_argument('--warmup-seconds', type=float, default=10,
+                            help="Unreported traffic first, so popular domains are indexed as in production")
+        parser.add_argument('--stand-in', action='store_true',
+                            help="Serve the deterministic stand-in model; set CLASSIFIER_BACKEND=stand-in "
+                                 "as well to skip loading the real weights")
+        parser.add_argument('--ms-per-token', type=float, default=0.05, help="Simulated stand-in cost")
+        parser.add_argument('--no-rate-limit', action='store_true', help="Disable the per-device rate limit in-process")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--report', help="Write the stage summaries as JSON to this path")
+
+    def handle(self, *args, **options):
+        ramp = [int(value) for value in options['ramp'].split(',') if value.strip()]
+        if options['url'] and (options['stand_in'] or options['no_rate_limit']):
+            raise CommandError("--stand-in and --no-rate-limit only apply to the in-process server")
+        if options['url'] and not options['devices_file']:
+            raise CommandError("--url needs --devices-file with device ids registered on that server")
+
+        if options['domains_file']:
+            with open(options['domains_file']) as f:
+                domains = [line.strip() for line in f if line.strip()]
+        else:
+            domains = loadtest.synthetic_domains(options['domains'])
+
+        server = users = snapshot = None
+        try:
+            if options['url']:
+                base_url = options['url'].rstrip('/')
+                with open(options['devices_file']) as f:
+                    device_ids = [line.strip() for line in f if line.strip()]
+            else:
+                snapshot = self._snapshot(domains)
+                server, base_url = self._start_server(options)
+                users = self._create_users(options['devices'], options['seed'])
+                device_ids = [user.device_id for user in users]
+
+            workload = loadtest.Workload(
+                domains, device_ids,
+                zipf=options['zipf'],
+                median_words=options['median_words'],
+                max_words=options['max_words'],
+                seed=options['seed']
+            )
+            if options['warmup_seconds']:
+                loadtest.run_stage(base_url, workload, ramp[0], options['warmup_seconds'], options['seed'] - 1)
+            stages = []
+            self.stdout.write(f"{'clients':>7} {'views':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+                              f"{'p99 ms':>8} {'classify p95':>12} {'429 %':>6} {'err %':>6}")
+            for concurrency in ramp:
+                samples = loadtest.run_stage(base_url, workload, concurrency, options['stage_seconds'], options['seed'])
+                stage = loadtest.summarize(samples, concurrency, options['stage_seconds'])
+                stages.append(stage)
+                latency, classify = stage['latency_ms'], stage['classify_ms']
+                self.stdout.write(
+                    f"{concurrency:>7} {stage['page_views']:>7} {stage['throughput_rps']:>8} "
+                    f"{latency['p50'] or '-':>8} {latency['p95'] or '-':>8} {latency['p99'] or '-':>8} "
+                    f"{classify['p95'] or '-':>12} {stage['rejected_rate'] * 100:>6.1f} {stage['error_rate'] * 100:>6.1f}"
+                )
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+            if snapshot:
+                self._clean_up(users or [], snapshot)
+
+        saturation = loadtest.find_saturation(stages)
+        if saturation:
+            self.stdout.write(self.style.WARNING(f"Saturates at {saturation} concurrent clients"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Throughput still rising at the last stage"))
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump({'options': {key: options[key] for key in (
+                    'url', 'devices', 'domains', 'zipf', 'median_words', 'max_words', 'stand_in', 'ms_per_token', 'seed'
+                )}, 'stages': stages, 'saturation_concurrency': saturation}, f, indent=2)
+            self.stdout.write(f"Report written to {options['report']}")
+
+    def _start_server(self, options):
+        """Serve the app from a background thread of this process"""
+        # Imported here so the model is only loaded when serving in-process
+        from core import views
+        from core.warmup import warm_up_classifier
+        from ml_model.classifier import classifier, current_model_paths
+        from ml_model.standin import stand_in_components
+
+        if options['stand_in']:
+            classifier.use_components(
+                *stand_in_components(current_model_paths()[2], options['ms_per_token']),
+                name='stand-in'
+            )
+        warm_up_classifier()
+        if options['no_rate_limit']:
+            views.device_limiter = None
+        self.stdout.write(f"Serving model {classifier.model_version} ({classifier.model_name}) in-process")
+
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(get_internal_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+    def _create_users(self, count, seed):
+        """Temporary devices, each allowed a random half of the model's categories"""
+        from ml_model.classifier import classifier
+
+        users = User.objects.bulk_create([
+            User(username=f"{loadtest.SYNTHETIC_DOMAIN_PREFIX}{uuid.uuid4().hex[:12]}", device_id=str(uuid.uuid4()))
+            for _ in range(count)
+        ])
+        users = list(User.objects.filter(device_id__in=[user.device_id for user in users]))
+        categories = [get_or_create_category(str(name)) for name in classifier.label_encoder.classes_]
+        rng = random.Random(seed)
+        UserAllowedCategory.objects.bulk_create([
+            UserAllowedCategory(user=user, category=category)
+            for user in users
+            for category in rng.sample(categories, len(categories) // 2)
+        ])
+        return users
+
+    def _snapshot(self, domains):
+        """Index and queue rows for the run's domains as they are before it starts"""
+        domains = sorted({extract_main_domain(domain) for domain in domains})
+        rows = {
+            model: {
+                row['id']: row
+                for start in range(0, len(domains), 500)
+                for row in model.objects.filter(domain__in=domains[start:start + 500]).values()
+            }
+            for model in (DomainClassification, ReclassificationTask)
+        }
+        return domains, rows
+
+    def _clean_up(self, users, snapshot):
+        """Remove the temporary users and put the index and queue back as they were"""
+        user_ids = [user.id for user in users]
+        audit_log.flush()
+        ClassificationEvent.objects.filter(user_id__in=user_ids).delete()
+        ClassificationRollup.objects.filter(user_id__in=user_ids).delete()
+        User.objects.filter(id__in=user_ids).delete()
+
+        domains, rows = snapshot
+        restored = removed = 0
+        with transaction.atomic():
+            for model, saved in rows.items():
+                for start in range(0, len(domains), 500):
+                    removed += model.objects.filter(
+                        domain__in=domains[start:start + 500]
+                    ).exclude(id__in=saved).delete()[0]
+                # update() leaves auto_now timestamps as they were saved
+                for row_id, row in saved.items():
+                    restored += model.objects.filter(id=row_id).update(**row)
+        self.stdout.write(
+            f"Removed {len(user_ids)} temporary devices and {removed} index/queue rows; "
+            f"restored {restored} pre-existing rows"
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import reclassify
+from ml_model.classifier import classifier
+
+
+class Command(BaseCommand):
+    help = "Run deeper background inference for queued low-confidence or stale domains"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help="Tasks claimed per poll")
+        parser.add_argument('--max-attempts', type=int, default=3, help="Attempts before a task is marked failed")
+        parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            # Reconnect if the database dropped or expired the connection while idle
+            close_old_connections()
+            tasks = reclassify.claim_batch(options['batch_size'])
+            for task in tasks:
+                result = reclassify.process(task, classifier, options['max_attempts'])
+                if result:
+                    self.stdout.write(
+                        f"{task.domain}: {result['category']} ({result['confidence']}, "
+                        f"{result['chunks_processed']} chunks)"
+                    )
+
+            if not tasks:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
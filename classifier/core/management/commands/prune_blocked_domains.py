@@ -0,0 +1,145 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core.models import BlockedDomain
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'domain', 'original_category_id', 'blocked_at', 'notes')
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete automatic (non-manual) blocked domains older than a retention "
+        "period or beyond a per-user cap, in small batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age-days', type=int,
+            default=getattr(settings, 'BLOCKED_DOMAIN_RETENTION_DAYS', None),
+            help="Delete automatic blocks older than this"
+        )
+        parser.add_argument(
+            '--max-per-user', type=int,
+            default=getattr(settings, 'BLOCKED_DOMAIN_MAX_PER_USER', None),
+            help="Keep at most this many automatic blocks per user"
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows deleted per transaction")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches")
+        parser.add_argument('--archive-dir', help="Write deleted rows to gzipped JSON lines here first")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted")
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        self.dry_run = options['dry_run']
+        self.archive = None
+        if options['archive_dir'] and not self.dry_run:
+            archive_dir = Path(options['archive_dir'])
+            archive_dir.mkdir(parents=True, exist_ok=True)
+            path = archive_dir / f"blocked_domains-{timezone.now():%Y%m%dT%H%M%S}.jsonl.gz"
+            self.archive = gzip.open(path, 'wt')
+            self.stdout.write(f"Archiving to {path}")
+
+        self._report_size("Before")
+        automatic = BlockedDomain.objects.filter(is_manual=False)
+        deleted = 0
+        try:
+            if options['max_age_days'] is not None:
+                cutoff = timezone.now() - timedelta(days=options['max_age_days'])
+                deleted += self._delete(automatic.filter(blocked_at__lt=cutoff))
+                # The cap applies to what is left, which a dry run has not deleted
+                automatic = automatic.filter(blocked_at__gte=cutoff)
+
+            cap = options['max_per_user']
+            if cap is not None:
+                over_cap = (
+                    automatic.values('user_id')
+                    .annotate(total=Count('id'))
+                    .filter(total__gt=cap)
+                    .values_list('user_id', flat=True)
+                )
+                for user_id in list(over_cap):
+                    excess = automatic.filter(user_id=user_id)
+                    if cap:
+                        # Everything ordered after the newest `cap` rows for this user
+                        blocked_at, pk = excess.order_by('-blocked_at', '-id').values_list(
+                            'blocked_at', 'id'
+                        )[cap - 1]
+                        excess = excess.filter(
+                            Q(blocked_at__lt=blocked_at) | Q(blocked_at=blocked_at, id__lt=pk)
+                        )
+                    deleted += self._delete(excess)
+        finally:
+            if self.archive:
+                self.archive.close()
+
+        verb = "Would delete" if self.dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} automatic blocked domains"))
+        if not self.dry_run:
+            self._report_size("After")
+
+    def _delete(self, queryset) -> int:
+        if self.dry_run:
+            return queryset.count()
+
+        deleted = 0
+        while True:
+            # Small transactions avoid holding long locks on the table
+            with transaction.atomic():
+                ids = list(queryset.order_by('id').values_list('id', flat=True)[:self.batch_size])
+                if not ids:
+                    break
+                if self.archive:
+                    for row in BlockedDomain.objects.filter(id__in=ids).values(*ARCHIVE_FIELDS):
+                        row['blocked_at'] = row['blocked_at'].isoformat()
+                        self.archive.write(json.dumps(row) + '\n')
+                count, _ = BlockedDomain.objects.filter(id__in=ids).delete()
+            deleted += count
+            if self.pause:
+                time.sleep(self.pause)
+        return deleted
+
+    def _report_size(self, label: str):
+        rows = BlockedDomain.objects.count()
+        table_bytes, index_bytes = self._table_sizes(BlockedDomain._meta.db_table)
+        sizes = ""
+        if table_bytes is not None:
+            sizes = f", table {table_bytes / 1024:.0f} KiB, indexes {index_bytes / 1024:.0f} KiB"
+        self.stdout.write(f"{label}: {rows} rows{sizes}")
+
+    def _table_sizes(self, table: str):
+        """(table bytes, index bytes) where the database can report them"""
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute("SELECT pg_relation_size(%s), pg_indexes_size(%s)", [table, table])
+                    return cursor.fetchone()
+                if connection.vendor == 'mysql':
+                    cursor.execute(
+                        "SELECT data_length, index_length FROM information_schema.tables "
+                        "WHERE table_schema = DATABASE() AND table_name = %s",
+                        [table]
+                    )
+                    return cursor.fetchone()
+                if connection.vendor == 'sqlite':
+                    # Requires SQLite built with the dbstat virtual table
+                    cursor.execute(
+                        "SELECT SUM(CASE WHEN name = %s THEN pgsize ELSE 0 END), "
+                        "SUM(CASE WHEN name != %s THEN pgsize ELSE 0 END) FROM dbstat "
+                        "WHERE name = %s OR name IN (SELECT name FROM sqlite_master "
+                        "WHERE type = 'index' AND tbl_name = %s)",
+                        [table, table, table, table]
+                    )
+                    return cursor.fetchone()
+        except Exception:
+            pass
+        return None, None
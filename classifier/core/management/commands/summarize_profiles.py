@@ -0,0 +1,76 @@
+import io
+import json
+import pstats
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core.profiling import profiler
+
+
+class Command(BaseCommand):
+    help = "Summarize request profiles captured by the classify profiler"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Profile directory (defaults to CLASSIFY_PROFILE_DIR)")
+        parser.add_argument('--limit', type=int, default=20, help="Rows to show per section")
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir']) if options['dir'] else profiler.directory
+        limit = options['limit']
+        metas = sorted(directory.glob('*.meta.json')) if directory.exists() else []
+        if not metas:
+            self.stdout.write(f"No profiles found in {directory}")
+            return
+
+        reasons = Counter()
+        latencies = []
+        for path in metas:
+            meta = json.loads(path.read_text())
+            reasons[meta['reason']] += 1
+            latencies.append(meta['elapsed_ms'])
+        latencies.sort()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{len(metas)} profiles in {directory}"))
+        self.stdout.write("  " + ", ".join(f"{reason}: {count}" for reason, count in reasons.items()))
+        self.stdout.write(
+            f"  latency ms: p50={latencies[len(latencies) // 2]:.1f} "
+            f"p95={latencies[int(len(latencies) * 0.95)]:.1f} max={latencies[-1]:.1f}"
+        )
+
+        prof_files = [str(p) for p in directory.glob('*.prof')]
+        if prof_files:
+            self.stdout.write(self.style.MIGRATE_HEADING("\nPython (cumulative time)"))
+            out = io.StringIO()
+            stats = pstats.Stats(*prof_files, stream=out)
+            stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+            self.stdout.write(out.getvalue())
+
+        ops = defaultdict(lambda: [0, 0.0, 0.0])
+        for path in directory.glob('*.ops.json'):
+            for op in json.loads(path.read_text()):
+                totals = ops[op['name']]
+                totals[0] += op['count']
+                totals[1] += op['self_cpu_us']
+                totals[2] += op.get('device_us', 0)
+        if ops:
+            self.stdout.write(self.style.MIGRATE_HEADING("Torch operators (self CPU time)"))
+            for name, (count, cpu_us, device_us) in sorted(
+                ops.items(), key=lambda item: item[1][1], reverse=True
+            )[:limit]:
+                self.stdout.write(
+                    f"  {name:<40} calls={count:<8} cpu={cpu_us / 1000:.2f}ms device={device_us / 1000:.2f}ms"
+                )
+
+        frames = Counter()
+        for path in directory.glob('*.stacks'):
+            for line in path.read_text().splitlines():
+                stack, _, count = line.rpartition(' ')
+                # Attribute samples to every distinct frame on the stack
+                for frame in set(stack.split(';')):
+                    frames[frame] += int(count)
+        if frames:
+            self.stdout.write(self.style.MIGRATE_HEADING("\nSlow requests (stack samples per frame)"))
+            for frame, count in frames.most_common(limit):
+                self.stdout.write(f"  {count:>6}  {frame}")
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import UserAllowedCategory
+
+
+class Command(BaseCommand):
+    help = "Delete expired UserAllowedCategory rows in batches, invalidating cached policies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows deleted per transaction")
+        parser.add_argument('--interval', type=float, help="Repeat every N seconds instead of exiting")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows have expired")
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['batch_size'], options['dry_run'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size: int, dry_run: bool = False) -> int:
+        now = timezone.now()
+        expired = UserAllowedCategory.objects.filter(expires_at__lte=now)
+        if dry_run:
+            self.stdout.write(f"{expired.count()} expired permissions")
+            return 0
+
+        deleted = 0
+        while True:
+            # Short transactions keep row locks brief on busy tables
+            with transaction.atomic():
+                batch = list(expired.order_by('expires_at').values_list('id', flat=True)[:batch_size])
+                if not batch:
+                    break
+                # post_delete signals invalidate each affected user's cached policy
+                count, _ = UserAllowedCategory.objects.filter(id__in=batch).delete()
+            deleted += count
+
+        self.stdout.write(f"Deleted {deleted} expired permissions")
+        return deleted
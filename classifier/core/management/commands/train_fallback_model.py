@@ -0,0 +1,70 @@
+import random
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ReclassificationTask
+from ml_model.classifier import classifier
+from ml_model.fallback import FALLBACK_MODEL_PATH, FallbackClassifier
+
+
+class Command(BaseCommand):
+    help = (
+        "Distil the main classifier into the cheap fallback model. Texts come "
+        "from a directory of page dumps and from queued reclassification tasks; "
+        "labels are the main model's own predictions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dumps-dir', help="Directory of *.txt page dumps")
+        parser.add_argument('--limit', type=int, default=20000, help="Maximum training texts")
+        parser.add_argument('--holdout', type=float, default=0.1, help="Fraction held out to measure agreement")
+        parser.add_argument('--output', default=FALLBACK_MODEL_PATH, help="Where to save the model")
+
+    def handle(self, *args, **options):
+        texts = self._texts(options['dumps_dir'], options['limit'])
+        if len(texts) < 10:
+            raise CommandError(f"Need at least 10 texts to train on, found {len(texts)}")
+
+        self.stdout.write(f"Labelling {len(texts)} texts with model {classifier.model_version}")
+        labelled = []
+        for text in texts:
+            result = classifier.predict(text)
+            if 'error' not in result:
+                labelled.append((text, result['category']))
+
+        if len({label for _, label in labelled}) < 2:
+            raise CommandError("The main model predicted a single category for every text; add more varied texts")
+
+        random.Random(0).shuffle(labelled)
+        split = int(len(labelled) * (1 - options['holdout']))
+        train, holdout = labelled[:split], labelled[split:]
+        fallback = FallbackClassifier().train(
+            [text for text, _ in train],
+            [label for _, label in train],
+            teacher_version=classifier.model_version
+        )
+        if holdout:
+            agreement = fallback.agreement([text for text, _ in holdout], [label for _, label in holdout])
+            self.stdout.write(f"Agreement with the main model on {len(holdout)} held-out texts: {agreement:.1%}")
+
+        fallback.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved fallback model {fallback.version} to {options['output']}; restart workers to load it"
+        ))
+
+    def _texts(self, dumps_dir, limit: int) -> list:
+        texts = []
+        if dumps_dir:
+            dumps_dir = Path(dumps_dir)
+            if not dumps_dir.is_dir():
+                raise CommandError(f"Dumps directory {dumps_dir} does not exist")
+            for path in sorted(dumps_dir.glob('*.txt'))[:limit]:
+                texts.append(path.read_text(errors='ignore'))
+        remaining = limit - len(texts)
+        if remaining > 0:
+            texts.extend(
+                ReclassificationTask.objects.order_by('-enqueued_at')
+                .values_list('text_content', flat=True)[:remaining]
+            )
+        return [text for text in texts if text.strip()]
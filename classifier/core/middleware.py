@@ -1,6 +1,6 @@
 from django.utils.deprecation import MiddlewareMixin
 from django.core.exceptions import PermissionDenied
-from rest_framework.authtoken.models import Token
+from .identity import get_identity_by_token
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,12 +17,20 @@ class DeviceVerificationMiddleware(MiddlewareMixin):
         if request.path in ['/api/login/', '/api/register/']:
             return
             
+        # Token callers are resolved through the identity cache, others by session
+        identity = None
+        auth_header = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if len(auth_header) == 2 and auth_header[0] == 'Token':
+            identity = get_identity_by_token(auth_header[1])
+        elif request.user.is_authenticated:
+            identity = request.user
+            
         # Verify device for authenticated API requests
-        if request.user.is_authenticated and request.user.requires_device_auth:
+        if identity is not None and identity.requires_device_auth:
             device_hash = request.META.get('HTTP_X_DEVICE_HASH')
-            if not device_hash or device_hash != request.user.hashed_mac:
+            if not device_hash or device_hash != identity.hashed_mac:
                 logger.warning(
-                    f"API device verification failed for {request.user.username}",
+                    f"API device verification failed for {identity.username}",
                     extra={'request': request}
                 )
                 raise PermissionDenied("Device verification failed")
\ No newline at end of file
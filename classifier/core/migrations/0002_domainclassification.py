@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DomainClassification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(help_text='Registrable domain name', max_length=255, unique=True)),
+                ('confidence', models.FloatField(default=0)),
+                ('model_version', models.CharField(help_text='Version of the model that produced this classification', max_length=64)),
+                ('classified_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='classified_domains', to='core.webcategory')),
+            ],
+            options={
+                'verbose_name': 'Domain Classification',
+                'verbose_name_plural': 'Domain Classifications',
+                'indexes': [models.Index(fields=['domain', 'model_version'], name='core_domain_domain_23cdda_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_domainclassification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReclassificationTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(help_text='Registrable domain to reclassify', max_length=255, unique=True)),
+                ('text_content', models.TextField(help_text='Page text captured when the task was queued')),
+                ('reason', models.CharField(choices=[('low_confidence', 'Low confidence'), ('truncated', 'Truncated input'), ('stale', 'Stale result')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('enqueued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Reclassification Task',
+                'verbose_name_plural': 'Reclassification Tasks',
+                'indexes': [models.Index(fields=['status', 'enqueued_at'], name='core_reclas_status_6e5167_idx')],
+            },
+        ),
+    ]
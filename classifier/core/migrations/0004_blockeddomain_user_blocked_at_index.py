@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_reclassificationtask'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blockeddomain',
+            index=models.Index(fields=['user', '-blocked_at', '-id'], name='core_blocke_user_id_540761_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_blockeddomain_user_blocked_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userallowedcategory',
+            name='is_allowed',
+            field=models.BooleanField(default=True, help_text="Unset to deny a category the user's policy group allows"),
+        ),
+        migrations.CreateModel(
+            name='PolicyGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('allowed_categories', models.ManyToManyField(blank=True, help_text='Categories every member may access', related_name='policy_groups', to='core.webcategory')),
+            ],
+            options={
+                'verbose_name': 'Policy Group',
+                'verbose_name_plural': 'Policy Groups',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='policy_group',
+            field=models.ForeignKey(blank=True, help_text='Group whose allowed categories and blocked domains this user inherits', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='core.policygroup'),
+        ),
+        migrations.CreateModel(
+            name='PolicyGroupBlockedDomain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(help_text='Blocked domain name', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocked_domains', to='core.policygroup')),
+            ],
+            options={
+                'verbose_name': 'Policy Group Blocked Domain',
+                'verbose_name_plural': 'Policy Group Blocked Domains',
+                'unique_together': {('group', 'domain')},
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+
+def create_policy_groups(apps, schema_editor):
+    """Move allowances shared by every member of an auth group into a policy group.
+
+    Each user joins the policy group of their first auth group. Permanent
+    per-user rows that the group now grants are deleted; expiring grants and
+    anything not shared by all members stay per-user.
+    """
+    Group = apps.get_model('auth', 'Group')
+    User = apps.get_model('core', 'User')
+    PolicyGroup = apps.get_model('core', 'PolicyGroup')
+    UserAllowedCategory = apps.get_model('core', 'UserAllowedCategory')
+
+    assigned = set()
+    for group in Group.objects.order_by('id'):
+        member_ids = set(
+            User.objects.filter(groups=group, policy_group__isnull=True)
+            .exclude(id__in=assigned)
+            .values_list('id', flat=True)
+        )
+        if not member_ids:
+            continue
+
+        shared = None
+        for user_id in member_ids:
+            categories = set(
+                UserAllowedCategory.objects.filter(
+                    user_id=user_id,
+                    expires_at__isnull=True,
+                    is_allowed=True
+                ).values_list('category_id', flat=True)
+            )
+            shared = categories if shared is None else shared & categories
+
+        policy_group, _ = PolicyGroup.objects.get_or_create(name=group.name)
+        policy_group.allowed_categories.add(*shared)
+        User.objects.filter(id__in=member_ids).update(policy_group=policy_group)
+        UserAllowedCategory.objects.filter(
+            user_id__in=member_ids,
+            category_id__in=shared,
+            expires_at__isnull=True
+        ).delete()
+        assigned |= member_ids
+
+
+def expand_policy_groups(apps, schema_editor):
+    """Copy inherited categories back onto each member"""
+    User = apps.get_model('core', 'User')
+    UserAllowedCategory = apps.get_model('core', 'UserAllowedCategory')
+
+    rows = []
+    for user in User.objects.filter(policy_group__isnull=False).select_related('policy_group'):
+        for category in user.policy_group.allowed_categories.all():
+            rows.append(UserAllowedCategory(user_id=user.id, category_id=category.id))
+    UserAllowedCategory.objects.bulk_create(rows, ignore_conflicts=True, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0005_policy_groups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_policy_groups, expand_policy_groups),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_policy_groups_from_auth_groups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userallowedcategory',
+            index=models.Index(fields=['expires_at'], name='core_useral_expires_f022da_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_userallowedcategory_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255)),
+                ('category', models.CharField(blank=True, help_text='Category name at the time of the decision', max_length=100)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('decision', models.CharField(choices=[('allowed', 'Allowed'), ('blocked', 'Blocked')], max_length=10)),
+                ('source', models.CharField(choices=[('model', 'Model'), ('index', 'Domain index'), ('blocklist', 'Blocked domain')], max_length=10)),
+                ('cache_hit', models.BooleanField(default=False, help_text='Answered without running the model')),
+                ('latency_ms', models.FloatField()),
+                ('model_version', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Classification Event',
+                'verbose_name_plural': 'Classification Events',
+                'indexes': [models.Index(fields=['created_at'], name='core_classi_created_8c27f6_idx'), models.Index(fields=['user', 'created_at'], name='core_classi_user_id_ef66b1_idx'), models.Index(fields=['domain', 'created_at'], name='core_classi_domain_9f785b_idx')],
+            },
+        ),
+    ]
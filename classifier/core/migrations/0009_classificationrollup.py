@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_classificationevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassificationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('blocked_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Classification Rollup',
+                'verbose_name_plural': 'Classification Rollups',
+                'indexes': [models.Index(fields=['period', 'period_start'], name='core_classi_period_c841de_idx')],
+                'unique_together': {('period', 'period_start', 'user', 'category')},
+            },
+        ),
+    ]
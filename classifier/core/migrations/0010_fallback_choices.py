@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_classificationrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='classificationevent',
+            name='source',
+            field=models.CharField(choices=[('model', 'Model'), ('fallback', 'Fallback model'), ('index', 'Domain index'), ('blocklist', 'Blocked domain')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='reclassificationtask',
+            name='reason',
+            field=models.CharField(choices=[('low_confidence', 'Low confidence'), ('truncated', 'Truncated input'), ('stale', 'Stale result'), ('fallback', 'Answered by fallback model')], max_length=20),
+        ),
+    ]
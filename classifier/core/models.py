@@ -1,5 +1,6 @@
 import uuid
 import hashlib
+from datetime import datetime, timedelta
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import MinLengthValidator
@@ -55,6 +56,16 @@ class User(AbstractUser):
         db_index=True
     )
     
+    # Inherited policy
+    policy_group = models.ForeignKey(
+        'PolicyGroup',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='members',
+        help_text="Group whose allowed categories and blocked domains this user inherits"
+    )
+    
     # Security flags
     requires_device_auth = models.BooleanField(
         default=False,
@@ -109,11 +120,11 @@ class User(AbstractUser):
         self.save()
 
     def update_device_metadata(self, request=None):
-        """Update device fingerprint data"""
+        """Update device fingerprint data if it changed, at most once per interval"""
         if not request:
             return
             
-        self.device_metadata = {
+        metadata = {
             'user_agent': request.META.get('HTTP_USER_AGENT'),
             'ip': request.META.get('REMOTE_ADDR'),
             'screen': {
@@ -124,9 +135,24 @@ class User(AbstractUser):
             'platform': request.POST.get('platform'),
             'timezone': request.POST.get('timezone'),
             'touch_support': request.POST.get('touch_support'),
-            'last_updated': timezone.now().isoformat()
         }
-        self.save()
+        previous = dict(self.device_metadata or {})
+        last_updated = previous.pop('last_updated', None)
+        if metadata == previous:
+            return
+        
+        now = timezone.now()
+        min_interval = timedelta(seconds=getattr(settings, 'DEVICE_METADATA_MIN_INTERVAL', 300))
+        if last_updated and now - datetime.fromisoformat(last_updated) < min_interval:
+            return
+        
+        metadata['last_updated'] = now.isoformat()
+        self.device_metadata = metadata
+        if getattr(settings, 'DEVICE_METADATA_DEFERRED', False):
+            from .device_metadata import metadata_writer
+            metadata_writer.queue(self.pk, metadata)
+        else:
+            self.save(update_fields=['device_metadata'])
 
 class WebCategory(models.Model):
     """Categories for website classification"""
@@ -170,6 +196,66 @@ class WebCategory(models.Model):
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
 
+class PolicyGroup(models.Model):
+    """Shared policy inherited by every member, e.g. a school or class"""
+
+    name = models.CharField(
+        max_length=150,
+        unique=True
+    )
+    description = models.TextField(
+        blank=True
+    )
+    allowed_categories = models.ManyToManyField(
+        WebCategory,
+        blank=True,
+        related_name='policy_groups',
+        help_text="Categories every member may access"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = "Policy Group"
+        verbose_name_plural = "Policy Groups"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+class PolicyGroupBlockedDomain(models.Model):
+    """Domains blocked for every member of a policy group"""
+
+    group = models.ForeignKey(
+        PolicyGroup,
+        on_delete=models.CASCADE,
+        related_name='blocked_domains'
+    )
+    domain = models.CharField(
+        max_length=255,
+        help_text="Blocked domain name"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    class Meta:
+        unique_together = ('group', 'domain')
+        verbose_name = "Policy Group Blocked Domain"
+        verbose_name_plural = "Policy Group Blocked Domains"
+
+    def __str__(self):
+        return f"{self.domain} blocked for {self.group.name}"
+
+    def save(self, *args, **kwargs):
+        """Clean domain before saving"""
+        self.domain = self.domain.lower().strip()
+        super().save(*args, **kwargs)
+
 class UserAllowedCategory(models.Model):
     """Categories a specific user is allowed to access"""
     
@@ -191,15 +277,23 @@ class UserAllowedCategory(models.Model):
         blank=True,
         help_text="When this permission should automatically expire"
     )
+    is_allowed = models.BooleanField(
+        default=True,
+        help_text="Unset to deny a category the user's policy group allows"
+    )
 
     class Meta:
         unique_together = ('user', 'category')
         verbose_name = "User Allowed Category"
         verbose_name_plural = "User Allowed Categories"
         ordering = ['user', 'category__name']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} can access {self.category.name}"
+        verb = "can" if self.is_allowed else "cannot"
+        return f"{self.user.username} {verb} access {self.category.name}"
 
     @property
     def is_active(self):
@@ -248,6 +342,7 @@ class BlockedDomain(models.Model):
         indexes = [
             models.Index(fields=['domain']),
             models.Index(fields=['-blocked_at']),
+            models.Index(fields=['user', '-blocked_at', '-id']),
         ]
 
     def __str__(self):
@@ -258,6 +353,223 @@ class BlockedDomain(models.Model):
         self.domain = self.domain.lower().strip()
         super().save(*args, **kwargs)
 
+class DomainClassification(models.Model):
+    """Global domain-to-category index shared by all users"""
+
+    domain = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="Registrable domain name"
+    )
+    category = models.ForeignKey(
+        WebCategory,
+        on_delete=models.CASCADE,
+        related_name='classified_domains'
+    )
+    confidence = models.FloatField(
+        default=0
+    )
+    model_version = models.CharField(
+        max_length=64,
+        help_text="Version of the model that produced this classification"
+    )
+    classified_at = models.DateTimeField(
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = "Domain Classification"
+        verbose_name_plural = "Domain Classifications"
+        indexes = [
+            models.Index(fields=['domain', 'model_version']),
+        ]
+
+    def __str__(self):
+        return f"{self.domain} classified as {self.category.name}"
+
+class ReclassificationTask(models.Model):
+    """Queued background reclassification of a single domain"""
+
+    REASON_LOW_CONFIDENCE = 'low_confidence'
+    REASON_TRUNCATED = 'truncated'
+    REASON_STALE = 'stale'
+    REASON_FALLBACK = 'fallback'
+    REASON_CHOICES = [
+        (REASON_LOW_CONFIDENCE, 'Low confidence'),
+        (REASON_TRUNCATED, 'Truncated input'),
+        (REASON_STALE, 'Stale result'),
+        (REASON_FALLBACK, 'Answered by fallback model'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    domain = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="Registrable domain to reclassify"
+    )
+    text_content = models.TextField(
+        help_text="Page text captured when the task was queued"
+    )
+    reason = models.CharField(
+        max_length=20,
+        choices=REASON_CHOICES
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0
+    )
+    last_error = models.TextField(
+        blank=True
+    )
+    enqueued_at = models.DateTimeField(
+        default=timezone.now
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = "Reclassification Task"
+        verbose_name_plural = "Reclassification Tasks"
+        indexes = [
+            models.Index(fields=['status', 'enqueued_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.domain} ({self.reason}, {self.status})"
+
+class ClassificationEvent(models.Model):
+    """Append-only record of one classification decision"""
+
+    DECISION_ALLOWED = 'allowed'
+    DECISION_BLOCKED = 'blocked'
+    DECISION_CHOICES = [
+        (DECISION_ALLOWED, 'Allowed'),
+        (DECISION_BLOCKED, 'Blocked'),
+    ]
+
+    SOURCE_MODEL = 'model'
+    SOURCE_INDEX = 'index'
+    SOURCE_BLOCKLIST = 'blocklist'
+    SOURCE_FALLBACK = 'fallback'
+    SOURCE_CHOICES = [
+        (SOURCE_MODEL, 'Model'),
+        (SOURCE_FALLBACK, 'Fallback model'),
+        (SOURCE_INDEX, 'Domain index'),
+        (SOURCE_BLOCKLIST, 'Blocked domain'),
+    ]
+
+    # No foreign key constraints: the log is written in bulk and must not
+    # lock or cascade from the hot user and category tables
+    user = models.ForeignKey(
+        User,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    domain = models.CharField(
+        max_length=255
+    )
+    category = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Category name at the time of the decision"
+    )
+    confidence = models.FloatField(
+        null=True,
+        blank=True
+    )
+    decision = models.CharField(
+        max_length=10,
+        choices=DECISION_CHOICES
+    )
+    source = models.CharField(
+        max_length=10,
+        choices=SOURCE_CHOICES
+    )
+    cache_hit = models.BooleanField(
+        default=False,
+        help_text="Answered without running the model"
+    )
+    latency_ms = models.FloatField()
+    model_version = models.CharField(
+        max_length=64,
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = "Classification Event"
+        verbose_name_plural = "Classification Events"
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['domain', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.domain} {self.decision} at {self.created_at}"
+
+class ClassificationRollup(models.Model):
+    """Hourly or daily classification counts per user and category"""
+
+    PERIOD_HOUR = 'hour'
+    PERIOD_DAY = 'day'
+    PERIOD_CHOICES = [
+        (PERIOD_HOUR, 'Hour'),
+        (PERIOD_DAY, 'Day'),
+    ]
+
+    period = models.CharField(
+        max_length=4,
+        choices=PERIOD_CHOICES
+    )
+    period_start = models.DateTimeField()
+    user = models.ForeignKey(
+        User,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    category = models.CharField(
+        max_length=100,
+        blank=True
+    )
+    count = models.PositiveIntegerField(
+        default=0
+    )
+    blocked_count = models.PositiveIntegerField(
+        default=0
+    )
+
+    class Meta:
+        verbose_name = "Classification Rollup"
+        verbose_name_plural = "Classification Rollups"
+        unique_together = ('period', 'period_start', 'user', 'category')
+        indexes = [
+            models.Index(fields=['period', 'period_start']),
+        ]
+
+    def __str__(self):
+        return f"{self.category or 'uncategorized'} {self.period} from {self.period_start}: {self.count}"
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -0,0 +1,42 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(blocked_at: datetime, pk: int) -> str:
+    """Opaque cursor pointing just past a (blocked_at, id) position"""
+    raw = f"{blocked_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; returns None for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        blocked_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(blocked_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor: str = None, page_size: int = 50):
+    """Return one page ordered by newest block first, plus the next cursor.
+
+    Seeks on (blocked_at, id) instead of using OFFSET, so every page costs
+    the same regardless of how deep into the list it is.
+    """
+    queryset = queryset.order_by('-blocked_at', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        blocked_at, pk = position
+        queryset = queryset.filter(
+            Q(blocked_at__lt=blocked_at) | Q(blocked_at=blocked_at, id__lt=pk)
+        )
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1].blocked_at, items[-1].id)
+    return items, next_cursor
@@ -0,0 +1,306 @@
+from datetime import datetime
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import TTLCache
+from .models import (
+    BlockedDomain, PolicyGroup, PolicyGroupBlockedDomain, User,
+    UserAllowedCategory, WebCategory
+)
+
+policy_cache = TTLCache(
+    max_size=getattr(settings, 'POLICY_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'POLICY_CACHE_TTL', 300)
+)
+
+
+class ResolvedPolicy(NamedTuple):
+    """Effective policy for a user after group inheritance and overrides"""
+    allowed_categories: frozenset
+    blocked_domains: frozenset
+
+
+EMPTY_POLICY = ResolvedPolicy(frozenset(), frozenset())
+
+
+def _user_overrides(user_id: int):
+    """(policy_group_id, allowed names, denied names) for one user"""
+    key = ('user', user_id)
+    overrides = policy_cache.get(key)
+    if overrides is None:
+        now = timezone.now()
+        group_id = User.objects.filter(pk=user_id).values_list('policy_group_id', flat=True).first()
+        allowed, denied = set(), set()
+        next_expiry = None
+        # Expired rows are excluded in SQL; the sweeper deletes them later
+        for name, is_allowed, expires_at in UserAllowedCategory.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=now),
+            user_id=user_id
+        ).values_list('category__name', 'is_allowed', 'expires_at'):
+            (allowed if is_allowed else denied).add(name)
+            if expires_at and (next_expiry is None or expires_at < next_expiry):
+                next_expiry = expires_at
+        overrides = (group_id, frozenset(allowed), frozenset(denied))
+        # Never serve a snapshot past the moment one of its grants expires
+        ttl = (next_expiry - now).total_seconds() if next_expiry else None
+        policy_cache.set(key, overrides, ttl=ttl)
+    return overrides
+
+
+def _group_policy(group_id: int) -> ResolvedPolicy:
+    """Policy shared by every member of a group, cached once for all of them"""
+    key = ('group', group_id)
+    policy = policy_cache.get(key)
+    if policy is None:
+        policy = ResolvedPolicy(
+            frozenset(
+                PolicyGroup.allowed_categories.through.objects.filter(
+                    policygroup_id=group_id
+                ).values_list('webcategory__name', flat=True)
+            ),
+            frozenset(
+                PolicyGroupBlockedDomain.objects.filter(group_id=group_id)
+                .values_list('domain', flat=True)
+            )
+        )
+        policy_cache.set(key, policy)
+    return policy
+
+
+def get_policy(user_id: int) -> ResolvedPolicy:
+    """Resolve a user's group policy plus per-user allowances and denials"""
+    group_id, allowed, denied = _user_overrides(user_id)
+    group = _group_policy(group_id) if group_id else EMPTY_POLICY
+    return ResolvedPolicy(
+        (group.allowed_categories | allowed) - denied,
+        group.blocked_domains
+    )
+
+
+def invalidate_policy(user_ids):
+    """Drop cached policy for users once the current transaction commits"""
+    keys = [('user', user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: policy_cache.invalidate_many(keys))
+
+
+def invalidate_group_policy(group_id: int):
+    """Drop a group's cached policy once the current transaction commits"""
+    transaction.on_commit(lambda: policy_cache.invalidate(('group', group_id)))
+
+
+def apply_bulk_policy(user_ids, add_categories=(), remove_categories=(),
+                      block_domains=(), unblock_domains=()) -> dict:
+    """Apply many policy changes to many users in one transaction"""
+    user_ids = list(user_ids)
+    # Duplicates would make one upsert statement touch the same row twice
+    add_categories = list(dict.fromkeys(add_categories))
+    remove_categories = list(dict.fromkeys(remove_categories))
+    block_domains = list(dict.fromkeys(domain.lower().strip() for domain in block_domains))
+    unblock_domains = [domain.lower().strip() for domain in unblock_domains]
+    counts = {}
+
+    with transaction.atomic():
+        if add_categories:
+            existing = UserAllowedCategory.objects.filter(user_id__in=user_ids, is_allowed=True)
+            before = existing.count()
+            UserAllowedCategory.objects.bulk_create(
+                [
+                    UserAllowedCategory(user_id=user_id, category=category)
+                    for user_id in user_ids
+                    for category in add_categories
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'category'],
+                update_fields=['is_allowed', 'expires_at'],
+                batch_size=1000
+            )
+            counts['categories_added'] = existing.count() - before
+        if remove_categories:
+            # Deny rather than delete, so a group grant is not silently re-inherited
+            denied = UserAllowedCategory.objects.filter(
+                user_id__in=user_ids,
+                category__in=remove_categories,
+                is_allowed=False
+            )
+            before = denied.count()
+            UserAllowedCategory.objects.bulk_create(
+                [
+                    UserAllowedCategory(user_id=user_id, category=category, is_allowed=False)
+                    for user_id in user_ids
+                    for category in remove_categories
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'category'],
+                update_fields=['is_allowed', 'expires_at'],
+                batch_size=1000
+            )
+            counts['categories_removed'] = denied.count() - before
+        if block_domains:
+            existing = BlockedDomain.objects.filter(user_id__in=user_ids)
+            before = existing.count()
+            BlockedDomain.objects.bulk_create(
+                [
+                    BlockedDomain(user_id=user_id, domain=domain, is_manual=True)
+                    for user_id in user_ids
+                    for domain in block_domains
+                ],
+                # An existing automatic block becomes manual, so pruning keeps it
+                update_conflicts=True,
+                unique_fields=['user', 'domain'],
+                update_fields=['is_manual'],
+                batch_size=1000
+            )
+            counts['domains_blocked'] = existing.count() - before
+        if unblock_domains:
+            counts['domains_unblocked'], _ = BlockedDomain.objects.filter(
+                user_id__in=user_ids,
+                domain__in=unblock_domains
+            ).delete()
+        invalidate_policy(user_ids)
+
+    return counts
+
+
+@receiver(post_save, sender=UserAllowedCategory)
+@receiver(post_delete, sender=UserAllowedCategory)
+def invalidate_user_policy(sender, instance=None, **kwargs):
+    invalidate_policy([instance.user_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_group(sender, instance=None, created=False, update_fields=None, **kwargs):
+    if created or (update_fields and 'policy_group' not in update_fields):
+        return
+    invalidate_policy([instance.pk])
+
+
+@receiver(m2m_changed, sender=PolicyGroup.allowed_categories.through)
+def invalidate_group_categories(sender, instance=None, reverse=False, pk_set=None, **kwargs):
+    if reverse:
+        # Changed from the category side; instance is a WebCategory
+        transaction.on_commit(policy_cache.clear)
+    else:
+        invalidate_group_policy(instance.pk)
+
+
+@receiver(post_save, sender=PolicyGroupBlockedDomain)
+@receiver(post_delete, sender=PolicyGroupBlockedDomain)
+def invalidate_group_domains(sender, instance=None, **kwargs):
+    invalidate_group_policy(instance.group_id)
+
+
+@receiver(post_delete, sender=PolicyGroup)
+def invalidate_deleted_group(sender, instance=None, **kwargs):
+    invalidate_group_policy(instance.pk)
+
+
+@receiver(post_save, sender=WebCategory)
+def invalidate_all_policies(sender, instance=None, created=False, **kwargs):
+    # Cached policies hold category names, so a rename affects everyone
+    if not created:
+        transaction.on_commit(policy_cache.clear)
+
+
+POLICY_EXPORT_FIELDS = ['username', 'kind', 'value', 'expires_at']
+
+
+def export_policy_rows(user_ids=None):
+    """Yield policy rows (allowed categories, then blocked domains) as dicts"""
+    categories = UserAllowedCategory.objects.order_by('user_id', 'id')
+    domains = BlockedDomain.objects.order_by('user_id', 'id')
+    if user_ids is not None:
+        categories = categories.filter(user_id__in=user_ids)
+        domains = domains.filter(user_id__in=user_ids)
+
+    for username, name, expires_at, is_allowed in categories.values_list(
+        'user__username', 'category__name', 'expires_at', 'is_allowed'
+    ).iterator(chunk_size=2000):
+        yield {
+            'username': username,
+            'kind': 'category' if is_allowed else 'denied_category',
+            'value': name,
+            'expires_at': expires_at.isoformat() if expires_at else ''
+        }
+    for username, domain in domains.values_list('user__username', 'domain').iterator(chunk_size=2000):
+        yield {'username': username, 'kind': 'domain', 'value': domain, 'expires_at': ''}
+
+
+def import_policy_rows(rows, batch_size: int = 1000) -> dict:
+    """Apply exported category grants, denials and manual blocks, in batches.
+
+    Rows replace a user's existing row for the same category or domain.
+    """
+    counts = {'rows': 0, 'skipped': 0}
+    batch = []
+    for row in rows:
+        counts['rows'] += 1
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _import_batch(batch, counts)
+            batch = []
+    if batch:
+        _import_batch(batch, counts)
+    return counts
+
+
+def _parse_expiry(value):
+    """Timezone-aware expires_at of an import row, or None when it has none"""
+    if not value:
+        return None
+    expires_at = datetime.fromisoformat(str(value))
+    return expires_at if timezone.is_aware(expires_at) else timezone.make_aware(expires_at)
+
+
+def _import_batch(rows, counts):
+    from .utils import get_or_create_category
+
+    usernames = {row.get('username') for row in rows}
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    categories = {}
+    # Keyed by the unique fields; a later row for the same key wins
+    allowed = {}
+    blocked = {}
+
+    for row in rows:
+        user_id = user_ids.get(row.get('username'))
+        value = (row.get('value') or '').strip()
+        if user_id is None or not value or row.get('kind') not in ('category', 'denied_category', 'domain'):
+            counts['skipped'] += 1
+            continue
+        if row['kind'] != 'domain':
+            try:
+                expires_at = _parse_expiry(row.get('expires_at'))
+            except ValueError:
+                raise ValueError(f"Invalid expires_at for {row['username']}: {row['expires_at']!r}")
+            if value not in categories:
+                categories[value] = get_or_create_category(value)
+            allowed[user_id, value] = UserAllowedCategory(
+                user_id=user_id,
+                category=categories[value],
+                expires_at=expires_at,
+                is_allowed=row['kind'] == 'category'
+            )
+        else:
+            blocked[user_id, value.lower()] = BlockedDomain(user_id=user_id, domain=value.lower(), is_manual=True)
+
+    # Imported rows replace what the users had, like apply_bulk_policy
+    with transaction.atomic():
+        UserAllowedCategory.objects.bulk_create(
+            list(allowed.values()),
+            update_conflicts=True,
+            unique_fields=['user', 'category'],
+            update_fields=['is_allowed', 'expires_at']
+        )
+        BlockedDomain.objects.bulk_create(
+            list(blocked.values()),
+            update_conflicts=True,
+            unique_fields=['user', 'domain'],
+            update_fields=['is_manual']
+        )
+        invalidate_policy(user_ids.values())
@@ -0,0 +1,199 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """Low-overhead statistical sampler for registered request threads"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id: int):
+        with self._lock:
+            self._samples[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='classify-stack-sampler',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, thread_id: int) -> Counter:
+        with self._lock:
+            return self._samples.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._samples:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, counter in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counter[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        """Render a frame chain in collapsed-stack (flamegraph) format"""
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+
+class RequestProfiler:
+    """Opt-in profiling of sampled or slow classification requests.
+
+    A sampled request (``CLASSIFY_PROFILE_SAMPLE_RATE``) runs under cProfile and
+    the torch operator profiler. Every other request is watched by a cheap
+    stack sampler whose output is kept only if the request exceeds
+    ``CLASSIFY_PROFILE_SLOW_MS``. Results go to ``CLASSIFY_PROFILE_DIR``, which
+    is rotated to at most ``CLASSIFY_PROFILE_MAX_FILES`` profiles.
+    """
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'CLASSIFY_PROFILE_ENABLED', False)
+        self.sample_rate = getattr(settings, 'CLASSIFY_PROFILE_SAMPLE_RATE', 0.0)
+        self.slow_ms = getattr(settings, 'CLASSIFY_PROFILE_SLOW_MS', None)
+        self.max_files = getattr(settings, 'CLASSIFY_PROFILE_MAX_FILES', 200)
+        self.directory = Path(getattr(
+            settings, 'CLASSIFY_PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'
+        ))
+        self.sampler = StackSampler(
+            getattr(settings, 'CLASSIFY_PROFILE_STACK_INTERVAL', 0.01)
+        )
+        self._write_lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, label: str):
+        if not self.enabled:
+            yield
+            return
+
+        sampled = random.random() < self.sample_rate
+        watch_slow = not sampled and self.slow_ms is not None
+        thread_id = threading.get_ident()
+        py_profile = torch_profile = None
+
+        if sampled:
+            py_profile = cProfile.Profile()
+            torch_profile = self._start_torch_profiler()
+            py_profile.enable()
+        elif watch_slow:
+            self.sampler.start(thread_id)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stacks = None
+            if sampled:
+                py_profile.disable()
+                if torch_profile is not None:
+                    torch_profile.__exit__(None, None, None)
+            elif watch_slow:
+                stacks = self.sampler.stop(thread_id)
+
+            try:
+                if sampled:
+                    self._write(label, elapsed_ms, 'sampled', py_profile, torch_profile, None)
+                elif watch_slow and elapsed_ms >= self.slow_ms:
+                    self._write(label, elapsed_ms, 'slow', None, None, stacks)
+            except Exception as e:
+                logger.error(f"Failed to write request profile: {str(e)}")
+
+    def _start_torch_profiler(self):
+        try:
+            import torch
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            torch_profile = torch.profiler.profile(activities=activities)
+            torch_profile.__enter__()
+            return torch_profile
+        except Exception as e:
+            logger.warning(f"Torch profiler unavailable: {str(e)}")
+            return None
+
+    def _write(self, label, elapsed_ms, reason, py_profile, torch_profile, stacks):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        base = self.directory / stem
+
+        if py_profile is not None:
+            py_profile.dump_stats(f"{base}.prof")
+        if torch_profile is not None:
+            ops = [
+                {
+                    'name': event.key,
+                    'count': event.count,
+                    'self_cpu_us': event.self_cpu_time_total,
+                    'cpu_us': event.cpu_time_total,
+                    'device_us': getattr(event, 'device_time_total', 0),
+                }
+                for event in torch_profile.key_averages()
+            ]
+            with open(f"{base}.ops.json", 'w') as f:
+                json.dump(ops, f)
+        if stacks:
+            with open(f"{base}.stacks", 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        with open(f"{base}.meta.json", 'w') as f:
+            json.dump({
+                'label': label,
+                'reason': reason,
+                'elapsed_ms': round(elapsed_ms, 2),
+                'timestamp': time.time(),
+            }, f)
+
+        self._rotate()
+
+    def _rotate(self):
+        """Delete the oldest profiles beyond the configured limit"""
+        with self._write_lock:
+            metas = sorted(
+                self.directory.glob('*.meta.json'),
+                key=lambda p: p.stat().st_mtime
+            )
+            for meta in metas[:max(len(metas) - self.max_files, 0)]:
+                stem = meta.name[:-len('.meta.json')]
+                for path in self.directory.glob(f"{stem}.*"):
+                    path.unlink(missing_ok=True)
+
+
+profiler = RequestProfiler()
+
+
+def profile_request(view):
+    """Profile a view through the shared request profiler"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with profiler.profile(request.path):
+            return view(request, *args, **kwargs)
+    return wrapped
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets held in process memory.
+
+    Each key may burst up to `burst` requests and is refilled at `rate`
+    tokens per second. Idle keys are evicted least recently used first.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def allow(self, key, take: bool = True) -> tuple:
+        """(allowed, seconds until a token is available); take=False only checks"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens, retry_after = self._take(tokens, now - last, take)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return self._count(retry_after, take)
+
+    def _take(self, tokens: float, elapsed: float, take: bool = True) -> tuple:
+        tokens = min(self.burst, tokens + elapsed * self.rate)
+        if tokens >= 1:
+            return tokens - take, 0
+        return tokens, (1 - tokens) / self.rate
+
+    def _count(self, retry_after: float, take: bool) -> tuple:
+        """Result of a call, tallied in the stats only when it took a token; hold self._lock"""
+        if take:
+            if retry_after:
+                self.limited += 1
+            else:
+                self.allowed += 1
+        return (False, retry_after) if retry_after else (True, 0)
+
+    def stats(self) -> dict:
+        return {'allowed': self.allowed, 'limited': self.limited, 'keys': len(self._buckets)}
+
+
+class CacheTokenBucketLimiter(TokenBucketLimiter):
+    """Token buckets kept in a Django cache so all workers share them.
+
+    Reads and writes are not atomic, so concurrent requests from one key
+    may occasionally get a token more than they should.
+    """
+
+    def __init__(self, rate: float, burst: int, cache_alias: str):
+        super().__init__(rate, burst)
+        self.cache = caches[cache_alias]
+        self.timeout = max(1, int(burst / rate) * 2)
+
+    def allow(self, key, take: bool = True) -> tuple:
+        now = time.time()
+        cache_key = f"ratelimit:classify:{key}"
+        tokens, last = self.cache.get(cache_key) or (self.burst, now)
+        tokens, retry_after = self._take(tokens, max(0, now - last), take)
+        self.cache.set(cache_key, (tokens, now), self.timeout)
+        with self._lock:
+            return self._count(retry_after, take)
+
+    def stats(self) -> dict:
+        return {'allowed': self.allowed, 'limited': self.limited}
+
+
+class AdmissionGate:
+    """Cap concurrent inference, rejecting rather than queueing the excess"""
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self.admitted = 0
+        self.rejected = 0
+
+    def try_enter(self) -> bool:
+        if self._slots is None:
+            return True
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def leave(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {'admitted': self.admitted, 'rejected': self.rejected, 'max_concurrent': self.max_concurrent}
+
+
+def _build_limiter():
+    rate = getattr(settings, 'CLASSIFY_RATE_LIMIT', None)
+    if not rate:
+        return None
+    burst = getattr(settings, 'CLASSIFY_RATE_BURST', 20)
+    cache_alias = getattr(settings, 'CLASSIFY_RATE_LIMIT_CACHE', None)
+    if cache_alias:
+        return CacheTokenBucketLimiter(rate, burst, cache_alias)
+    return TokenBucketLimiter(rate, burst)
+
+
+device_limiter = _build_limiter()
+inference_gate = AdmissionGate(getattr(settings, 'CLASSIFY_MAX_CONCURRENT', None))
+
+
+def admission_stats() -> dict:
+    return {
+        'rate_limit': device_limiter.stats() if device_limiter else None,
+        'inference': inference_gate.stats()
+    }
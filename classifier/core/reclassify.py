@@ -0,0 +1,131 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import BlockedDomain, DomainClassification, ReclassificationTask
+from .policy import get_policy
+from .utils import get_or_create_category
+
+logger = logging.getLogger(__name__)
+
+
+def needs_reclassification(result: dict) -> str:
+    """Return the reason a fresh model result should be revisited, if any"""
+    if result.get('mode') == 'fallback':
+        return ReclassificationTask.REASON_FALLBACK
+    if result.get('deadline_exceeded') or result.get('chunks_processed', 0) < result.get('chunks_total', 0):
+        return ReclassificationTask.REASON_TRUNCATED
+    if result.get('confidence', 0) < getattr(settings, 'CLASSIFY_LOW_CONFIDENCE', 0.6):
+        return ReclassificationTask.REASON_LOW_CONFIDENCE
+    return None
+
+
+def is_stale(classified_at) -> bool:
+    """Whether a stored result is older than CLASSIFY_RESULT_MAX_AGE_DAYS"""
+    max_age = getattr(settings, 'CLASSIFY_RESULT_MAX_AGE_DAYS', None)
+    if max_age is None:
+        return False
+    return classified_at < timezone.now() - timedelta(days=max_age)
+
+
+def enqueue(domain: str, text_content: str, reason: str) -> bool:
+    """Queue a domain for deeper background inference, returning whether it was queued.
+
+    A task that is already pending or running is left alone, so repeat visits
+    neither reset its attempts nor rewrite its text; finished and failed
+    tasks are queued again.
+    """
+    max_length = getattr(settings, 'RECLASSIFY_MAX_TEXT_LENGTH', 200000)
+    fields = {
+        'text_content': text_content[:max_length],
+        'reason': reason,
+        'status': ReclassificationTask.STATUS_PENDING,
+        'attempts': 0,
+        'last_error': '',
+        'enqueued_at': timezone.now()
+    }
+    _, created = ReclassificationTask.objects.get_or_create(domain=domain, defaults=fields)
+    if created:
+        return True
+    return bool(ReclassificationTask.objects.filter(
+        domain=domain,
+        status__in=[ReclassificationTask.STATUS_DONE, ReclassificationTask.STATUS_FAILED]
+    ).update(**fields))
+
+
+def claim_batch(size: int, stuck_after: timedelta = timedelta(minutes=15)) -> list:
+    """Atomically claim pending tasks, recovering ones stuck in running"""
+    ReclassificationTask.objects.filter(
+        status=ReclassificationTask.STATUS_RUNNING,
+        updated_at__lt=timezone.now() - stuck_after
+    ).update(status=ReclassificationTask.STATUS_PENDING)
+
+    candidates = list(
+        ReclassificationTask.objects.filter(status=ReclassificationTask.STATUS_PENDING)
+        .order_by('enqueued_at')
+        .values_list('id', flat=True)[:size]
+    )
+    claimed = []
+    for task_id in candidates:
+        # Conditional update so concurrent workers never claim the same task
+        if ReclassificationTask.objects.filter(
+            id=task_id,
+            status=ReclassificationTask.STATUS_PENDING
+        ).update(status=ReclassificationTask.STATUS_RUNNING, updated_at=timezone.now()):
+            claimed.append(task_id)
+    return list(ReclassificationTask.objects.filter(id__in=claimed))
+
+
+def process(task: ReclassificationTask, classifier, max_attempts: int = 3):
+    """Run full-length inference for a task and update stored results"""
+    task.attempts += 1
+    result = classifier.predict(
+        task.text_content,
+        max_chunks=getattr(settings, 'RECLASSIFY_MAX_CHUNKS', None),
+        max_tokens=getattr(settings, 'CLASSIFY_MAX_TOKENS', None)
+    )
+
+    if 'error' in result:
+        task.last_error = result['error']
+        task.status = (
+            ReclassificationTask.STATUS_FAILED if task.attempts >= max_attempts
+            else ReclassificationTask.STATUS_PENDING
+        )
+        task.save(update_fields=['attempts', 'last_error', 'status', 'updated_at'])
+        logger.warning(f"Reclassification of {task.domain} failed: {result['error']}")
+        return None
+
+    web_category = get_or_create_category(result['category'])
+    with transaction.atomic():
+        DomainClassification.objects.update_or_create(
+            domain=task.domain,
+            defaults={
+                'category': web_category,
+                'confidence': result['confidence'],
+                'model_version': result['model_version'],
+                'classified_at': timezone.now()
+            }
+        )
+        _reconcile_blocks(task.domain, web_category)
+        task.status = ReclassificationTask.STATUS_DONE
+        task.last_error = ''
+        task.save(update_fields=['attempts', 'last_error', 'status', 'updated_at'])
+    return result
+
+
+def _reconcile_blocks(domain: str, web_category):
+    """Bring automatic blocks for a domain in line with its new category"""
+    automatic = BlockedDomain.objects.filter(domain=domain, is_manual=False)
+    # Resolved like classify_website: group grants, denials and expiry included
+    allowed_users = [
+        user_id for user_id in set(automatic.values_list('user_id', flat=True))
+        if web_category.name in get_policy(user_id).allowed_categories
+    ]
+
+    # Users whose policy allows the new category should no longer be blocked
+    automatic.filter(user_id__in=allowed_users).delete()
+    # The remaining blocks were just re-checked, so they are no longer stale
+    automatic.update(original_category=web_category, blocked_at=timezone.now())
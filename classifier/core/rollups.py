@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import ClassificationEvent, ClassificationRollup
+
+PERIODS = (ClassificationRollup.PERIOD_HOUR, ClassificationRollup.PERIOD_DAY)
+
+
+def period_start(moment, period: str):
+    """Truncate a datetime to the start of its hour or day"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if period == ClassificationRollup.PERIOD_DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def apply_events(events) -> int:
+    """Fold a batch of audit events into the hourly and daily rollups"""
+    totals = {}
+    for event in events:
+        blocked = event['decision'] == ClassificationEvent.DECISION_BLOCKED
+        for period in PERIODS:
+            key = (period, period_start(event['created_at'], period), event['user_id'], event['category'])
+            count, blocked_count = totals.get(key, (0, 0))
+            totals[key] = (count + 1, blocked_count + blocked)
+
+    with transaction.atomic():
+        for (period, start, user_id, category), (count, blocked_count) in totals.items():
+            _increment(period, start, user_id, category, count, blocked_count)
+    return len(totals)
+
+
+def _increment(period, start, user_id, category, count, blocked_count):
+    rows = ClassificationRollup.objects.filter(
+        period=period, period_start=start, user_id=user_id, category=category
+    )
+    if rows.update(count=F('count') + count, blocked_count=F('blocked_count') + blocked_count):
+        return
+    try:
+        with transaction.atomic():
+            ClassificationRollup.objects.create(
+                period=period, period_start=start, user_id=user_id, category=category,
+                count=count, blocked_count=blocked_count
+            )
+    except IntegrityError:
+        # Another worker created the row first
+        rows.update(count=F('count') + count, blocked_count=F('blocked_count') + blocked_count)
+
+
+def usage_series(period: str, since, until=None, user_id=None, group_by: str = 'category'):
+    """Counts per period and category (or user), read only from the rollups"""
+    rollups = ClassificationRollup.objects.filter(period=period, period_start__gte=since)
+    if until is not None:
+        rollups = rollups.filter(period_start__lt=until)
+    if user_id is not None:
+        rollups = rollups.filter(user_id=user_id)
+    return (
+        rollups.values('period_start', group_by)
+        .annotate(total=Sum('count'), blocked=Sum('blocked_count'))
+        .order_by('period_start', group_by)
+    )
+
+
+def default_since(period: str, now):
+    """Two days of hours or thirty days of days"""
+    span = timedelta(hours=48) if period == ClassificationRollup.PERIOD_HOUR else timedelta(days=30)
+    return period_start(now - span, period)
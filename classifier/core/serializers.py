@@ -15,4 +15,18 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         user.device_id = device_id
         user.save()
-        return user
\ No newline at end of file
+        return user
+
+
+class BulkPolicySerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    group = serializers.CharField(required=False)
+    add_categories = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    remove_categories = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    block_domains = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    unblock_domains = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+
+    def validate(self, data):
+        if not data['user_ids'] and not data.get('group'):
+            raise serializers.ValidationError("Provide user_ids or group")
+        return data
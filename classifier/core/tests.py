@@ -1,51 +1,86 @@
-from django.test import TestCase, TransactionTestCase
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from core.models import User, WebCategory, UserAllowedCategory, BlockedDomain
+from core.models import (
+    User, WebCategory, UserAllowedCategory, BlockedDomain, DomainClassification, ClassificationEvent,
+    ClassificationRollup, PolicyGroup, PolicyGroupBlockedDomain, ReclassificationTask
+)
+from core import loadtest, reclassify
+from core.audit import audit_log
+from core.device_metadata import metadata_writer
+from core.identity import get_identity_by_device, get_identity_by_token, identity_cache
+from core.management.commands.load_test import Command as LoadTestCommand
+from core.policy import apply_bulk_policy, get_policy, policy_cache
+from core.profiling import RequestProfiler
+from core.reclassify import _reconcile_blocks
+from core.ratelimit import AdmissionGate, TokenBucketLimiter
+from ml_model.classifier import LABEL_ENCODER_PATH, ModelBundle, classifier
+from ml_model.preprocess import TextPreprocessor
+from ml_model.standin import StandInTokenizer, stand_in_components
+import gzip
+import io
 import json
+import os
+import random
+import tempfile
+import time
 import warnings
+from datetime import timedelta
+from unittest import mock
+from django.utils import timezone
 from sklearn.exceptions import InconsistentVersionWarning
 
 # Suppress scikit-learn version warnings
 warnings.simplefilter("ignore", InconsistentVersionWarning)
 
-class ClassifyAPITests(TransactionTestCase):
-    reset_sequences = True  # Important for SQLite tests
+@override_settings(CLASSIFICATION_AUDIT_ENABLED=False)
+class APITestCase(TestCase):
+    """Resets the process-wide caches and rate limits that outlive a test's transaction"""
     
     def setUp(self):
-        # Clear any existing tokens and users first
-        User.objects.all().delete()
-        Token.objects.all().delete()
-        
-        # Create test user
-        self.user = User.objects.create_user(
+        # Invalidation runs on commit, which never happens inside TestCase
+        identity_cache.clear()
+        policy_cache.clear()
+        patcher = mock.patch('core.views.device_limiter', TokenBucketLimiter(rate=2, burst=20))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ClassifyAPITests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
             username='testuser',
             password='testpass123',
             device_id='550e8400-e29b-41d4-a716-446655440000'
         )
-        
-        # Create token - use get_or_create to be safe
-        self.token, _ = Token.objects.get_or_create(user=self.user)
+        cls.token, _ = Token.objects.get_or_create(user=cls.user)
         
         # Create test categories
-        self.allowed_category = WebCategory.objects.create(
+        cls.allowed_category = WebCategory.objects.create(
             name='Education',
             description='Educational websites'
         )
-        self.blocked_category = WebCategory.objects.create(
+        cls.blocked_category = WebCategory.objects.create(
             name='Games',
             description='Gaming websites'
         )
         
         # Allow education category for user
         UserAllowedCategory.objects.create(
-            user=self.user,
-            category=self.allowed_category
+            user=cls.user,
+            category=cls.allowed_category
         )
-        
-        # Set up API client with token auth
+    
+    def setUp(self):
+        super().setUp()
         self.client = APIClient()
         self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
         self.classify_url = reverse('classify')
@@ -54,14 +89,30 @@ class ClassifyAPITests(TransactionTestCase):
         """Helper to parse JsonResponse content"""
         return json.loads(response.content.decode('utf-8'))
     
+    def _model_predicts(self, category, **result):
+        """Make the classifier return a fixed category for any page"""
+        patcher = mock.patch.object(classifier, 'classify', return_value={
+            'category': category,
+            'confidence': 0.95,
+            'chunks_processed': 1,
+            'chunks_total': 1,
+            'deadline_exceeded': False,
+            'model_version': classifier.model_version,
+            'mode': 'full',
+            **result
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
     def test_classify_allowed_website(self):
         """Test classification of allowed website"""
+        self._model_predicts('Education')
         response = self.client.post(
             self.classify_url,
             data={
                 'domain': 'example.edu',
                 'text_content': 'Educational content',
-                'user_id': self.user.id
+                'device_id': self.user.device_id
             },
             format='json'
         )
@@ -73,12 +124,13 @@ class ClassifyAPITests(TransactionTestCase):
     
     def test_classify_blocked_website(self):
         """Test classification of blocked website"""
+        self._model_predicts('Games')
         response = self.client.post(
             self.classify_url,
             data={
                 'domain': 'game-site.com',
                 'text_content': 'Gaming content',
-                'user_id': self.user.id
+                'device_id': self.user.device_id
             },
             format='json'
         )
@@ -91,13 +143,14 @@ class ClassifyAPITests(TransactionTestCase):
     
     def test_classify_previously_blocked_domain(self):
         """Test that previously blocked domains are immediately blocked"""
+        self._model_predicts('Games')
         # First request to block the domain
         self.client.post(
             self.classify_url,
             data={
                 'domain': 'game-site.com',
                 'text_content': 'Gaming content',
-                'user_id': self.user.id
+                'device_id': self.user.device_id
             },
             format='json'
         )
@@ -108,7 +161,7 @@ class ClassifyAPITests(TransactionTestCase):
             data={
                 'domain': 'game-site.com',
                 'text_content': 'Different content',
-                'user_id': self.user.id
+                'device_id': self.user.device_id
             },
             format='json'
         )
@@ -123,7 +176,7 @@ class ClassifyAPITests(TransactionTestCase):
         test_cases = [
             {'domain': 'example.com'},  # Missing text_content
             {'text_content': 'some content'},  # Missing domain
-            {'domain': 'example.com', 'text_content': 'content'}  # Missing user_id
+            {'domain': 'example.com', 'text_content': 'content'}  # Missing device_id
         ]
         
         for data in test_cases:
@@ -135,15 +188,1260 @@ class ClassifyAPITests(TransactionTestCase):
             self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
     
     def test_classify_unauthenticated(self):
-        """Test that unauthenticated requests are rejected"""
+        """Test that requests from unregistered devices are rejected"""
         client = APIClient()  # No authentication
         response = client.post(
             self.classify_url,
             data={
                 'domain': 'example.com',
                 'text_content': 'content',
-                'user_id': 1
+                'device_id': 'unregistered-device'
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_throttled_device_still_gets_blocklist_verdicts(self):
+        """Test that the rate limit only applies when the model has to run"""
+        limiter = TokenBucketLimiter(rate=0.01, burst=1)
+        limiter.allow(self.user.device_id)
+        BlockedDomain.objects.create(
+            user=self.user,
+            domain='game-site.com',
+            original_category=self.blocked_category
+        )
+        
+        with mock.patch('core.views.device_limiter', limiter):
+            classify = self.client.post(
+                self.classify_url,
+                data={'domain': 'game-site.com', 'text_content': 'Gaming content', 'device_id': self.user.device_id},
+                format='json'
+            )
+            precheck = self.client.post(
+                reverse('classify_precheck'),
+                data={'domain': 'game-site.com', 'device_id': self.user.device_id},
+                format='json'
+            )
+            unknown = self.client.post(
+                reverse('classify_precheck'),
+                data={'domain': 'unknown.com', 'device_id': self.user.device_id},
+                format='json'
+            )
+        
+        self.assertTrue(self._parse_response(classify)['block'])
+        self.assertTrue(self._parse_response(precheck)['block'])
+        self.assertEqual(unknown.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', unknown)
+    
+    def test_classify_uses_domain_index(self):
+        """Test that indexed domains are answered without running the model"""
+        DomainClassification.objects.create(
+            domain='indexed.com',
+            category=self.allowed_category,
+            confidence=0.97,
+            model_version=classifier.model_version
+        )
+        
+        response = self.client.post(
+            self.classify_url,
+            data={
+                'domain': 'www.indexed.com',
+                'text_content': 'Anything at all',
+                'device_id': self.user.device_id
+            },
+            format='json'
+        )
+        
+        data = self._parse_response(response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(data['block'])
+        self.assertEqual(data['category'], 'Education')
+        self.assertEqual(data['confidence'], 0.97)
+        self.assertIn('max-age=900', response['Cache-Control'])
+    
+    def _classify(self, domain):
+        return self.client.post(
+            self.classify_url,
+            data={'domain': domain, 'text_content': 'Some page', 'device_id': self.user.device_id},
+            format='json'
+        )
+    
+    @override_settings(CLASSIFY_CLIENT_CACHE_SECONDS=900, CLASSIFY_CLIENT_CACHE_PROVISIONAL_SECONDS=60)
+    def test_cache_hints_are_short_for_provisional_verdicts_and_absent_on_errors(self):
+        """Test how long the extension may reuse each kind of answer"""
+        BlockedDomain.objects.create(user=self.user, domain='blocked.com', is_manual=True)
+        self._model_predicts('Education', confidence=0.3)
+        
+        blocked = self._classify('blocked.com')
+        self.assertTrue(blocked.json()['block'])
+        self.assertIn('max-age=900', blocked['Cache-Control'])
+        
+        unsure = self._classify('unsure.edu')
+        self.assertTrue(unsure.json()['provisional'])
+        self.assertIn('private', unsure['Cache-Control'])
+        self.assertIn('max-age=60', unsure['Cache-Control'])
+        
+        with mock.patch.object(classifier, 'classify', return_value={'error': 'No valid chunks after processing'}):
+            failed = self._classify('empty.edu')
+        self.assertEqual(failed.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertNotIn('max-age', failed.get('Cache-Control', ''))
+    
+    def test_partial_verdicts_are_provisional_and_requeued(self):
+        """Test that a verdict cut short by the deadline is flagged and revisited in full"""
+        self._model_predicts('Education', confidence=0.41, deadline_exceeded=True, chunks_processed=2, chunks_total=9)
+        
+        first = self._classify('long.edu')
+        second = self._classify('long.edu')
+        
+        for response in (first, second):
+            self.assertEqual((response.json()['partial'], response.json()['provisional']), (True, True))
+            self.assertIn('max-age=60', response['Cache-Control'])
+        # Not indexed, so the second visit asked the model again instead of getting a settled answer
+        self.assertFalse(DomainClassification.objects.filter(domain='long.edu').exists())
+        self.assertEqual(classifier.classify.call_count, 2)
+        self.assertEqual(
+            ReclassificationTask.objects.get(domain='long.edu').reason,
+            ReclassificationTask.REASON_TRUNCATED
+        )
+    
+    def test_fallback_verdicts_are_provisional_and_not_indexed(self):
+        """Test that a fallback answer is served but queued for the full model"""
+        self._model_predicts('Education', mode='fallback')
+        
+        data = self._classify('busy.edu').json()
+        
+        self.assertEqual((data['mode'], data['provisional']), ('fallback', True))
+        self.assertFalse(DomainClassification.objects.filter(domain='busy.edu').exists())
+        self.assertEqual(
+            ReclassificationTask.objects.get(domain='busy.edu').reason,
+            ReclassificationTask.REASON_FALLBACK
+        )
+    
+    @override_settings(CLASSIFICATION_AUDIT_ENABLED=True)
+    def test_classify_records_audit_event(self):
+        """Test that decisions are buffered and written to the audit log"""
+        DomainClassification.objects.create(
+            domain='audited.com',
+            category=self.allowed_category,
+            confidence=0.9,
+            model_version=classifier.model_version
+        )
+        
+        self.client.post(
+            self.classify_url,
+            data={
+                'domain': 'audited.com',
+                'text_content': 'Anything at all',
+                'device_id': self.user.device_id
+            },
+            format='json'
+        )
+        audit_log.flush()
+        
+        event = ClassificationEvent.objects.get(domain='audited.com')
+        self.assertEqual(event.user_id, self.user.id)
+        self.assertEqual(event.decision, ClassificationEvent.DECISION_ALLOWED)
+        self.assertTrue(event.cache_hit)
+        self.assertEqual(
+            ClassificationRollup.objects.get(period='day', user=self.user, category='Education').count,
+            1
+        )
+    
+    def test_readiness_reports_dropped_audit_events(self):
+        """Test that audit events dropped on a full buffer are visible to monitoring"""
+        with mock.patch.object(audit_log, 'dropped', 3):
+            response = self.client.get(reverse('readiness'))
+        
+        self.assertEqual(response.json()['audit']['dropped'], 3)
+    
+    def test_readiness_waits_for_warm_up_of_every_batch_shape(self):
+        """Test that a worker reports 503 until single chunks and full batches were warmed"""
+        self.addCleanup(setattr, classifier, 'ready', classifier.ready)
+        self.addCleanup(setattr, classifier, 'warmup_timings', classifier.warmup_timings)
+        classifier.ready = False
+        
+        self.assertEqual(self.client.get(reverse('readiness')).status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        classifier.warm_up(rounds=1)
+        response = self.client.get(reverse('readiness'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        full_batch = len(classifier._batches([[1] * 128] * 64)[0])
+        self.assertGreater(full_batch, 1)
+        self.assertIn(f"{full_batch}x128", response.json()['warmup_ms'])
+        self.assertIn("1x512", response.json()['warmup_ms'])
+    
+    def test_profiled_request_is_summarized(self):
+        """Test that a sampled classify request leaves a profile the summary command reads"""
+        self._model_predicts(self.allowed_category.name)
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        with override_settings(
+            CLASSIFY_PROFILE_ENABLED=True,
+            CLASSIFY_PROFILE_SAMPLE_RATE=1.0,
+            CLASSIFY_PROFILE_DIR=profile_dir.name
+        ):
+            request_profiler = RequestProfiler()
+        
+        with mock.patch('core.profiling.profiler', request_profiler):
+            self.assertEqual(self._classify('profiled.com').status_code, status.HTTP_200_OK)
+        out = io.StringIO()
+        call_command('summarize_profiles', dir=profile_dir.name, stdout=out)
+        
+        summary = out.getvalue()
+        self.assertIn(f"1 profiles in {profile_dir.name}", summary)
+        self.assertIn("sampled: 1", summary)
+        self.assertIn("Python (cumulative time)", summary)
+        self.assertIn("classify_website", summary)
+    
+    def test_classify_accepts_compressed_compact_payload(self):
+        """Test that gzip bodies with the compact sample schema are accepted"""
+        DomainClassification.objects.create(
+            domain='compact.com',
+            category=self.allowed_category,
+            confidence=0.9,
+            model_version=classifier.model_version
+        )
+        payload = json.dumps({
+            'domain': 'compact.com',
+            'device_id': self.user.device_id,
+            'title': 'Compact page',
+            'headings': ['Lessons'],
+            'text': 'Educational content'
+        }).encode()
+        
+        response = self.client.post(
+            self.classify_url,
+            data=gzip.compress(payload),
+            content_type='application/json',
+            HTTP_CONTENT_ENCODING='gzip'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(self._parse_response(response)['block'])
+    
+    def _post_raw(self, body, **headers):
+        return self.client.post(self.classify_url, data=body, content_type='application/json', **headers)
+    
+    def test_classify_rejects_headings_that_are_not_strings(self):
+        """Test that compact payloads with malformed headings get a 400 rather than an error"""
+        for headings in ('Lessons', [{'text': 'Lessons'}], ['Lessons', 3]):
+            payload = json.dumps({
+                'domain': 'compact.com',
+                'device_id': self.user.device_id,
+                'headings': headings,
+                'text': 'Educational content'
+            })
+            response = self._post_raw(payload)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json()['error'], 'headings must be a list of strings')
+    
+    @override_settings(CLASSIFY_MAX_BODY_BYTES=1024)
+    def test_classify_rejects_oversized_bodies(self):
+        """Test that plain and compressed bodies over the limit get a 413"""
+        payload = json.dumps({
+            'domain': 'compact.com',
+            'device_id': self.user.device_id,
+            'text_content': 'x' * 2048
+        }).encode()
+        self.assertEqual(self._post_raw(payload).status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        # Small on the wire, far over the limit once inflated
+        bomb = gzip.compress(b'{"text": "' + b' ' * (256 * 1024) + b'"}')
+        self.assertLess(len(bomb), 1024)
+        response = self._post_raw(bomb, HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
+    def test_classify_rejects_unsupported_encodings(self):
+        """Test that bodies in an encoding the server can't inflate get a 415"""
+        response = self._post_raw(b'compressed', HTTP_CONTENT_ENCODING='br')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    
+    def test_precheck_answers_from_index_or_asks_for_content(self):
+        """Test that the domain-only precheck never needs the model"""
+        DomainClassification.objects.create(
+            domain='known.com',
+            category=self.allowed_category,
+            confidence=0.9,
+            model_version=classifier.model_version
+        )
+        precheck_url = reverse('classify_precheck')
+        
+        known = self._parse_response(self.client.post(
+            precheck_url,
+            data={'domain': 'https://www.known.com/page', 'device_id': self.user.device_id},
+            format='json'
+        ))
+        unknown = self._parse_response(self.client.post(
+            precheck_url,
+            data={'domain': 'unknown.com', 'device_id': self.user.device_id},
+            format='json'
+        ))
+        
+        self.assertFalse(known['need_content'])
+        self.assertFalse(known['block'])
+        self.assertTrue(unknown['need_content'])
+    
+    def test_group_and_user_blocks_cover_subdomains_alike(self):
+        """Test that group and user blocklists both match the domain and its subdomains, not lookalikes"""
+        group = PolicyGroup.objects.create(name='Class 5B')
+        PolicyGroupBlockedDomain.objects.create(group=group, domain='games.com')
+        PolicyGroupBlockedDomain.objects.create(group=group, domain='play.arcade.com')
+        User.objects.filter(pk=self.user.pk).update(policy_group=group)
+        BlockedDomain.objects.create(user=self.user, domain='videos.net', is_manual=True)
+        BlockedDomain.objects.create(user=self.user, domain='shop.example.org', is_manual=True)
+        self._model_predicts(self.allowed_category.name)
+        expected = {
+            'games.com': True,
+            'sub.games.com': True,
+            'https://a.sub.games.com/play': True,
+            'sub.videos.net': True,
+            'megagames.com': False,
+            'games.com.example.org': False,
+            'myvideos.net': False,
+            'play.arcade.com': True,
+            'arcade.com': False,
+            'shop.example.org': True,
+            'example.org': False,
+        }
+        
+        for domain, blocked in expected.items():
+            with self.subTest(domain=domain):
+                self.assertEqual(self._parse_response(self._classify(domain))['block'], blocked)
+                precheck = self.client.post(
+                    reverse('classify_precheck'),
+                    data={'domain': domain, 'device_id': self.user.device_id},
+                    format='json'
+                )
+                self.assertEqual(self._parse_response(precheck)['block'], blocked)
+    
+    def test_classify_ignores_expired_permission(self):
+        """Test that an expired category grant no longer allows a domain"""
+        UserAllowedCategory.objects.filter(user=self.user).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        DomainClassification.objects.create(
+            domain='expired.edu',
+            category=self.allowed_category,
+            confidence=0.97,
+            model_version=classifier.model_version
+        )
+        
+        response = self.client.post(
+            self.classify_url,
+            data={
+                'domain': 'expired.edu',
+                'text_content': 'Educational content',
+                'device_id': self.user.device_id
+            },
+            format='json'
+        )
+        
+        data = self._parse_response(response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(data['block'])
+
+class IdentityCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='device-user', password='pass', device_id='device-1')
+        cls.token, _ = Token.objects.get_or_create(user=cls.user)
+    
+    def test_token_identity_carries_admin_flags(self):
+        """Test that admin permission checks need no query beyond the cached identity"""
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        
+        identity = get_identity_by_token(self.token.key)
+        with self.assertNumQueries(0):
+            user = identity.as_user()
+            self.assertTrue(user.is_staff)
+            self.assertFalse(user.is_superuser)
+            self.assertEqual((user.username, user.hashed_mac), ('device-user', None))
+    
+    def test_identity_follows_user_and_token_changes(self):
+        """Test that saving or deleting a user or token drops their cached identities"""
+        self.assertTrue(get_identity_by_token(self.token.key).is_active)
+        get_identity_by_device('device-1')
+        
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(identity_cache.get(('token', self.token.key)))
+        
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(get_identity_by_token(self.token.key).is_active)
+        
+        self.token.delete()
+        self.assertIsNone(get_identity_by_token(self.token.key))
+        
+        self.user.delete()
+        with self.assertRaises(User.DoesNotExist):
+            get_identity_by_device('device-1')
+    
+    @modify_settings(MIDDLEWARE={'append': 'core.middleware.DeviceVerificationMiddleware'})
+    def test_token_callers_of_device_bound_users_must_send_device_hash(self):
+        """Test that device verification applies to token-authenticated API calls"""
+        User.objects.filter(id=self.user.id).update(requires_device_auth=True, hashed_mac='a' * 64)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        url = reverse('api_blocked_domains')
+        
+        self.assertEqual(client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(client.get(url, HTTP_X_DEVICE_HASH='b' * 64).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(client.get(url, HTTP_X_DEVICE_HASH='a' * 64).status_code, status.HTTP_200_OK)
+
+class DeviceMetadataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='device-user', password='pass', device_id='device-1')
+    
+    def _request(self, user_agent):
+        return RequestFactory().post('/accounts/login/', {'platform': 'Linux'}, HTTP_USER_AGENT=user_agent)
+    
+    def _age_last_update(self, seconds):
+        self.user.device_metadata['last_updated'] = (timezone.now() - timedelta(seconds=seconds)).isoformat()
+    
+    @override_settings(DEVICE_METADATA_MIN_INTERVAL=300)
+    def test_metadata_is_written_only_when_the_fingerprint_changes(self):
+        """Test that repeat logins skip the write and changes wait for the interval"""
+        with self.assertNumQueries(1):
+            self.user.update_device_metadata(self._request('Firefox'))
+        with self.assertNumQueries(0):
+            self.user.update_device_metadata(self._request('Firefox'))
+            # Changed, but the last write is too recent
+            self.user.update_device_metadata(self._request('Chrome'))
+        
+        self._age_last_update(600)
+        with self.assertNumQueries(1):
+            self.user.update_device_metadata(self._request('Chrome'))
+        
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.device_metadata['user_agent'], 'Chrome')
+    
+    @override_settings(DEVICE_METADATA_DEFERRED=True)
+    def test_deferred_writes_keep_the_newest_fingerprint(self):
+        """Test that queued fingerprints are coalesced per user and written in bulk"""
+        with self.assertNumQueries(0):
+            self.user.update_device_metadata(self._request('Firefox'))
+            self._age_last_update(600)
+            self.user.update_device_metadata(self._request('Chrome'))
+        
+        self.assertEqual(metadata_writer.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.device_metadata['user_agent'], 'Chrome')
+
+class BlockedDomainListAPITests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='listuser',
+            password='testpass123',
+            device_id='6ba7b810-9dad-11d1-80b4-00c04fd430c8'
+        )
+        cls.group = PolicyGroup.objects.create(name='Class 5B')
+        User.objects.filter(pk=cls.user.pk).update(policy_group=cls.group)
+        category = WebCategory.objects.create(name='Games')
+        for i in range(5):
+            BlockedDomain.objects.create(
+                user=cls.user,
+                domain=f'site{i}.com',
+                original_category=category
+            )
+    
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token.key}')
+        self.url = reverse('api_blocked_domains')
+    
+    @override_settings(BLOCKED_DOMAINS_PAGE_SIZE=2)
+    def test_keyset_pagination_covers_every_domain_once(self):
+        """Test that following next_cursor walks the list newest first"""
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(self.url, {'cursor': cursor} if cursor else {})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item['domain'] for item in response.data['results'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        
+        self.assertEqual(seen, [f'site{i}.com' for i in reversed(range(5))])
+    
+    def _add_rows(self, count):
+        """More blocked domains, each with its own category, plus allowed and inherited categories"""
+        start = BlockedDomain.objects.filter(user=self.user).count()
+        for i in range(start, start + count):
+            category = WebCategory.objects.create(name=f'Category {i}')
+            BlockedDomain.objects.create(user=self.user, domain=f'site{i}.com', original_category=category)
+            UserAllowedCategory.objects.create(user=self.user, category=category)
+            self.group.allowed_categories.add(WebCategory.objects.create(name=f'Group category {i}'))
+    
+    def test_list_query_count_does_not_grow_with_rows(self):
+        """Test that the JSON list loads categories with the page, not per row"""
+        for rows in (0, 10):
+            self._add_rows(rows)
+            # Token lookup and the page, with categories joined in
+            identity_cache.clear()
+            with self.assertNumQueries(2):
+                response = self.client.get(self.url)
+            self.assertEqual(len(response.data['results']), 5 + rows)
+    
+    def test_dashboard_query_count_does_not_grow_with_rows(self):
+        """Test that the dashboard renders every section in a fixed number of queries"""
+        client = Client()
+        client.force_login(self.user)
+        for rows in (0, 10):
+            self._add_rows(rows)
+            # User, blocked page, policy group, all/inherited categories, allowed categories
+            with self.assertNumQueries(6):
+                response = client.get(reverse('dashboard'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.context['blocked_domains']), 5 + rows)
+            self.assertContains(response, f'Group category {rows - 1}' if rows else 'site4.com')
+    
+    def test_domain_prefix_filter(self):
+        """Test filtering blocked domains by domain prefix"""
+        response = self.client.get(self.url, {'q': 'Site3'})
+        
+        self.assertEqual(
+            [item['domain'] for item in response.data['results']],
+            ['site3.com']
+        )
+
+
+class BulkClassifyDomainsTests(TestCase):
+    def setUp(self):
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.dumps_dir = os.path.join(work_dir.name, 'dumps')
+        os.makedirs(self.dumps_dir)
+        self.domains_file = os.path.join(work_dir.name, 'domains.txt')
+    
+    def _write_dump(self, domain, text):
+        with open(os.path.join(self.dumps_dir, f'{domain}.txt'), 'w') as f:
+            f.write(text)
+    
+    def test_indexes_dumped_domains_and_skips_indexed_ones(self):
+        """Test that each dumped domain is indexed once and existing verdicts are kept"""
+        indexed_category = WebCategory.objects.create(name='Education')
+        DomainClassification.objects.create(
+            domain='indexed.com',
+            category=indexed_category,
+            confidence=0.9,
+            model_version=classifier.model_version
+        )
+        with open(self.domains_file, 'w') as f:
+            f.write('www.news.com\nnews.com\nshop.com\nindexed.com\nmissing.com\n\n')
+        self._write_dump('news.com', 'Breaking news and headlines from around the world')
+        self._write_dump('shop.com', 'Buy shoes and clothes with free shipping')
+        self._write_dump('indexed.com', 'Online casino and poker')
+        out = io.StringIO()
+        
+        call_command(
+            'bulk_classify_domains', self.domains_file,
+            dumps_dir=self.dumps_dir, workers=2, batch_size=1, stdout=out
+        )
+        
+        self.assertIn('Classifying 3 domains', out.getvalue())
+        self.assertIn('classified=2, missing=1, failed=0', out.getvalue())
+        rows = {row.domain: row for row in DomainClassification.objects.select_related('category')}
+        self.assertEqual(set(rows), {'news.com', 'shop.com', 'indexed.com'})
+        for domain in ('news.com', 'shop.com'):
+            self.assertEqual(rows[domain].model_version, classifier.model_version)
+            self.assertTrue(0 < rows[domain].confidence <= 1)
+            self.assertIn(rows[domain].category.name, classifier.label_encoder.classes_)
+        self.assertEqual(rows['indexed.com'].category, indexed_category)
+
+
+class PruneBlockedDomainsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.heavy = User.objects.create_user(username='heavy', device_id='heavy-device')
+        cls.light = User.objects.create_user(username='light', device_id='light-device')
+        for user, days_ago in [(cls.heavy, days) for days in range(5)] + [(cls.light, 0), (cls.light, 1)]:
+            blocked = BlockedDomain.objects.create(user=user, domain=f'{user.username}{days_ago}.com')
+            BlockedDomain.objects.filter(id=blocked.id).update(blocked_at=timezone.now() - timedelta(days=days_ago, hours=1))
+        manual = BlockedDomain.objects.create(user=cls.heavy, domain='manual.com', is_manual=True)
+        BlockedDomain.objects.filter(id=manual.id).update(blocked_at=timezone.now() - timedelta(days=30))
+    
+    def _prune(self, *args):
+        stdout = io.StringIO()
+        call_command('prune_blocked_domains', '--max-age-days', '3', '--max-per-user', '2', '--batch-size', '1',
+                     *args, stdout=stdout)
+        return stdout.getvalue()
+    
+    def _domains(self):
+        return set(BlockedDomain.objects.values_list('domain', flat=True))
+    
+    def test_dry_run_reports_without_deleting(self):
+        """Test that --dry-run counts the rows it would prune and leaves them"""
+        before = self._domains()
+        
+        self.assertIn("Would delete 3 automatic blocked domains", self._prune('--dry-run'))
+        self.assertEqual(self._domains(), before)
+    
+    def test_prunes_old_and_excess_automatic_blocks_only(self):
+        """Test that retention and the per-user cap keep the newest automatic and all manual blocks"""
+        with tempfile.TemporaryDirectory() as archive_dir:
+            output = self._prune('--archive-dir', archive_dir)
+            archived = [
+                json.loads(line)['domain']
+                for name in os.listdir(archive_dir)
+                for line in gzip.open(os.path.join(archive_dir, name), 'rt')
+            ]
+        
+        self.assertIn("Deleted 3 automatic blocked domains", output)
+        self.assertEqual(self._domains(), {'heavy0.com', 'heavy1.com', 'light0.com', 'light1.com', 'manual.com'})
+        self.assertEqual(sorted(archived), ['heavy2.com', 'heavy3.com', 'heavy4.com'])
+
+class BulkPolicyAPITests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin',
+            password='testpass123',
+            device_id='admin-device'
+        )
+        cls.group = PolicyGroup.objects.create(name='Class 5B')
+        cls.students = [
+            User.objects.create_user(
+                username=f'student{i}',
+                password='testpass123',
+                device_id=f'student-device-{i}',
+                policy_group=cls.group
+            )
+            for i in range(3)
+        ]
+        cls.education = WebCategory.objects.create(name='Education')
+    
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.admin.auth_token.key}')
+    
+    def test_bulk_add_for_group_and_unblock(self):
+        """Test applying category and domain changes to a whole group"""
+        response = self.client.post(
+            reverse('api_policy_bulk'),
+            data={
+                'group': 'Class 5B',
+                'add_categories': ['Education'],
+                'block_domains': ['Games.com']
             },
             format='json'
         )
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['categories_added'], 3)
+        self.assertEqual(
+            BlockedDomain.objects.filter(domain='games.com', is_manual=True).count(),
+            3
+        )
+        
+        response = self.client.post(
+            reverse('api_policy_bulk'),
+            data={
+                'user_ids': [self.students[0].id],
+                'unblock_domains': ['games.com']
+            },
+            format='json'
+        )
+        self.assertEqual(response.data['domains_unblocked'], 1)
+    
+    def test_bulk_remove_overrides_group_grant(self):
+        """Test that removing a category the group grants denies it for the user"""
+        self.group.allowed_categories.add(self.education)
+        
+        response = self.client.post(
+            reverse('api_policy_bulk'),
+            data={'user_ids': [self.students[0].id], 'remove_categories': ['Education']},
+            format='json'
+        )
+        
+        self.assertEqual(response.data['categories_removed'], 1)
+        policy_cache.clear()
+        self.assertNotIn('Education', get_policy(self.students[0].id).allowed_categories)
+        self.assertIn('Education', get_policy(self.students[1].id).allowed_categories)
+    
+    def test_bulk_policy_rejects_unknown_group(self):
+        """Test that a misspelt group name is an error, not a no-op"""
+        response = self.client.post(
+            reverse('api_policy_bulk'),
+            data={'group': 'Class 5C', 'add_categories': ['Education']},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_import_then_export_round_trips_expiry(self):
+        """Test that imported grants keep their expiry and export the same way"""
+        rows = 'username,kind,value,expires_at\nstudent0,category,Education,2030-01-01T00:00:00+00:00\n'
+        
+        response = self.client.generic('POST', reverse('api_policy_import'), rows, content_type='text/csv')
+        self.assertEqual(response.json(), {'rows': 1, 'skipped': 0})
+        
+        response = self.client.get(reverse('api_policy_export'), {'user_ids': self.students[0].id})
+        self.assertEqual(b''.join(response.streaming_content).decode().replace('\r\n', '\n'), rows)
+    
+    def test_import_replaces_conflicting_rows(self):
+        """Test that an imported grant overrides an existing denied, expired row"""
+        UserAllowedCategory.objects.create(
+            user=self.students[0], category=self.education, is_allowed=False,
+            expires_at=timezone.now() - timedelta(days=1)
+        )
+        rows = 'username,kind,value,expires_at\nstudent0,category,Education,\n'
+        
+        response = self.client.generic('POST', reverse('api_policy_import'), rows, content_type='text/csv')
+        
+        self.assertEqual(response.json(), {'rows': 1, 'skipped': 0})
+        grant = UserAllowedCategory.objects.get(user=self.students[0], category=self.education)
+        self.assertEqual((grant.is_allowed, grant.expires_at), (True, None))
+    
+    def test_bulk_block_makes_automatic_blocks_manual_so_pruning_keeps_them(self):
+        """Test that an admin's explicit block survives pruning of automatic blocks"""
+        BlockedDomain.objects.create(user=self.students[0], domain='games.com', original_category=self.education)
+        
+        self.client.post(
+            reverse('api_policy_bulk'),
+            data={'user_ids': [self.students[0].id], 'block_domains': ['games.com', 'Games.com']},
+            format='json'
+        )
+        call_command('prune_blocked_domains', '--max-per-user', '0', stdout=io.StringIO())
+        
+        self.assertTrue(BlockedDomain.objects.get(user=self.students[0], domain='games.com').is_manual)
+    
+    def test_invalid_policy_input_is_rejected(self):
+        """Test that malformed user ids and expiry dates get a 400 rather than an error"""
+        response = self.client.get(reverse('api_policy_export'), {'user_ids': '1,abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        rows = '{"username": "student0", "kind": "category", "value": "Education", "expires_at": "next week"}\n'
+        response = self.client.generic('POST', reverse('api_policy_import'), rows, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expires_at', response.json()['error'])
+        self.assertFalse(UserAllowedCategory.objects.filter(user=self.students[0]).exists())
+    
+    def test_bulk_policy_requires_admin(self):
+        """Test that regular users cannot change policy in bulk"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.students[0].auth_token.key}')
+        response = client.post(
+            reverse('api_policy_bulk'),
+            data={'user_ids': [self.students[1].id], 'add_categories': ['Education']},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class UsageStatsAPITests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='testpass123', device_id='admin-device')
+        cls.student = User.objects.create_user(username='student', password='testpass123', device_id='student-device')
+        cls.day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        ClassificationRollup.objects.create(
+            period='day', period_start=cls.day, user=cls.student, category='Games', count=5, blocked_count=5
+        )
+        ClassificationRollup.objects.create(
+            period='day', period_start=cls.day, user=cls.admin, category='Games', count=2, blocked_count=0
+        )
+        # Not yet rolled up, so it must not show in the stats
+        ClassificationEvent.objects.create(
+            user=cls.student, domain='games.com', category='Games', latency_ms=1,
+            decision=ClassificationEvent.DECISION_BLOCKED, source=ClassificationEvent.SOURCE_INDEX,
+            created_at=cls.day
+        )
+    
+    def _get(self, user, **params):
+        client = APIClient()
+        if user:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+        return client.get(reverse('api_usage_stats'), params)
+    
+    def test_usage_is_answered_from_rollups_only(self):
+        """Test that the stats sum rollup rows and never read the event log"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get(self.admin)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['category'], row['total'], row['blocked']) for row in response.data['results']],
+            [('Games', 7, 5)]
+        )
+        self.assertFalse([q for q in queries if ClassificationEvent._meta.db_table in q['sql']])
+        
+        response = self._get(self.admin, group_by='user', user_id=self.student.id)
+        self.assertEqual(
+            [(row['user'], row['total']) for row in response.data['results']],
+            [(self.student.id, 5)]
+        )
+    
+    def test_usage_requires_an_admin_token(self):
+        """Test that anonymous callers and regular users cannot read usage stats"""
+        self.assertEqual(self._get(None).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._get(self.student).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class PolicyResolutionTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.education = WebCategory.objects.create(name='Education')
+        cls.games = WebCategory.objects.create(name='Games')
+        cls.group = PolicyGroup.objects.create(name='Class 5B')
+        cls.group.allowed_categories.add(cls.education)
+        cls.member = User.objects.create_user(username='member', device_id='member-device', policy_group=cls.group)
+        cls.denied = User.objects.create_user(username='denied', device_id='denied-device', policy_group=cls.group)
+        UserAllowedCategory.objects.create(user=cls.denied, category=cls.education, is_allowed=False)
+    
+    def test_group_grants_are_inherited_and_denials_win(self):
+        """Test that members inherit group categories unless denied individually"""
+        self.assertEqual(get_policy(self.member.id).allowed_categories, {'Education'})
+        self.assertEqual(get_policy(self.denied.id).allowed_categories, frozenset())
+    
+    def test_cached_policy_is_invalidated_on_change(self):
+        """Test that group and user changes reach the cached snapshot after commit"""
+        get_policy(self.member.id)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.allowed_categories.add(self.games)
+        self.assertIn('Games', get_policy(self.member.id).allowed_categories)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            UserAllowedCategory.objects.create(user=self.member, category=self.games, is_allowed=False)
+        self.assertNotIn('Games', get_policy(self.member.id).allowed_categories)
+    
+    def test_regranting_a_category_clears_its_expiry(self):
+        """Test that granting an expired or expiring category again makes it permanent"""
+        expired = timezone.now() - timedelta(days=1)
+        UserAllowedCategory.objects.create(user=self.member, category=self.games, expires_at=expired)
+        UserAllowedCategory.objects.create(user=self.denied, category=self.games, expires_at=expired)
+        
+        apply_bulk_policy([self.member.id], add_categories=[self.games])
+        client = Client()
+        client.force_login(self.denied)
+        client.post(reverse('manage_categories'), {'category_id': self.games.id, 'action': 'add'})
+        
+        for user in (self.member, self.denied):
+            grant = UserAllowedCategory.objects.get(user=user, category=self.games)
+            self.assertEqual((grant.is_allowed, grant.expires_at), (True, None))
+        policy_cache.clear()
+        self.assertIn('Games', get_policy(self.member.id).allowed_categories)
+        self.assertIn('Games', get_policy(self.denied.id).allowed_categories)
+    
+    def test_sweep_deletes_only_expired_grants_and_invalidates_policy(self):
+        """Test that the sweeper removes expired grants, keeps live ones and drops the cached policy"""
+        music = WebCategory.objects.create(name='Music')
+        now = timezone.now()
+        UserAllowedCategory.objects.create(user=self.member, category=self.games, expires_at=now - timedelta(hours=1))
+        UserAllowedCategory.objects.create(user=self.denied, category=self.games, expires_at=now - timedelta(minutes=1))
+        live = UserAllowedCategory.objects.create(user=self.member, category=music, expires_at=now + timedelta(days=1))
+        get_policy(self.member.id)
+        self.assertIsNotNone(policy_cache.get(('user', self.member.id)))
+        out = io.StringIO()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('sweep_expired_permissions', batch_size=1, stdout=out)
+        
+        self.assertIn('Deleted 2 expired permissions', out.getvalue())
+        self.assertFalse(UserAllowedCategory.objects.filter(category=self.games).exists())
+        self.assertTrue(UserAllowedCategory.objects.filter(pk=live.pk).exists())
+        self.assertIsNone(policy_cache.get(('user', self.member.id)))
+        self.assertEqual(get_policy(self.member.id).allowed_categories, {'Education', 'Music'})
+    
+    def test_reclassification_unblocks_only_users_whose_policy_allows(self):
+        """Test that background reclassification resolves group grants and denials"""
+        for user in (self.member, self.denied):
+            BlockedDomain.objects.create(user=user, domain='lessons.com', original_category=self.games)
+        
+        _reconcile_blocks('lessons.com', self.education)
+        
+        self.assertEqual(
+            list(BlockedDomain.objects.filter(domain='lessons.com').values_list('user_id', 'original_category')),
+            [(self.denied.id, self.education.id)]
+        )
+
+
+class ReclassificationQueueTests(TestCase):
+    def setUp(self):
+        policy_cache.clear()
+        self.stdout = io.StringIO()
+    
+    def _task(self, domain, status=ReclassificationTask.STATUS_PENDING, updated_minutes_ago=0):
+        task = ReclassificationTask.objects.create(
+            domain=domain,
+            text_content='Lessons and exercises',
+            reason=ReclassificationTask.REASON_LOW_CONFIDENCE,
+            status=status
+        )
+        ReclassificationTask.objects.filter(id=task.id).update(
+            updated_at=timezone.now() - timedelta(minutes=updated_minutes_ago)
+        )
+        return task
+    
+    def test_worker_claims_pending_and_stuck_tasks_and_stores_results(self):
+        """Test that queued and abandoned tasks are reclassified and in-progress ones left alone"""
+        pending = self._task('pending.com')
+        stuck = self._task('stuck.com', ReclassificationTask.STATUS_RUNNING, updated_minutes_ago=30)
+        running = self._task('running.com', ReclassificationTask.STATUS_RUNNING)
+        result = {'category': 'Education', 'confidence': 0.95, 'model_version': 'v2', 'chunks_processed': 3}
+        
+        with mock.patch.object(classifier, 'predict', return_value=result) as predict, \
+                mock.patch('core.management.commands.process_reclassifications.close_old_connections') as reconnect:
+            call_command('process_reclassifications', '--once', stdout=self.stdout)
+        
+        self.assertTrue(reconnect.called)
+        self.assertEqual(predict.call_args.kwargs['max_chunks'], settings.RECLASSIFY_MAX_CHUNKS)
+        for task in (pending, stuck):
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.attempts), (ReclassificationTask.STATUS_DONE, 1))
+            stored = DomainClassification.objects.get(domain=task.domain)
+            self.assertEqual((stored.category.name, stored.model_version), ('Education', 'v2'))
+        running.refresh_from_db()
+        self.assertEqual((running.status, running.attempts), (ReclassificationTask.STATUS_RUNNING, 0))
+        self.assertFalse(DomainClassification.objects.filter(domain='running.com').exists())
+    
+    def test_repeat_visits_do_not_reset_a_queued_task(self):
+        """Test that enqueueing leaves pending and running tasks alone and requeues finished ones"""
+        running = self._task('running.com', ReclassificationTask.STATUS_RUNNING)
+        ReclassificationTask.objects.filter(id=running.id).update(attempts=2)
+        done = self._task('done.com', ReclassificationTask.STATUS_DONE)
+        
+        self.assertFalse(reclassify.enqueue('running.com', 'New text', ReclassificationTask.REASON_STALE))
+        self.assertTrue(reclassify.enqueue('done.com', 'New text', ReclassificationTask.REASON_STALE))
+        self.assertTrue(reclassify.enqueue('new.com', 'New text', ReclassificationTask.REASON_STALE))
+        
+        running.refresh_from_db()
+        self.assertEqual((running.status, running.attempts, running.text_content),
+                         (ReclassificationTask.STATUS_RUNNING, 2, 'Lessons and exercises'))
+        done.refresh_from_db()
+        self.assertEqual((done.status, done.text_content), (ReclassificationTask.STATUS_PENDING, 'New text'))
+    
+    @override_settings(CLASSIFY_RESULT_MAX_AGE_DAYS=30)
+    def test_reclassified_blocks_are_no_longer_stale(self):
+        """Test that a finished reclassification stops stale visits from queueing it again"""
+        user = User.objects.create_user(username='student', device_id='student-device')
+        games = WebCategory.objects.create(name='Games')
+        block = BlockedDomain.objects.create(user=user, domain='games.com', original_category=games)
+        BlockedDomain.objects.filter(id=block.id).update(blocked_at=timezone.now() - timedelta(days=60))
+        self._task('games.com')
+        result = {'category': 'Games', 'confidence': 0.95, 'model_version': 'v2', 'chunks_processed': 1}
+        
+        with mock.patch.object(classifier, 'predict', return_value=result):
+            call_command('process_reclassifications', '--once', stdout=self.stdout)
+        
+        block.refresh_from_db()
+        self.assertFalse(reclassify.is_stale(block.blocked_at))
+    
+    def test_failing_task_is_retried_until_max_attempts(self):
+        """Test that prediction errors requeue a task and mark it failed at the limit"""
+        task = self._task('broken.com')
+        
+        with mock.patch.object(classifier, 'predict', return_value={'error': 'model unavailable'}) as predict:
+            call_command('process_reclassifications', '--once', '--max-attempts', '2', stdout=self.stdout)
+        
+        task.refresh_from_db()
+        self.assertEqual(predict.call_count, 2)
+        self.assertEqual((task.status, task.attempts), (ReclassificationTask.STATUS_FAILED, 2))
+        self.assertEqual(task.last_error, 'model unavailable')
+        self.assertFalse(DomainClassification.objects.filter(domain='broken.com').exists())
+
+class AdmissionTests(SimpleTestCase):
+    def test_token_bucket_allows_burst_then_limits(self):
+        """Test that a device gets its burst, then a retry-after"""
+        limiter = TokenBucketLimiter(rate=1, burst=2)
+        
+        results = [limiter.allow('device')[0] for _ in range(3)]
+        
+        self.assertEqual(results, [True, True, False])
+        self.assertGreater(limiter.allow('device')[1], 0)
+        self.assertTrue(limiter.allow('other-device')[0])
+    
+    def test_token_bucket_stats_count_only_calls_that_take(self):
+        """Test that check-only calls leave the allowed/limited counters alone"""
+        limiter = TokenBucketLimiter(rate=0.01, burst=1)
+        
+        self.assertTrue(limiter.allow('device', take=False)[0])
+        limiter.allow('device')
+        self.assertFalse(limiter.allow('device', take=False)[0])
+        limiter.allow('device')
+        
+        self.assertEqual(limiter.stats(), {'allowed': 1, 'limited': 1, 'keys': 1})
+    
+    def test_admission_gate_rejects_beyond_capacity(self):
+        """Test that inference slots are capped and released"""
+        gate = AdmissionGate(max_concurrent=1)
+        
+        self.assertTrue(gate.try_enter())
+        self.assertFalse(gate.try_enter())
+        gate.leave()
+        self.assertTrue(gate.try_enter())
+
+
+class PreprocessTests(SimpleTestCase):
+    def test_strips_repeated_lines_and_boilerplate(self):
+        """Test that duplicates and short boilerplate lines are dropped"""
+        text = "\n".join([
+            "Accept all cookies",
+            "Lessons on fractions and decimals for primary school pupils",
+            "Lessons on fractions and decimals for primary school pupils",
+            "Sign in",
+        ])
+        
+        cleaned, stats = TextPreprocessor()(text)
+        
+        self.assertEqual(cleaned, "Lessons on fractions and decimals for primary school pupils")
+        self.assertEqual(stats['duplicate_lines'], 1)
+        self.assertEqual(stats['boilerplate_lines'], 2)
+
+    
+    def test_drops_short_lines_outside_the_pages_script_and_foreign_boilerplate(self):
+        """Test that language switchers and non-English boilerplate go, foreign paragraphs stay"""
+        text = "\n".join([
+            "Lessons on fractions and decimals for primary school pupils with worked examples",
+            "Русский",
+            "日本語",
+            "Alle Cookies akzeptieren",
+            "Mentions légales",
+            "Lecciones sobre fracciones y decimales para alumnos de primaria con ejemplos resueltos",
+            "分数と小数の授業では、小学生向けの練習問題と詳しい解説を毎日少しずつ紹介しています。",
+        ])
+        
+        cleaned, stats = TextPreprocessor()(text)
+        
+        for dropped in ("Русский", "日本語", "Cookies", "légales"):
+            self.assertNotIn(dropped, cleaned)
+        for kept in ("Lessons", "Lecciones", "分数と小数の授業"):
+            self.assertIn(kept, cleaned)
+        self.assertEqual((stats['foreign_script_lines'], stats['boilerplate_lines']), (2, 2))
+    
+    def test_page_script_is_judged_by_words_not_characters(self):
+        """Test that a Japanese page keeps its text and drops stray Latin navigation"""
+        text = "\n".join([
+            "分数と小数の授業、小学生向けの練習問題と解説があります。",
+            "毎日少しずつ学びましょう。先生のための指導案もあります。",
+            "Home About Contact",
+        ])
+        
+        cleaned, stats = TextPreprocessor()(text)
+        
+        self.assertNotIn("Home", cleaned)
+        self.assertEqual(stats['foreign_script_lines'], 1)
+
+class SerialStandInTokenizer(StandInTokenizer):
+    is_fast = False
+
+
+class ChunkingTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        vocabulary = ['pre-processing', 'tokenizer', 'a', 'école', 'x86_64', 'internationalization', '42!', 'gate']
+        self.words = [rng.choice(vocabulary) for _ in range(classifier.batch_tokenize_min_words + 500)]
+    
+    def test_batched_and_serial_chunking_agree(self):
+        """Test that long documents chunk the same with batch and per-word token counts"""
+        batched = classifier._chunk_text(self.words, StandInTokenizer(), max_tokens=64)
+        serial = classifier._chunk_text(self.words, SerialStandInTokenizer(), max_tokens=64)
+        
+        self.assertEqual(batched, serial)
+        self.assertGreater(len(batched[0]), 1)
+        self.assertEqual(batched[0][-1][1], len(self.words))
+    
+    def test_passed_deadline_returns_a_partial_vote(self):
+        """Test that a long page over its deadline is answered from the chunks already evaluated"""
+        # Varied text, so preprocessing keeps it all
+        workload = loadtest.Workload(['long.edu'], ['device-1'], median_words=3000, sigma=0.01)
+        text = workload.page('long.edu')['text']
+        
+        result = classifier.predict(text)
+        self.assertFalse(result['deadline_exceeded'])
+        self.assertEqual(result['chunks_processed'], result['chunks_total'])
+        
+        result = classifier.predict(text, deadline=time.monotonic())
+        self.assertTrue(result['deadline_exceeded'])
+        self.assertGreaterEqual(result['chunks_processed'], 1)
+        self.assertLess(result['chunks_processed'], result['chunks_total'])
+    
+    def test_token_cap_applies_after_preprocessing(self):
+        """Test that boilerplate ahead of the content does not use up the token cap"""
+        workload = loadtest.Workload(['long.edu'], ['device-1'], median_words=1000, sigma=0.01)
+        content = workload.page('long.edu')['text']
+        boilerplate = '\n'.join(f"Sign in to get our newsletter, issue {i}" for i in range(200))
+        
+        capped = classifier.predict(f"{boilerplate}\n{content}", max_tokens=300)
+        
+        self.assertGreater(classifier.predict(content)['chunks_total'], 1)
+        self.assertEqual((capped['truncated'], capped['chunks_total']), (True, 1))
+        self.assertEqual(capped, classifier.predict(content, max_tokens=300))
+    
+    def test_oversized_first_word_gets_its_own_chunk(self):
+        """Test that a word longer than max_tokens never leaves an empty chunk before it"""
+        chunks, total_tokens, _, _ = classifier._chunk_text(['a' * 60, 'b'], StandInTokenizer(), max_tokens=5)
+        
+        self.assertEqual(chunks, [(0, 1), (1, 2)])
+        self.assertEqual(total_tokens, 11)
+        self.assertEqual(classifier._chunk_text([], StandInTokenizer()), ([], 0, False, False))
+
+class FallbackTests(SimpleTestCase):
+    def setUp(self):
+        fallback = mock.Mock()
+        fallback.predict.side_effect = lambda text: {'category': 'Education', 'confidence': 0.7}
+        patcher = mock.patch.object(classifier, 'fallback', fallback)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(classifier, '_in_flight', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def _mode(self, **limits):
+        return classifier.classify('Lessons and exercises for every grade', **limits)['mode']
+    
+    def test_switches_when_too_many_predictions_are_running(self):
+        """Test that the fallback answers once in-flight full predictions reach the limit"""
+        self.assertEqual(self._mode(max_in_flight=2), 'full')
+        
+        classifier._in_flight.update({-1: time.monotonic(), -2: time.monotonic()})
+        self.assertEqual(self._mode(max_in_flight=2), 'fallback')
+        self.assertEqual(self._mode(max_in_flight=3), 'full')
+    
+    def test_switches_when_the_oldest_prediction_is_over_budget(self):
+        """Test that a stalled full prediction sends new requests to the fallback"""
+        classifier._in_flight[-1] = time.monotonic() - 1
+        
+        self.assertEqual(self._mode(latency_budget_ms=5000), 'full')
+        self.assertEqual(self._mode(latency_budget_ms=500), 'fallback')
+        self.assertEqual(self._mode(deadline=time.monotonic() - 1), 'fallback')
+
+class LoadTestWorkloadTests(SimpleTestCase):
+    def test_popular_domains_dominate_and_pages_are_stable(self):
+        """Test that the request mix follows domain popularity deterministically"""
+        workload = loadtest.Workload(loadtest.synthetic_domains(100), ['device-1'], median_words=200)
+        rng = random.Random(0)
+        
+        domains = [workload.next_request(rng)[1] for _ in range(1000)]
+        
+        self.assertGreater(domains.count('loadtest-site1.com'), domains.count('loadtest-site50.com'))
+        self.assertEqual(workload.page('loadtest-site1.com'), workload.page('loadtest-site1.com'))
+
+    def test_saturation_is_where_throughput_stops_growing(self):
+        """Test that the saturation point is the last stage that still added throughput"""
+        stages = [
+            {'concurrency': c, 'throughput_rps': rps, 'error_rate': 0, 'rejected_rate': 0}
+            for c, rps in [(1, 10), (2, 19), (4, 30), (8, 31)]
+        ]
+        
+        self.assertEqual(loadtest.find_saturation(stages), 4)
+        self.assertIsNone(loadtest.find_saturation(stages[:3]))
+
+
+class LoadTestCleanupTests(TestCase):
+    def test_clean_up_restores_real_domains_and_removes_new_rows(self):
+        """Test that a run over real domains leaves the index and queue as it found them"""
+        news = WebCategory.objects.create(name='News')
+        games = WebCategory.objects.create(name='Games')
+        existing = DomainClassification.objects.create(
+            domain='example.com', category=news, confidence=0.9, model_version='v1'
+        )
+        command = LoadTestCommand(stdout=io.StringIO())
+        snapshot = command._snapshot(['www.example.com', 'other.org'])
+        
+        # What classify_website and the reclassification queue do during a run
+        DomainClassification.objects.filter(id=existing.id).update(
+            category=games, confidence=0.2, model_version='stand-in'
+        )
+        DomainClassification.objects.create(domain='other.org', category=games, model_version='stand-in')
+        ReclassificationTask.objects.create(domain='other.org', reason=ReclassificationTask.REASON_LOW_CONFIDENCE)
+        user = User.objects.create_user(username='loadtest-device', device_id='loadtest-device')
+        command._clean_up([user], snapshot)
+        
+        existing.refresh_from_db()
+        self.assertEqual((existing.category, existing.confidence, existing.model_version), (news, 0.9, 'v1'))
+        self.assertFalse(DomainClassification.objects.filter(domain='other.org').exists())
+        self.assertFalse(ReclassificationTask.objects.exists())
+        self.assertFalse(User.objects.filter(id=user.id).exists())
+
+class ModelReloadTests(SimpleTestCase):
+    def setUp(self):
+        original = classifier._bundle
+        self.addCleanup(setattr, classifier, '_bundle', original)
+        model_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(model_dir.cleanup)
+        self.model_dir = model_dir.name
+        with open(os.path.join(self.model_dir, 'config.json'), 'w') as f:
+            f.write('{"num_labels": 16}')
+    
+    def _write_weights(self, content):
+        with open(os.path.join(self.model_dir, 'model.safetensors'), 'wb') as f:
+            f.write(content)
+    
+    def _load_bundle(self, name, model_dir, label_encoder_path):
+        return ModelBundle(
+            *stand_in_components(label_encoder_path, ms_per_token=0),
+            version=classifier._compute_version(model_dir, label_encoder_path),
+            name=name
+        )
+    
+    def test_reload_switches_when_only_the_weights_change(self):
+        """Test that retrained weights with the same config get a new version"""
+        paths = ('retrained', self.model_dir, LABEL_ENCODER_PATH)
+        with mock.patch('ml_model.classifier.current_model_paths', return_value=paths), \
+                mock.patch.object(classifier, '_load_bundle', side_effect=self._load_bundle):
+            self._write_weights(b'first weights')
+            self.assertTrue(classifier.reload(force=True, warmup_rounds=0))
+            first_version = classifier.model_version
+            self.assertFalse(classifier.reload(warmup_rounds=0))
+            
+            self._write_weights(b'other weights')
+            self.assertTrue(classifier.reload(warmup_rounds=0))
+        
+        self.assertNotEqual(classifier.model_version, first_version)
+
+
+class ActivateModelTests(SimpleTestCase):
+    def setUp(self):
+        versions_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(versions_dir.cleanup)
+        self.versions_dir = versions_dir.name
+        self.current_file = os.path.join(self.versions_dir, 'CURRENT')
+        for patcher in (
+            mock.patch('ml_model.paths.MODEL_VERSIONS_DIR', self.versions_dir),
+            mock.patch('ml_model.paths.CURRENT_VERSION_FILE', self.current_file),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def _make_version(self, name, weights=True):
+        model_dir = os.path.join(self.versions_dir, name)
+        os.makedirs(model_dir)
+        for filename in ('config.json', 'label_encoder.joblib') + (('model.safetensors',) if weights else ()):
+            with open(os.path.join(model_dir, filename), 'w') as f:
+                f.write('{}')
+    
+    def _activate(self, name):
+        out = io.StringIO()
+        call_command('activate_model', name, stdout=out)
+        return out.getvalue()
+    
+    def _current(self):
+        with open(self.current_file) as f:
+            return f.read().strip()
+    
+    def test_switches_between_versions(self):
+        """Test that each activation repoints CURRENT and names the version it replaced"""
+        self._make_version('v1')
+        self._make_version('v2')
+        
+        self.assertIn('Activated v1 (was default)', self._activate('v1'))
+        self.assertEqual(self._current(), 'v1')
+        self.assertIn('Activated v2 (was v1)', self._activate('v2'))
+        self.assertEqual(self._current(), 'v2')
+    
+    def test_rejects_a_directory_without_weights(self):
+        """Test that a version missing its weight files is refused and CURRENT is left alone"""
+        self._make_version('v1')
+        self._make_version('broken', weights=False)
+        self._activate('v1')
+        
+        with self.assertRaisesMessage(CommandError, 'has no weight files'):
+            self._activate('broken')
+        self.assertEqual(self._current(), 'v1')
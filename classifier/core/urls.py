@@ -3,7 +3,14 @@ from . import views
 
 urlpatterns = [
     path('api/classify/', views.classify_website, name='classify'),
+    path('api/classify/precheck/', views.precheck_domain, name='classify_precheck'),
     path('api/register/', views.RegisterAPIView.as_view(), name='api_register'),
+    path('api/ready/', views.readiness, name='readiness'),
+    path('api/blocked-domains/', views.BlockedDomainListAPIView.as_view(), name='api_blocked_domains'),
+    path('api/policy/bulk/', views.BulkPolicyAPIView.as_view(), name='api_policy_bulk'),
+    path('api/policy/export/', views.PolicyExportAPIView.as_view(), name='api_policy_export'),
+    path('api/policy/import/', views.PolicyImportAPIView.as_view(), name='api_policy_import'),
+    path('api/stats/usage/', views.UsageStatsAPIView.as_view(), name='api_usage_stats'),
     path('api/get-device-id/', views.GetDeviceIDAPIView.as_view(), name='get_device_id'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('manage-categories/', views.manage_categories, name='manage_categories'),
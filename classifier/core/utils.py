@@ -0,0 +1,30 @@
+import tldextract
+
+from .models import WebCategory
+
+
+def extract_main_domain(domain: str) -> str:
+    """Reduce a host or URL to its registrable domain (www.google.com → google.com)"""
+    extracted = tldextract.extract(domain)
+    return f"{extracted.domain}.{extracted.suffix}"
+
+
+def blocklist_candidates(domain: str) -> list:
+    """A host and its parents down to the registrable domain, any of which a blocklist entry may name
+
+    a.sub.games.com → ['a.sub.games.com', 'sub.games.com', 'games.com'], so an
+    entry blocks its own domain and every subdomain of it.
+    """
+    extracted = tldextract.extract(domain)
+    labels = [label for label in extracted.subdomain.lower().split('.') if label]
+    main_domain = f"{extracted.domain}.{extracted.suffix}".lower()
+    return ['.'.join([*labels[i:], main_domain]) for i in range(len(labels))] + [main_domain]
+
+
+def get_or_create_category(name: str) -> WebCategory:
+    """Fetch a category by name, creating it on first use"""
+    web_category, _ = WebCategory.objects.get_or_create(
+        name=name,
+        defaults={'description': f'Automatically created category: {name}'}
+    )
+    return web_category
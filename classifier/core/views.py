@@ -1,23 +1,47 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import login as auth_login, logout as auth_logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.cache import patch_cache_control
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
-from .models import User, UserAllowedCategory, BlockedDomain, WebCategory
+from django.utils import timezone
+from .models import (
+    User, UserAllowedCategory, BlockedDomain, WebCategory, DomainClassification,
+    ReclassificationTask, PolicyGroup, ClassificationEvent, ClassificationRollup
+)
 from ml_model.classifier import classifier
-import tldextract
+import codecs
+import csv
+import itertools
 import json
 import logging
+import math
+import time
 import uuid
+import zlib
+from datetime import datetime
 from .forms import CustomUserCreationForm
+from .profiling import profile_request
+from .utils import blocklist_candidates, extract_main_domain, get_or_create_category
+from . import reclassify
+from .audit import audit_log, record_classification
+from .ratelimit import admission_stats, device_limiter, inference_gate
+from .rollups import default_since, usage_series
+from .identity import get_identity_by_device
+from .pagination import keyset_page
+from .policy import (
+    POLICY_EXPORT_FIELDS, apply_bulk_policy, export_policy_rows,
+    get_policy, import_policy_rows
+)
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import UserRegistrationSerializer
-from rest_framework.permissions import AllowAny
+from .serializers import UserRegistrationSerializer, BulkPolicySerializer
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.contrib.auth import authenticate
 from rest_framework import serializers
 
@@ -107,8 +131,8 @@ def login_view(request):
                         'error': 'Device verification failed'
                     })
             
+            # Device metadata was already refreshed by DeviceAwareAuthBackend
             auth_login(request, user)
-            user.update_device_metadata(request)
             return redirect('dashboard')
     else:
         form = AuthenticationForm()
@@ -120,21 +144,196 @@ def logout_view(request):
     return redirect('login')
 
 # Main Application Views
+def _blocked_domains_page(request, user):
+    """Keyset-paginated blocked domains for a user, filtered by domain prefix"""
+    blocked_domains = BlockedDomain.objects.filter(user=user).select_related('original_category')
+    query = request.GET.get('q', '').strip().lower()
+    if query:
+        blocked_domains = blocked_domains.filter(domain__startswith=query)
+    page, next_cursor = keyset_page(
+        blocked_domains,
+        cursor=request.GET.get('cursor'),
+        page_size=getattr(settings, 'BLOCKED_DOMAINS_PAGE_SIZE', 50)
+    )
+    return page, next_cursor, query
+
 @login_required
 def dashboard(request):
-    allowed_categories = UserAllowedCategory.objects.filter(user=request.user)
-    blocked_domains = BlockedDomain.objects.filter(user=request.user).order_by('-blocked_at')
+    allowed_categories = UserAllowedCategory.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()),
+        user=request.user,
+        is_allowed=True
+    ).select_related('category')
+    # Inherited categories the user has no explicit row for
+    group_categories = WebCategory.objects.filter(
+        policy_groups__id=request.user.policy_group_id
+    ).exclude(
+        id__in=UserAllowedCategory.objects.filter(user=request.user).values('category_id')
+    ) if request.user.policy_group_id else WebCategory.objects.none()
+    blocked_domains, next_cursor, query = _blocked_domains_page(request, request.user)
     all_categories = WebCategory.objects.all()
     
     context = {
         'allowed_categories': allowed_categories,
+        'group_categories': group_categories,
+        'policy_group': request.user.policy_group,
         'blocked_domains': blocked_domains,
+        'next_cursor': next_cursor,
+        'query': query,
         'all_categories': all_categories,
         'uuid': request.user.uuid,
         'requires_device_auth': request.user.requires_device_auth
     }
     return render(request, 'core/dashboard.html', context)
 
+class BulkPolicyAPIView(APIView):
+    """Apply many policy changes to a set of users or a group at once"""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = BulkPolicySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        users = User.objects.filter(id__in=data['user_ids'])
+        if data.get('group'):
+            if not PolicyGroup.objects.filter(name=data['group']).exists():
+                return Response(
+                    {'error': f"Unknown policy group: {data['group']}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            users = User.objects.filter(
+                Q(id__in=data['user_ids']) | Q(policy_group__name=data['group'])
+            )
+        user_ids = set(users.values_list('id', flat=True))
+
+        names = set(data['add_categories']) | set(data['remove_categories'])
+        categories = {c.name: c for c in WebCategory.objects.filter(name__in=names)}
+        unknown = names - set(categories)
+        if unknown:
+            return Response(
+                {'error': f"Unknown categories: {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        counts = apply_bulk_policy(
+            user_ids,
+            add_categories=[categories[name] for name in data['add_categories']],
+            remove_categories=[categories[name] for name in data['remove_categories']],
+            block_domains=data['block_domains'],
+            unblock_domains=data['unblock_domains']
+        )
+        return Response({'users': len(user_ids), **counts})
+
+class _Echo:
+    """File-like object whose write returns the value, for streaming csv"""
+    def write(self, value):
+        return value
+
+class PolicyExportAPIView(APIView):
+    """Stream allowed categories and blocked domains as CSV or JSON lines"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        user_ids = request.GET.get('user_ids')
+        if user_ids:
+            try:
+                user_ids = [int(user_id) for user_id in user_ids.split(',')]
+            except ValueError:
+                return Response(
+                    {'error': 'user_ids must be comma-separated integers'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        rows = export_policy_rows(user_ids or None)
+
+        if request.GET.get('export_format') == 'jsonl':
+            return StreamingHttpResponse(
+                (json.dumps(row) + '\n' for row in rows),
+                content_type='application/x-ndjson'
+            )
+
+        writer = csv.DictWriter(_Echo(), fieldnames=POLICY_EXPORT_FIELDS)
+        lines = itertools.chain(
+            [writer.writeheader()],
+            (writer.writerow(row) for row in rows)
+        )
+        response = StreamingHttpResponse(lines, content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="policy.csv"'
+        return response
+
+class PolicyImportAPIView(APIView):
+    """Import a CSV or JSON-lines policy export, reading the body as a stream"""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        lines = codecs.iterdecode(request.stream, 'utf-8')
+        if request.content_type.startswith('text/csv'):
+            rows = csv.DictReader(lines)
+        elif request.content_type.startswith('application/x-ndjson'):
+            rows = (json.loads(line) for line in lines if line.strip())
+        else:
+            return Response(
+                {'error': 'Expected text/csv or application/x-ndjson'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        try:
+            counts = import_policy_rows(rows)
+        except (ValueError, csv.Error) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(counts)
+
+class BlockedDomainListAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        blocked_domains, next_cursor, _ = _blocked_domains_page(request, request.user)
+        return Response({
+            'results': [
+                {
+                    'id': blocked.id,
+                    'domain': blocked.domain,
+                    'category': blocked.original_category.name if blocked.original_category else None,
+                    'blocked_at': blocked.blocked_at,
+                    'is_manual': blocked.is_manual
+                }
+                for blocked in blocked_domains
+            ],
+            'next_cursor': next_cursor
+        })
+
+class UsageStatsAPIView(APIView):
+    """Classification counts over time, answered from the rollup tables only"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        period = request.GET.get('period', ClassificationRollup.PERIOD_DAY)
+        group_by = request.GET.get('group_by', 'category')
+        if period not in (ClassificationRollup.PERIOD_HOUR, ClassificationRollup.PERIOD_DAY) \
+                or group_by not in ('category', 'user'):
+            return Response(
+                {'error': 'period must be hour or day and group_by category or user'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            since = _parse_datetime_param(request.GET.get('since')) or default_since(period, timezone.now())
+            until = _parse_datetime_param(request.GET.get('until'))
+            user_id = int(request.GET['user_id']) if request.GET.get('user_id') else None
+        except ValueError:
+            return Response({'error': 'Invalid since, until or user_id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'period': period,
+            'since': since,
+            'results': list(usage_series(period, since, until, user_id, group_by))
+        })
+
+def _parse_datetime_param(value):
+    """ISO date or datetime query parameter, made timezone-aware"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
 @login_required
 def manage_categories(request):
     if request.method == 'POST':
@@ -144,17 +343,31 @@ def manage_categories(request):
         if action == 'add':
             try:
                 category = WebCategory.objects.get(id=category_id)
-                UserAllowedCategory.objects.get_or_create(
+                UserAllowedCategory.objects.update_or_create(
                     user=request.user,
-                    category=category
+                    category=category,
+                    # A re-grant is permanent, whatever expiry the old row had
+                    defaults={'is_allowed': True, 'expires_at': None}
                 )
             except ObjectDoesNotExist:
                 logger.error(f"Category {category_id} not found")
         elif action == 'remove':
-            UserAllowedCategory.objects.filter(
-                user=request.user,
-                category_id=category_id
-            ).delete()
+            inherited = request.user.policy_group_id and PolicyGroup.objects.filter(
+                id=request.user.policy_group_id,
+                allowed_categories__id=category_id
+            ).exists()
+            if inherited:
+                # Override the group's allowance for this user only
+                UserAllowedCategory.objects.update_or_create(
+                    user=request.user,
+                    category_id=category_id,
+                    defaults={'is_allowed': False, 'expires_at': None}
+                )
+            else:
+                UserAllowedCategory.objects.filter(
+                    user=request.user,
+                    category_id=category_id
+                ).delete()
     
     return redirect('dashboard')
 
@@ -172,13 +385,205 @@ def unblock_domain(request, domain_id):
     return redirect('dashboard')
 
 # API Views
+def readiness(request):
+    """Report whether this worker has finished model warm-up"""
+    return JsonResponse({
+        'ready': classifier.ready,
+        'model_version': classifier.model_version,
+        'model_name': classifier.model_name,
+        'warmup_ms': classifier.warmup_timings,
+        'admission': admission_stats(),
+        'preprocess': classifier.preprocessor.stats() if classifier.preprocessor else None,
+        'memory': classifier.memory.snapshot(classifier.device),
+        'audit': audit_log.stats()
+    }, status=200 if classifier.ready else 503)
+
+def _audit(started, user_id, domain, source, block, category='', confidence=None):
+    """Buffer an audit event for a classify_website decision"""
+    record_classification(
+        user_id=user_id,
+        domain=domain,
+        category=category,
+        confidence=confidence,
+        decision=ClassificationEvent.DECISION_BLOCKED if block else ClassificationEvent.DECISION_ALLOWED,
+        source=source,
+        cache_hit=source not in (ClassificationEvent.SOURCE_MODEL, ClassificationEvent.SOURCE_FALLBACK),
+        latency_ms=(time.monotonic() - started) * 1000,
+        model_version={
+            ClassificationEvent.SOURCE_BLOCKLIST: '',
+            ClassificationEvent.SOURCE_FALLBACK: classifier.fallback.version if classifier.fallback else '',
+        }.get(source, classifier.model_version)
+    )
+
+
+class UnsupportedEncoding(Exception):
+    pass
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def _decoded_body(request) -> bytes:
+    """Request body, inflated when sent with Content-Encoding gzip or deflate"""
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    if encoding not in ('identity', 'gzip', 'deflate'):
+        raise UnsupportedEncoding(f"Unsupported Content-Encoding: {encoding}")
+    max_size = getattr(settings, 'CLASSIFY_MAX_BODY_BYTES', 2 * 1024 * 1024)
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    # Checked before reading, so an oversized upload is never buffered
+    if content_length > max_size:
+        raise BodyTooLarge()
+    if encoding == 'identity':
+        return request.body
+
+    # wbits=47 accepts both gzip and zlib framing
+    decompressor = zlib.decompressobj(wbits=47)
+    body = decompressor.decompress(request.body, max_size)
+    if decompressor.unconsumed_tail:
+        raise BodyTooLarge()
+    return body
+
+
+class InvalidPayload(Exception):
+    pass
+
+
+def _compact_text(data: dict) -> str:
+    """Join the fields of a compact payload into text for the classifier"""
+    headings = data.get('headings') or []
+    if not isinstance(headings, list) or not all(isinstance(heading, str) for heading in headings):
+        raise InvalidPayload("headings must be a list of strings")
+    parts = [data.get('title'), data.get('description'), *headings, data.get('text')]
+    return '\n'.join(part.strip() for part in parts if isinstance(part, str) and part.strip())
+
+
+def _request_deadline(request, started: float) -> float:
+    """time.monotonic() deadline from X-Request-Deadline-Ms, capped by CLASSIFY_DEADLINE_MS"""
+    budget_ms = getattr(settings, 'CLASSIFY_DEADLINE_MS', None)
+    try:
+        client_ms = float(request.headers.get('X-Request-Deadline-Ms', ''))
+    except ValueError:
+        client_ms = None
+    if client_ms is not None and client_ms > 0:
+        budget_ms = min(client_ms, budget_ms) if budget_ms else client_ms
+    return started + budget_ms / 1000 if budget_ms else None
+
+
+def _too_many_requests(reason: str, retry_after: float) -> JsonResponse:
+    response = JsonResponse({'error': reason}, status=429)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def _with_cache_hint(response, provisional=False):
+    """Tell the extension how long it may reuse this verdict for the domain"""
+    if provisional:
+        max_age = getattr(settings, 'CLASSIFY_CLIENT_CACHE_PROVISIONAL_SECONDS', 60)
+    else:
+        max_age = getattr(settings, 'CLASSIFY_CLIENT_CACHE_SECONDS', 900)
+    patch_cache_control(response, private=True, max_age=max_age)
+    # Lets clients drop cached verdicts when the served model changes
+    response['X-Model-Version'] = classifier.model_version
+    return response
+
+
 @csrf_exempt
+def precheck_domain(request):
+    """Answer from blocklists and the domain index alone, without page text.
+
+    Responds with need_content=True when only the model can decide, in which
+    case the extension follows up with a full classify_website request.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'method_not_allowed'}, status=405)
+
+    started = time.monotonic()
+    try:
+        data = json.loads(_decoded_body(request))
+        domain = data.get('domain')
+        device_id = data.get('device_id')
+        if not all([domain, device_id]):
+            return JsonResponse({'error': 'Missing required parameters'}, status=400)
+        user_id = get_identity_by_device(device_id).id
+        main_domain = extract_main_domain(domain)
+        candidates = blocklist_candidates(domain)
+        policy = get_policy(user_id)
+
+        if not policy.blocked_domains.isdisjoint(candidates) or BlockedDomain.objects.filter(
+            user_id=user_id,
+            domain__in=candidates
+        ).exists():
+            _audit(started, user_id, main_domain, ClassificationEvent.SOURCE_BLOCKLIST, True)
+            return _with_cache_hint(JsonResponse({
+                'need_content': False,
+                'block': True,
+                'reason': 'domain_blocked',
+                'domain': main_domain
+            }))
+
+        indexed = DomainClassification.objects.select_related('category').filter(
+            domain=main_domain,
+            model_version=classifier.model_version
+        ).first()
+        if not indexed and device_limiter is not None:
+            # Only the model can answer; a throttled device should wait rather than upload the page
+            allowed, retry_after = device_limiter.allow(device_id, take=False)
+            if not allowed:
+                return _too_many_requests('rate_limited', retry_after)
+        # Stale entries need page text so they can be queued for reclassification
+        if not indexed or reclassify.is_stale(indexed.classified_at):
+            response = JsonResponse({'need_content': True, 'domain': main_domain})
+            patch_cache_control(response, no_store=True)
+            return response
+
+        category = indexed.category.name
+        block = category not in policy.allowed_categories
+        if block:
+            BlockedDomain.objects.get_or_create(
+                user_id=user_id,
+                domain=main_domain,
+                defaults={'original_category': indexed.category}
+            )
+        _audit(started, user_id, main_domain, ClassificationEvent.SOURCE_INDEX, block, category, indexed.confidence)
+        return _with_cache_hint(JsonResponse({
+            'need_content': False,
+            'block': block,
+            'category': category,
+            'confidence': indexed.confidence,
+            'domain': main_domain,
+            'provisional': False
+        }))
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON payload'}, status=400)
+    except UnsupportedEncoding as e:
+        return JsonResponse({'error': str(e)}, status=415)
+    except zlib.error:
+        return JsonResponse({'error': 'Invalid compressed payload'}, status=400)
+    except BodyTooLarge:
+        return JsonResponse({'error': 'payload_too_large'}, status=413)
+    except User.DoesNotExist:
+        return JsonResponse({'error': 'unknown_device'}, status=401)
+    except Exception as e:
+        logger.error(f"Precheck error: {str(e)}", exc_info=True)
+        return JsonResponse({'error': 'internal_server_error'}, status=500)
+
+
+@csrf_exempt
+@profile_request
 def classify_website(request):
     if request.method == 'POST':
+        started = time.monotonic()
+        deadline = _request_deadline(request, started)
         try:
-            data = json.loads(request.body)
+            data = json.loads(_decoded_body(request))
             domain = data.get('domain')
-            text_content = data.get('text_content')
+            # Full page text, or the extension's compact sample
+            text_content = data.get('text_content') or _compact_text(data)
             device_id = data.get('device_id')
             
             if not all([domain, text_content, device_id]):
@@ -186,47 +591,112 @@ def classify_website(request):
                     {'error': 'Missing required parameters'},
                     status=400
                 )
-            user = User.objects.get(device_id=device_id)
-            user_id = user.id
+            user_id = get_identity_by_device(device_id).id
             # Extract main domain (e.g., www.google.com → google.com)
-            extracted = tldextract.extract(domain)
-            main_domain = f"{extracted.domain}.{extracted.suffix}"
+            main_domain = extract_main_domain(domain)
+            
+            policy = get_policy(user_id)
             
-            # Check if domain is already blocked
-            if BlockedDomain.objects.filter(
+            # Check if the domain or a parent of it is blocked, for the user or their group
+            candidates = blocklist_candidates(domain)
+            if not policy.blocked_domains.isdisjoint(candidates):
+                _audit(started, user_id, main_domain, ClassificationEvent.SOURCE_BLOCKLIST, True)
+                return _with_cache_hint(JsonResponse({
+                    'block': True,
+                    'reason': 'domain_blocked',
+                    'domain': main_domain
+                }))
+            blocked = BlockedDomain.objects.filter(
                 user_id=user_id,
-                domain__icontains=main_domain
-            ).exists():
-                return JsonResponse({
+                domain__in=candidates
+            ).values('is_manual', 'blocked_at').first()
+            if blocked:
+                if not blocked['is_manual'] and reclassify.is_stale(blocked['blocked_at']):
+                    reclassify.enqueue(main_domain, text_content, ReclassificationTask.REASON_STALE)
+                _audit(started, user_id, main_domain, ClassificationEvent.SOURCE_BLOCKLIST, True)
+                return _with_cache_hint(JsonResponse({
                     'block': True,
                     'reason': 'domain_blocked',
                     'domain': main_domain
-                })
+                }))
             
-            # Get user's allowed categories
-            allowed_categories = set(
-                UserAllowedCategory.objects.filter(user_id=user_id)
-                .values_list('category__name', flat=True)
-            )
-            
-            # Classify the content
-            classification_result = classifier.predict(text_content)
-            
-            if 'error' in classification_result:
-                logger.error(f"Classification failed: {classification_result['error']}")
-                return JsonResponse({
-                    'error': 'classification_failed',
-                    'details': classification_result['error']
-                }, status=500)
+            # Get user's allowed categories, including inherited ones
+            allowed_categories = policy.allowed_categories
             
-            category = classification_result['category']
-            confidence = classification_result.get('confidence', 0)
+            # Answer from the precomputed domain index when possible
+            indexed = DomainClassification.objects.select_related('category').filter(
+                domain=main_domain,
+                model_version=classifier.model_version
+            ).first()
+            provisional = False
+            partial = False
+            mode = 'full'
+            source = ClassificationEvent.SOURCE_INDEX if indexed else ClassificationEvent.SOURCE_MODEL
             
-            # Create category if it doesn't exist
-            web_category, _ = WebCategory.objects.get_or_create(
-                name=category,
-                defaults={'description': f'Automatically created category: {category}'}
-            )
+            if indexed:
+                web_category = indexed.category
+                category = web_category.name
+                confidence = indexed.confidence
+                if reclassify.is_stale(indexed.classified_at):
+                    reclassify.enqueue(main_domain, text_content, ReclassificationTask.REASON_STALE)
+                    provisional = True
+            else:
+                # Only model work is throttled; blocklist and index answers above are always served
+                if device_limiter is not None:
+                    allowed, retry_after = device_limiter.allow(device_id)
+                    if not allowed:
+                        return _too_many_requests('rate_limited', retry_after)
+                if not inference_gate.try_enter():
+                    return _too_many_requests('overloaded', 1)
+                try:
+                    # Classify the content, bounding the synchronous work and
+                    # degrading to the fallback model when the main one is saturated
+                    classification_result = classifier.classify(
+                        text_content,
+                        max_chunks=getattr(settings, 'CLASSIFY_MAX_CHUNKS', None),
+                        max_in_flight=getattr(settings, 'CLASSIFY_FALLBACK_MAX_IN_FLIGHT', None),
+                        latency_budget_ms=getattr(settings, 'CLASSIFY_FALLBACK_LATENCY_MS', None),
+                        deadline=deadline,
+                        max_tokens=getattr(settings, 'CLASSIFY_MAX_TOKENS', None)
+                    )
+                finally:
+                    inference_gate.leave()
+                
+                if 'error' in classification_result:
+                    logger.error(f"Classification failed: {classification_result['error']}")
+                    return JsonResponse({
+                        'error': 'classification_failed',
+                        'details': classification_result['error']
+                    }, status=500)
+                
+                category = classification_result['category']
+                confidence = classification_result.get('confidence', 0)
+                
+                mode = classification_result['mode']
+                partial = classification_result.get('deadline_exceeded', False)
+                
+                # Create category if it doesn't exist
+                web_category = get_or_create_category(category)
+                
+                if mode != 'full':
+                    source = ClassificationEvent.SOURCE_FALLBACK
+                
+                # Fallback, partial and uncertain verdicts are revisited in the
+                # background and only indexed once reclassification settles them
+                reason = reclassify.needs_reclassification(classification_result)
+                if reason:
+                    reclassify.enqueue(main_domain, text_content, reason)
+                    provisional = True
+                else:
+                    DomainClassification.objects.update_or_create(
+                        domain=main_domain,
+                        defaults={
+                            'category': web_category,
+                            'confidence': confidence,
+                            'model_version': classification_result['model_version'],
+                            'classified_at': timezone.now()
+                        }
+                    )
             
             # Decision to block
             if category not in allowed_categories:
@@ -235,25 +705,46 @@ def classify_website(request):
                     domain=main_domain,
                     original_category=web_category
                 )
-                return JsonResponse({
+                _audit(started, user_id, main_domain, source, True, category, confidence)
+                return _with_cache_hint(JsonResponse({
                     'block': True,
                     'category': category,
                     'confidence': confidence,
-                    'domain': main_domain
-                })
+                    'domain': main_domain,
+                    'provisional': provisional,
+                    'partial': partial,
+                    'mode': mode
+                }), provisional)
             
-            return JsonResponse({
+            _audit(started, user_id, main_domain, source, False, category, confidence)
+            return _with_cache_hint(JsonResponse({
                 'block': False,
                 'category': category,
                 'confidence': confidence,
-                'domain': main_domain
-            })
+                'domain': main_domain,
+                'provisional': provisional,
+                'partial': partial,
+                'mode': mode
+            }), provisional)
             
         except json.JSONDecodeError:
             return JsonResponse(
                 {'error': 'Invalid JSON payload'},
                 status=400
             )
+        except UnsupportedEncoding as e:
+            return JsonResponse({'error': str(e)}, status=415)
+        except zlib.error:
+            return JsonResponse(
+                {'error': 'Invalid compressed payload'},
+                status=400
+            )
+        except InvalidPayload as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except BodyTooLarge:
+            return JsonResponse({'error': 'payload_too_large'}, status=413)
+        except User.DoesNotExist:
+            return JsonResponse({'error': 'unknown_device'}, status=401)
         except Exception as e:
             logger.error(f"Classification error: {str(e)}", exc_info=True)
             return JsonResponse(
@@ -0,0 +1,57 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_classifier():
+    """Warm the classifier up at worker boot, before any request is served"""
+    from ml_model.classifier import classifier
+
+    if not getattr(settings, 'CLASSIFIER_WARMUP_ENABLED', True):
+        classifier.ready = True
+        return {}
+
+    try:
+        return classifier.warm_up(rounds=getattr(settings, 'CLASSIFIER_WARMUP_ROUNDS', 2))
+    except Exception as e:
+        # A failed warm-up leaves the worker unready rather than crashing it
+        logger.error(f"Model warm-up failed: {str(e)}", exc_info=True)
+        return {}
+
+
+def _watch_model_version(interval: float):
+    from ml_model.classifier import classifier
+    from ml_model.paths import CURRENT_VERSION_FILE
+
+    last_mtime = None
+    while True:
+        time.sleep(interval)
+        try:
+            mtime = os.path.getmtime(CURRENT_VERSION_FILE) if os.path.exists(CURRENT_VERSION_FILE) else None
+            if mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            classifier.reload(warmup_rounds=getattr(settings, 'CLASSIFIER_WARMUP_ROUNDS', 2))
+        except Exception as e:
+            # Keep serving the current model; the next change retries
+            logger.error(f"Model reload failed: {str(e)}", exc_info=True)
+
+
+def start_model_watcher():
+    """Reload the classifier in the background whenever the active version changes"""
+    interval = getattr(settings, 'MODEL_RELOAD_POLL_INTERVAL', None)
+    if not interval:
+        return None
+    thread = threading.Thread(
+        target=_watch_model_version,
+        args=(interval,),
+        name='model-version-watcher',
+        daemon=True
+    )
+    thread.start()
+    return thread
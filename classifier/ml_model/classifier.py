@@ -6,15 +6,54 @@ from transformers import (
     AutoModelForSequenceClassification
 )
 from functools import lru_cache
-from typing import Dict, Union
+from typing import Any, Dict, NamedTuple, Union
 from collections import Counter
+import hashlib
+import itertools
+import os
+import sys
+import threading
+import time
 import logging
 
+from django.conf import settings
+
+from .fallback import FALLBACK_MODEL_PATH, FallbackClassifier
+from .memory import MemoryStats
+from .paths import (
+    CURRENT_VERSION_FILE, LABEL_ENCODER_PATH, MODEL_DIR, MODEL_VERSIONS_DIR,
+    current_model_paths, weight_files
+)
+from .preprocess import TextPreprocessor
+from .standin import stand_in_components
+
 logger = logging.getLogger(__name__)
 
+class ModelBundle(NamedTuple):
+    """Everything one model version needs, swapped in as a single unit"""
+    tokenizer: Any
+    model: Any
+    label_encoder: Any
+    version: str
+    name: str
+
+
 class WebsiteClassifier:
     _instance = None
 
+    # Documents with at least this many words are tokenized in batches
+    batch_tokenize_min_words = 2000
+    batch_tokenize_size = 4096
+
+    # Inputs are padded to the smallest bucket that fits them
+    length_buckets = (128, 256, 512)
+
+    # Boilerplate and low-information text is removed before chunking; None disables
+    preprocessor = TextPreprocessor()
+
+    # Chunks are run together while rows x padded length stays within this
+    max_batch_tokens = 2048
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(WebsiteClassifier, cls).__new__(cls)
@@ -26,101 +65,397 @@ class WebsiteClassifier:
             return
         self._initialized = True
         self.device = self._get_device()
-        self.tokenizer = None
-        self.model = None
-        self.label_encoder = None
+        self._bundle = None
+        self._reload_lock = threading.Lock()
+        self.ready = False
+        self.warmup_timings = {}
+        self.fallback = None
+        self.memory = MemoryStats()
+        # Per-thread input tensors, reused across requests
+        self._local = threading.local()
+        # Start times of full-model predictions currently running
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self._request_ids = itertools.count()
         self._load_components()
 
     def _get_device(self) -> str:
         """Determine the best available device"""
         return "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu"
 
+    # The active bundle's parts, for callers outside a single prediction
+    @property
+    def tokenizer(self):
+        return self._bundle.tokenizer
+
+    @property
+    def model(self):
+        return self._bundle.model
+
+    @property
+    def label_encoder(self):
+        return self._bundle.label_encoder
+
+    @property
+    def model_version(self) -> str:
+        return self._bundle.version
+
+    @property
+    def model_name(self) -> str:
+        return self._bundle.name
+
     def _load_components(self):
         """Load all necessary components"""
         try:
-            # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                "distilbert-base-uncased",
-                use_fast=True
-            )
+            if getattr(settings, 'CLASSIFIER_BACKEND', 'model') == 'stand-in':
+                self.use_components(
+                    *stand_in_components(current_model_paths()[2], getattr(settings, 'CLASSIFIER_STAND_IN_MS_PER_TOKEN', 0)),
+                    name="stand-in"
+                )
+            else:
+                self._bundle = self._load_bundle(*current_model_paths())
+            logger.info(f"Model components loaded successfully (version {self.model_version})")
+        except Exception as e:
+            logger.error(f"Failed to load components: {str(e)}")
+            raise
+        self._load_fallback()
+
+    def _load_bundle(self, name: str, model_dir: str, label_encoder_path: str) -> ModelBundle:
+        """Load one model version without touching the one being served"""
+        tokenizer = AutoTokenizer.from_pretrained(
+            "distilbert-base-uncased",
+            use_fast=True
+        )
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_dir,
+            device_map="auto",
+            torch_dtype=torch.float16 if "cuda" in self.device else torch.float32
+        ).to(self.device)
+        label_encoder = joblib.load(label_encoder_path)
+        return ModelBundle(
+            tokenizer=tokenizer,
+            model=model,
+            label_encoder=label_encoder,
+            version=self._compute_version(model_dir, label_encoder_path),
+            name=name
+        )
+
+    def reload(self, force: bool = False, warmup_rounds: int = 2) -> bool:
+        """Load the model named by CURRENT, warm it and switch to it atomically.
 
-            # Load model
-            self.model = AutoModelForSequenceClassification.from_pretrained(
-                "ml_model/website_classifier",
-                device_map="auto",
-                torch_dtype=torch.float16 if "cuda" in self.device else torch.float32
-            ).to(self.device)
+        Requests already running finish on the bundle they started with; the
+        old model is freed once they have. Returns whether a switch happened.
+        """
+        with self._reload_lock:
+            name, model_dir, label_encoder_path = current_model_paths()
+            if not force and self._compute_version(model_dir, label_encoder_path) == self.model_version:
+                return False
+            bundle = self._load_bundle(name, model_dir, label_encoder_path)
+            if warmup_rounds:
+                self._warm_bundle(bundle, warmup_rounds)
+            previous, self._bundle = self._bundle, bundle
+        logger.info(f"Switched model from {previous.version} ({previous.name}) to {bundle.version} ({bundle.name})")
+        return True
 
-            # Load label encoder - you'll need to provide this file
-            self.label_encoder = joblib.load('ml_model/label_encoder.joblib')
+    def use_components(self, tokenizer, model, label_encoder, name: str, version: str = None):
+        """Serve an in-memory tokenizer/model/label encoder, e.g. a stand-in for load tests.
 
-            logger.info("Model components loaded successfully")
+        Replaces the current bundle the same way reload does; a later reload
+        goes back to the model on disk.
+        """
+        bundle = ModelBundle(
+            tokenizer=tokenizer,
+            model=model,
+            label_encoder=label_encoder,
+            version=version or name,
+            name=name
+        )
+        with self._reload_lock:
+            previous, self._bundle = self._bundle, bundle
+        if previous:
+            logger.info(f"Switched model from {previous.version} ({previous.name}) to {bundle.version} ({bundle.name})")
+
+    def _load_fallback(self):
+        """Load the distilled fallback model if one has been trained"""
+        if not os.path.exists(FALLBACK_MODEL_PATH):
+            logger.info("No fallback model found; overload will queue on the main model")
+            return
+        try:
+            self.fallback = FallbackClassifier.load(FALLBACK_MODEL_PATH)
+            if self.fallback.teacher_version != self.model_version:
+                logger.warning(
+                    f"Fallback model was distilled from {self.fallback.teacher_version}, "
+                    f"serving {self.model_version}"
+                )
         except Exception as e:
-            logger.error(f"Failed to load components: {str(e)}")
-            raise
+            logger.error(f"Failed to load fallback model: {str(e)}")
+
+    def _bucket_length(self, length: int) -> int:
+        """Smallest configured bucket that holds length tokens"""
+        for bucket in self.length_buckets:
+            if length <= bucket:
+                return bucket
+        return self.length_buckets[-1]
+
+    def warm_up(self, rounds: int = 2) -> Dict[str, float]:
+        """Run every input shape inference uses through the model before serving traffic"""
+        timings = self._warm_bundle(self._bundle, rounds)
+        self.warmup_timings = timings
+        self.ready = True
+        logger.info(f"Model warm-up finished: {timings} ms per rows x length")
+        return timings
 
-    def _chunk_text(self, text: str, max_tokens: int = 400) -> list:
-        """Split text into token-limited chunks"""
-        words = text.split()
+    def _warmup_shapes(self) -> list:
+        """(rows, length) of a single chunk and of a full batch in every length bucket.
+
+        These are the shapes _batches produces for short pages and for the
+        bulk of long ones; only the last batch of a long page is smaller.
+        """
+        return [
+            (rows, bucket)
+            for bucket in self.length_buckets
+            for rows in sorted({1, max(1, self.max_batch_tokens // bucket)})
+        ]
+
+    def _warm_bundle(self, bundle: ModelBundle, rounds: int) -> Dict[str, float]:
+        """Time each warm-up shape through a bundle's model"""
+        timings = {}
+        fill_id = bundle.tokenizer.unk_token_id or 0
+        with torch.no_grad():
+            for rows, bucket in self._warmup_shapes():
+                input_ids = torch.full((rows, bucket), fill_id, dtype=torch.long, device=self.device)
+                attention_mask = torch.ones_like(input_ids)
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    bundle.model(input_ids=input_ids, attention_mask=attention_mask)
+                    if "cuda" in self.device:
+                        torch.cuda.synchronize()
+                    # Keep the last (steady-state) timing per shape
+                    timings[f"{rows}x{bucket}"] = round((time.perf_counter() - start) * 1000, 2)
+        return timings
+
+    def _compute_version(self, model_dir: str, label_encoder_path: str) -> str:
+        """Fingerprint the model config, weights and label encoder on disk.
+
+        Weights are hashed by content rather than mtime so every host serving
+        the same files reports the same version.
+        """
+        digest = hashlib.sha256()
+        for path in [os.path.join(model_dir, "config.json"), *weight_files(model_dir), label_encoder_path]:
+            if os.path.exists(path):
+                digest.update(os.path.basename(path).encode())
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+        return digest.hexdigest()[:12]
+
+    def _word_token_counts(self, words: list, tokenizer, deadline: float = None) -> Dict[str, int]:
+        """Count tokens for each distinct word, batching long documents.
+
+        Stops early once the deadline (a time.monotonic() value) passes, so
+        later words may be missing from the result.
+        """
+        unique_words = list(dict.fromkeys(words))
+        if len(words) < self.batch_tokenize_min_words or not tokenizer.is_fast:
+            counts = {}
+            for i, word in enumerate(unique_words):
+                if deadline and i and i % 500 == 0 and time.monotonic() > deadline:
+                    break
+                counts[word] = len(tokenizer.tokenize(word))
+            return counts
+
+        # The fast tokenizer encodes a batch in parallel outside the GIL
+        counts = {}
+        for start in range(0, len(unique_words), self.batch_tokenize_size):
+            if deadline and start and time.monotonic() > deadline:
+                break
+            batch = unique_words[start:start + self.batch_tokenize_size]
+            encoded = tokenizer(batch, add_special_tokens=False)["input_ids"]
+            counts.update(zip(batch, map(len, encoded)))
+        return counts
+
+    def _chunk_text(self, words: list, tokenizer, max_tokens: int = 400, deadline: float = None,
+                    max_total_tokens: int = None) -> tuple:
+        """Split words into token-limited chunks, as (start, end) word ranges.
+
+        Returns (chunks, tokens counted, deadline exceeded, capped); capped is
+        set when max_total_tokens cut the document short.
+        """
+        token_counts = self._word_token_counts(words, tokenizer, deadline)
         chunks = []
-        current_chunk = []
+        chunk_start = 0
         current_length = 0
+        total_tokens = 0
+        deadline_exceeded = capped = False
 
-        for word in words:
-            word_tokens = len(self.tokenizer.tokenize(word))
-            if current_length + word_tokens > max_tokens:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = [word]
-                current_length = word_tokens
-            else:
-                current_chunk.append(word)
-                current_length += word_tokens
-
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-
-        return chunks
-
-    def _predict_chunk(self, chunk: str) -> Dict[str, float]:
-        """Predict a single text chunk"""
-        inputs = self.tokenizer(
-            chunk,
-            return_tensors="pt",
-            truncation=True,
-            max_length=512,
-            padding="max_length"
-        ).to(self.device)
+        for i, word in enumerate(words):
+            word_tokens = token_counts.get(word)
+            if word_tokens is None:
+                # Ran out of time counting tokens; chunk what was counted
+                words_end = i
+                deadline_exceeded = True
+                break
+            if max_total_tokens and total_tokens + word_tokens > max_total_tokens:
+                words_end = i
+                capped = True
+                break
+            if current_length + word_tokens > max_tokens and i > chunk_start:
+                chunks.append((chunk_start, i))
+                chunk_start = i
+                current_length = 0
+            current_length += word_tokens
+            total_tokens += word_tokens
+        else:
+            words_end = len(words)
+
+        if words_end > chunk_start:
+            chunks.append((chunk_start, words_end))
+
+        return chunks, total_tokens, deadline_exceeded, capped
+
+    def _input_buffers(self, rows: int, length: int) -> tuple:
+        """Input tensors for this thread, reused for every batch of the same shape"""
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        if (rows, length) not in buffers:
+            buffers[(rows, length)] = (
+                torch.empty((rows, length), dtype=torch.long, device=self.device),
+                torch.empty((rows, length), dtype=torch.long, device=self.device)
+            )
+        return buffers[(rows, length)]
+
+    def _predict_batch(self, encoded: list, bundle: ModelBundle) -> tuple:
+        """Predict tokenized chunks in one forward pass; also returns tensor bytes used"""
+        length = self._bucket_length(max(map(len, encoded)))
+        input_ids, attention_mask = self._input_buffers(len(encoded), length)
+        input_ids.fill_(bundle.tokenizer.pad_token_id or 0)
+        attention_mask.zero_()
+        for row, ids in enumerate(encoded):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
 
         with torch.no_grad():
-            outputs = self.model(**inputs)
-            probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            pred_idx = torch.argmax(probs).item()
-            confidence = probs[0][pred_idx].item()
-
-        return {
-            "label_index": pred_idx,
-            "confidence": confidence
-        }
-
-    def predict(self, text: str) -> Dict[str, Union[str, float]]:
-        """Main prediction method with chunking and majority voting"""
+            logits = bundle.model(input_ids=input_ids, attention_mask=attention_mask).logits
+            probs = torch.nn.functional.softmax(logits, dim=-1)
+            confidences, indices = probs.max(dim=-1)
+
+        tensor_bytes = sum(t.element_size() * t.nelement() for t in (input_ids, attention_mask, logits, probs))
+        results = [
+            {"label_index": index, "confidence": confidence}
+            for index, confidence in zip(indices.tolist(), confidences.tolist())
+        ]
+        return results, tensor_bytes
+
+    def _batches(self, encoded: list) -> list:
+        """Group tokenized chunks so each batch stays within max_batch_tokens"""
+        batches, batch = [], []
+        for ids in encoded:
+            length = self._bucket_length(max([len(ids)] + [len(other) for other in batch]))
+            if batch and (len(batch) + 1) * length > self.max_batch_tokens:
+                batches.append(batch)
+                batch = []
+            batch.append(ids)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _select_chunks(self, chunks: list, max_chunks: int = None) -> list:
+        """Pick at most max_chunks chunks spread evenly across the document"""
+        if not max_chunks or len(chunks) <= max_chunks:
+            return chunks
+        step = len(chunks) / max_chunks
+        return [chunks[int(i * step)] for i in range(max_chunks)]
+
+    def overloaded(self, max_in_flight: int = None, latency_budget_ms: float = None) -> bool:
+        """Whether too many full predictions are running, or the oldest is over budget"""
+        with self._in_flight_lock:
+            if not self._in_flight:
+                return False
+            if max_in_flight and len(self._in_flight) >= max_in_flight:
+                return True
+            oldest = min(self._in_flight.values())
+        return bool(latency_budget_ms) and (time.monotonic() - oldest) * 1000 > latency_budget_ms
+
+    def classify(self, text: str, max_chunks: int = None, max_in_flight: int = None,
+                 latency_budget_ms: float = None, deadline: float = None,
+                 max_tokens: int = None) -> Dict[str, Union[str, float]]:
+        """Predict with the main model, or the fallback model when overloaded or out of time"""
+        out_of_time = deadline is not None and time.monotonic() > deadline
+        if self.fallback is not None and (out_of_time or self.overloaded(max_in_flight, latency_budget_ms)):
+            try:
+                result = self.fallback.predict(text)
+            except Exception as e:
+                logger.error(f"Fallback prediction failed: {str(e)}")
+                result = {"error": f"Prediction error: {str(e)}"}
+            result["mode"] = "fallback"
+            return result
+        result = self.predict(text, max_chunks, deadline, max_tokens)
+        result["mode"] = "full"
+        return result
+
+    def predict(self, text: str, max_chunks: int = None, deadline: float = None,
+                max_tokens: int = None) -> Dict[str, Union[str, float]]:
+        """Main prediction method with chunking and majority voting.
+
+        With a deadline (a time.monotonic() value), remaining work is skipped
+        once it passes and the vote covers the chunks evaluated so far; at
+        least one chunk is always evaluated. max_tokens caps how much of the
+        preprocessed document is tokenized at all.
+        """
         if not text.strip():
             return {"error": "Empty input text"}
 
+        request_id = next(self._request_ids)
+        with self._in_flight_lock:
+            self._in_flight[request_id] = time.monotonic()
+        # One bundle for the whole request, even if a reload swaps it meanwhile
+        bundle = self._bundle
         try:
+            if self.preprocessor is not None:
+                text, _ = self.preprocessor(text)
+            text_bytes = sys.getsizeof(text)
+
             # Chunk the text
-            chunks = self._chunk_text(text)
-            if not chunks:
+            words = text.split()
+            del text
+            truncated = False
+            if max_tokens and len(words) > max_tokens:
+                # Every word is at least one token, so these could never fit under the cap
+                del words[max_tokens:]
+                truncated = True
+            all_chunks, total_tokens, deadline_exceeded, capped = self._chunk_text(
+                words, bundle.tokenizer, deadline=deadline, max_total_tokens=max_tokens
+            )
+            if not all_chunks:
                 return {"error": "No valid chunks after processing"}
+            chunks = self._select_chunks(all_chunks, max_chunks)
+            truncated = truncated or capped
 
-            # Process chunks in batches
+            # Only the selected ranges are joined back into strings
+            encoded = [
+                bundle.tokenizer(" ".join(words[start:end]), truncation=True, max_length=512)["input_ids"]
+                for start, end in chunks
+            ]
             predictions = []
             confidences = []
-            
-            for chunk in chunks:
-                result = self._predict_chunk(chunk)
-                predictions.append(result["label_index"])
-                confidences.append(result["confidence"])
+            peak_tensor_bytes = 0
+
+            for batch in self._batches(encoded):
+                if predictions and deadline and time.monotonic() > deadline:
+                    deadline_exceeded = True
+                    break
+                results, tensor_bytes = self._predict_batch(batch, bundle)
+                peak_tensor_bytes = max(peak_tensor_bytes, tensor_bytes)
+                for result in results:
+                    predictions.append(result["label_index"])
+                    confidences.append(result["confidence"])
+
+            self.memory.record(
+                text_bytes + sys.getsizeof(words) + peak_tensor_bytes,
+                total_tokens,
+                truncated or deadline_exceeded
+            )
 
             # Majority voting with confidence weighting
             majority_idx = Counter(predictions).most_common(1)[0][0]
@@ -130,17 +465,24 @@ class WebsiteClassifier:
             ])
 
             # Decode label
-            category = self.label_encoder.inverse_transform([majority_idx])[0]
+            category = bundle.label_encoder.inverse_transform([majority_idx])[0]
 
             return {
                 "category": category,
                 "confidence": round(avg_confidence, 4),
-                "chunks_processed": len(chunks)
+                "chunks_processed": len(predictions),
+                "chunks_total": len(all_chunks),
+                "deadline_exceeded": deadline_exceeded,
+                "truncated": truncated,
+                "model_version": bundle.version
             }
 
         except Exception as e:
             logger.error(f"Prediction failed: {str(e)}")
             return {"error": f"Prediction error: {str(e)}"}
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[request_id]
 
 # Singleton instance
 classifier = WebsiteClassifier()
\ No newline at end of file
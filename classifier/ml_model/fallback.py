@@ -0,0 +1,64 @@
+import hashlib
+import logging
+from typing import Dict, Union
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_MODEL_PATH = "ml_model/fallback_model.joblib"
+
+
+class FallbackClassifier:
+    """Hashed word n-gram linear model distilled from the main classifier.
+
+    Orders of magnitude cheaper than DistilBERT and somewhat less accurate;
+    used when the main model is saturated.
+    """
+
+    def __init__(self, n_features: int = 2 ** 20):
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm="l2"
+        )
+        self.model = SGDClassifier(loss="log_loss", alpha=1e-5, max_iter=20, tol=None)
+        self.teacher_version = None
+        self.version = None
+
+    def train(self, texts: list, labels: list, teacher_version: str = None):
+        """Fit on texts labelled by the main model"""
+        self.model.fit(self.vectorizer.transform(texts), labels)
+        self.teacher_version = teacher_version
+        digest = hashlib.sha256(repr((teacher_version, len(texts), sorted(set(labels)))).encode())
+        self.version = f"fallback-{digest.hexdigest()[:8]}"
+        return self
+
+    def agreement(self, texts: list, labels: list) -> float:
+        """Fraction of texts where this model agrees with the given labels"""
+        predicted = self.model.predict(self.vectorizer.transform(texts))
+        return float(np.mean(predicted == np.asarray(labels)))
+
+    def predict(self, text: str) -> Dict[str, Union[str, float]]:
+        """Same result shape as WebsiteClassifier.predict"""
+        if not text.strip():
+            return {"error": "Empty input text"}
+        probs = self.model.predict_proba(self.vectorizer.transform([text]))[0]
+        best = int(np.argmax(probs))
+        return {
+            "category": str(self.model.classes_[best]),
+            "confidence": round(float(probs[best]), 4),
+            "chunks_processed": 1,
+            "chunks_total": 1
+        }
+
+    def save(self, path: str = FALLBACK_MODEL_PATH):
+        joblib.dump(self, path)
+
+    @classmethod
+    def load(cls, path: str = FALLBACK_MODEL_PATH) -> "FallbackClassifier":
+        return joblib.load(path)
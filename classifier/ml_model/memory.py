@@ -0,0 +1,47 @@
+import threading
+from typing import Dict
+
+import torch
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def process_peak_rss_bytes() -> int:
+    """Highest resident set size this process has reached"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryStats:
+    """High-water marks of per-request memory, as estimated by the classifier"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.truncated_requests = 0
+        self.peak_request_bytes = 0
+        self.peak_request_tokens = 0
+
+    def record(self, request_bytes: int, tokens: int, truncated: bool):
+        with self._lock:
+            self.requests += 1
+            self.truncated_requests += truncated
+            self.peak_request_bytes = max(self.peak_request_bytes, request_bytes)
+            self.peak_request_tokens = max(self.peak_request_tokens, tokens)
+
+    def snapshot(self, device: str) -> Dict[str, int]:
+        stats = {
+            'requests': self.requests,
+            'truncated_requests': self.truncated_requests,
+            'peak_request_bytes': self.peak_request_bytes,
+            'peak_request_tokens': self.peak_request_tokens,
+            'process_peak_rss_bytes': process_peak_rss_bytes()
+        }
+        if 'cuda' in device:
+            stats['cuda_peak_allocated_bytes'] = torch.cuda.max_memory_allocated()
+        return stats
@@ -0,0 +1,35 @@
+"""Where model versions live on disk, importable without loading a model"""
+import os
+
+MODEL_DIR = "ml_model/website_classifier"
+LABEL_ENCODER_PATH = "ml_model/label_encoder.joblib"
+
+# Versioned layout: ml_model/versions/<name>/ holds the model files and
+# label_encoder.joblib, and CURRENT names the active directory. Without it
+# the single MODEL_DIR / LABEL_ENCODER_PATH pair above is used.
+MODEL_VERSIONS_DIR = "ml_model/versions"
+CURRENT_VERSION_FILE = os.path.join(MODEL_VERSIONS_DIR, "CURRENT")
+
+# Weight files (including shards) that take part in the version fingerprint
+WEIGHT_FILE_SUFFIXES = (".safetensors", ".bin")
+
+
+def current_model_paths():
+    """(name, model dir, label encoder path) of the model that should be served"""
+    if os.path.exists(CURRENT_VERSION_FILE):
+        with open(CURRENT_VERSION_FILE) as f:
+            name = f.read().strip()
+        if name:
+            model_dir = os.path.join(MODEL_VERSIONS_DIR, name)
+            return name, model_dir, os.path.join(model_dir, "label_encoder.joblib")
+    return "default", MODEL_DIR, LABEL_ENCODER_PATH
+
+
+def weight_files(model_dir: str) -> list:
+    """Sorted paths of the weight files in a model directory"""
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(
+        os.path.join(model_dir, entry) for entry in os.listdir(model_dir)
+        if entry.endswith(WEIGHT_FILE_SUFFIXES)
+    )
@@ -0,0 +1,150 @@
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Short lines matching these are navigation, consent or footer boilerplate
+BOILERPLATE_PATTERN = re.compile(
+    r"\b(cookies?|privacy policy|terms of (use|service)|all rights reserved|"
+    r"subscribe|newsletter|sign (in|up)|log ?in|skip to (main )?content|"
+    r"accept all|share (on|this)|follow us|copyright|menu|back to top|"
+    # German, French, Spanish, Italian, Portuguese, Dutch
+    r"datenschutz(erklärung)?|impressum|anmelden|alle rechte vorbehalten|nach oben|"
+    r"politique de confidentialité|mentions légales|tous droits réservés|se connecter|connexion|s'abonner|"
+    r"política de privacidad|aviso legal|todos los derechos reservados|iniciar sesión|suscríbete|"
+    r"informativa sulla privacy|tutti i diritti riservati|accedi|iscriviti|"
+    r"política de privacidade|todos os direitos reservados|"
+    r"alle rechten voorbehouden|inloggen|aanmelden)\b",
+    re.IGNORECASE
+)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Unicode name prefixes written together with another script
+SCRIPT_GROUPS = {"HIRAGANA": "CJK", "KATAKANA": "CJK"}
+SCRIPT_SAMPLE_LETTERS = 64
+# Scripts written without spaces, with roughly this many characters per word
+UNSPACED_SCRIPTS = {"CJK": 2}
+
+
+def line_script(line: str):
+    """Writing system most of a line's letters belong to, e.g. LATIN or CJK"""
+    scripts = Counter()
+    letters = 0
+    for char in line:
+        if char.isalpha():
+            script = unicodedata.name(char, "").split(" ", 1)[0]
+            scripts[SCRIPT_GROUPS.get(script, script)] += 1
+            letters += 1
+            if letters >= SCRIPT_SAMPLE_LETTERS:
+                break
+    return scripts.most_common(1)[0][0] if scripts else None
+
+
+class TextPreprocessor:
+    """Strip boilerplate and low-information text before chunking.
+
+    Lines are Unicode-normalized, deduplicated and dropped when they are short
+    boilerplate in one of the common European languages. Short lines in a
+    writing system other than the page's dominant one (language switchers,
+    leftover navigation) are dropped too; longer ones are kept, so bilingual
+    pages survive. The remaining words are scored in fixed windows; windows
+    with few letter-bearing words or little vocabulary (link lists, tables
+    of numbers, repeated tokens) are dropped. Output is capped at max_words.
+    """
+
+    def __init__(self, max_words: int = 20000, boilerplate_max_words: int = 12,
+                 window: int = 40, min_alpha_ratio: float = 0.5, min_unique_ratio: float = 0.25):
+        self.max_words = max_words
+        self.boilerplate_max_words = boilerplate_max_words
+        self.window = window
+        self.min_alpha_ratio = min_alpha_ratio
+        self.min_unique_ratio = min_unique_ratio
+        self._lock = threading.Lock()
+        self.words_in = 0
+        self.words_out = 0
+
+    def __call__(self, text: str) -> Tuple[str, Dict[str, int]]:
+        lines, stats = self._clean_lines(text)
+        lines, stats["foreign_script_lines"] = self._drop_foreign_lines(lines)
+        words = " ".join(lines).split()
+        words, stats["low_info_windows"] = self._drop_low_info(words)
+        stats["capped_words"] = max(0, len(words) - self.max_words)
+        words = words[:self.max_words]
+
+        stats["words_out"] = len(words)
+        if not words:
+            # Never hand the model nothing; keep the normalized original instead
+            words = WHITESPACE_PATTERN.sub(" ", text).split()[:self.max_words]
+            stats["words_out"] = len(words)
+        with self._lock:
+            self.words_in += stats["words_in"]
+            self.words_out += stats["words_out"]
+        return " ".join(words), stats
+
+    def _clean_lines(self, text: str):
+        seen = set()
+        kept = []
+        stats = {"words_in": 0, "duplicate_lines": 0, "boilerplate_lines": 0}
+        for line in unicodedata.normalize("NFKC", text).splitlines():
+            line = WHITESPACE_PATTERN.sub(" ", line).strip()
+            if not line:
+                continue
+            word_count = line.count(" ") + 1
+            stats["words_in"] += word_count
+            key = line.casefold()
+            if key in seen:
+                stats["duplicate_lines"] += 1
+                continue
+            seen.add(key)
+            if word_count <= self.boilerplate_max_words and BOILERPLATE_PATTERN.search(line):
+                stats["boilerplate_lines"] += 1
+                continue
+            kept.append(line)
+        return kept, stats
+
+    def _drop_foreign_lines(self, lines: list):
+        """Drop short lines whose script differs from the one most of the text is in"""
+        scripts = [line_script(line) for line in lines]
+        sizes = [
+            max(1, len(line) // UNSPACED_SCRIPTS[script]) if script in UNSPACED_SCRIPTS else line.count(" ") + 1
+            for line, script in zip(lines, scripts)
+        ]
+        weights = Counter()
+        for script, size in zip(scripts, sizes):
+            weights[script] += size
+        weights.pop(None, None)
+        if len(weights) < 2:
+            return lines, 0
+        dominant = weights.most_common(1)[0][0]
+        kept = [
+            line for line, script, size in zip(lines, scripts, sizes)
+            if script in (None, dominant) or size > self.boilerplate_max_words
+        ]
+        return kept, len(lines) - len(kept)
+
+    def _drop_low_info(self, words: list):
+        """Drop whole windows whose words are mostly non-letters or repeats"""
+        if len(words) < self.window:
+            return words, 0
+        has_alpha = np.fromiter((any(c.isalpha() for c in w) for w in words), dtype=bool, count=len(words))
+        starts = np.arange(0, len(words), self.window)
+        sizes = np.diff(np.append(starts, len(words)))
+        alpha_ratio = np.add.reduceat(has_alpha, starts) / sizes
+        unique_ratio = np.array([
+            len({w.casefold() for w in words[start:start + self.window]}) for start in starts
+        ]) / sizes
+        # A short trailing window is judged on letters only
+        unique_ratio[sizes < self.window] = 1.0
+        keep = (alpha_ratio >= self.min_alpha_ratio) & (unique_ratio >= self.min_unique_ratio)
+        if keep.all():
+            return words, 0
+        kept = [w for start, ok in zip(starts, keep) if ok for w in words[start:start + self.window]]
+        return kept, int((~keep).sum())
+
+    def stats(self) -> Dict[str, float]:
+        """Words seen and passed on since start, and the fraction saved"""
+        saved = 1 - self.words_out / self.words_in if self.words_in else 0.0
+        return {"words_in": self.words_in, "words_out": self.words_out, "saved_ratio": round(saved, 4)}
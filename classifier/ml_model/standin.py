@@ -0,0 +1,85 @@
+import os
+import re
+import time
+import zlib
+from types import SimpleNamespace
+from typing import List
+
+import joblib
+import torch
+
+# Roughly the shape of WordPiece output: runs of letters/digits split into
+# pieces of at most this many characters, punctuation on its own
+PIECE_PATTERN = re.compile(r"[^\W_]{1,6}|[^\w\s]|_")
+VOCAB_SIZE = 30522
+CLS_ID, SEP_ID, PAD_ID, UNK_ID = 101, 102, 0, 100
+
+
+class StandInTokenizer:
+    """Deterministic tokenizer with the parts of the HF interface the classifier uses"""
+
+    is_fast = True
+    pad_token_id = PAD_ID
+    unk_token_id = UNK_ID
+
+    def tokenize(self, text: str) -> List[str]:
+        return PIECE_PATTERN.findall(text.lower())
+
+    def _ids(self, text: str, add_special_tokens: bool, max_length: int = None) -> List[int]:
+        ids = [1000 + zlib.crc32(piece.encode()) % (VOCAB_SIZE - 1000) for piece in self.tokenize(text)]
+        if add_special_tokens:
+            ids = [CLS_ID] + ids + [SEP_ID]
+        if max_length and len(ids) > max_length:
+            ids = ids[:max_length - 1] + ids[-1:]
+        return ids
+
+    def __call__(self, text, add_special_tokens: bool = True, truncation: bool = False, max_length: int = None):
+        max_length = max_length if truncation else None
+        if isinstance(text, str):
+            return {"input_ids": self._ids(text, add_special_tokens, max_length)}
+        return {"input_ids": [self._ids(t, add_special_tokens, max_length) for t in text]}
+
+
+class StandInModel:
+    """Deterministic sequence classifier that costs a configurable time per token.
+
+    The predicted label depends only on the input ids, so the same page
+    always lands in the same category. The simulated cost is slept off,
+    releasing the GIL the way torch inference largely does.
+    """
+
+    def __init__(self, num_labels: int, ms_per_token: float = 0.05):
+        self.num_labels = num_labels
+        self.ms_per_token = ms_per_token
+
+    def __call__(self, input_ids, attention_mask):
+        if self.ms_per_token:
+            time.sleep(input_ids.numel() * self.ms_per_token / 1000)
+        labels = (input_ids * attention_mask).sum(dim=1) % self.num_labels
+        logits = torch.zeros((input_ids.shape[0], self.num_labels), device=input_ids.device)
+        logits[torch.arange(input_ids.shape[0]), labels] = 4.0
+        return SimpleNamespace(logits=logits)
+
+
+class StandInLabelEncoder:
+    """Used when no trained label encoder is on disk"""
+
+    def __init__(self, classes: List[str]):
+        self.classes_ = list(classes)
+
+    def inverse_transform(self, indices) -> List[str]:
+        return [self.classes_[i] for i in indices]
+
+
+def stand_in_components(label_encoder_path: str = None, ms_per_token: float = 0.05):
+    """(tokenizer, model, label encoder) of the stand-in, for WebsiteClassifier.use_components.
+
+    The real label encoder is used when it exists so categories match the
+    ones policies refer to.
+    """
+    if label_encoder_path and os.path.exists(label_encoder_path):
+        label_encoder = joblib.load(label_encoder_path)
+    else:
+        label_encoder = StandInLabelEncoder([f"Category {i}" for i in range(16)])
+    model = StandInModel(len(label_encoder.classes_), ms_per_token)
+    return StandInTokenizer(), model, label_encoder
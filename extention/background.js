@@ -5,9 +5,22 @@ const WHITELISTED_DOMAINS = [
   'duckduckgo.com'
 ];
 
+const CLASSIFY_URL = 'http://127.0.0.1:8000/api/classify/';
+const PRECHECK_URL = 'http://127.0.0.1:8000/api/classify/precheck/';
+
+// Client-side result cache, mirrored to chrome.storage so it survives
+// service worker restarts
+const RESULT_CACHE_KEY = 'classificationCache';
+const RESULT_CACHE_MAX_ENTRIES = 500;
+const RESULT_CACHE_DEFAULT_TTL = 300; // Seconds, when the server sends no hint
+
 // Initialize extension state
 let deviceId = null;
 let isRegistered = false;
+let resultCache = null; // domain -> { result, expiresAt, usedAt }
+let cachedModelVersion = null; // Server model version the cached verdicts came from
+const inFlight = new Map(); // domain -> pending classification promise
+let throttledUntil = 0; // Date.now() before which the server asked us not to call again
 
 // Check if URL is whitelisted
 function isWhitelisted(url) {
@@ -22,44 +35,259 @@ chrome.runtime.onInstalled.addListener(async () => {
   deviceId = storage.deviceId || null;
 });
 
-// Handle content classification
-async function classifyContent(url, text) {
+// Approximate the registrable domain the server keys results by
+// (www.news.bbc.co.uk -> bbc.co.uk)
+function registrableDomain(url) {
+  let host;
+  try {
+    host = new URL(url).hostname;
+  } catch (error) {
+    host = url;
+  }
+  const labels = host.toLowerCase().replace(/\.$/, '').split('.');
+  if (labels.length <= 2) {
+    return labels.join('.');
+  }
+  // Two-label public suffixes such as co.uk or com.au
+  const secondLevel = labels[labels.length - 2];
+  const twoLabelSuffix = labels[labels.length - 1].length === 2 &&
+    ['co', 'com', 'net', 'org', 'ac', 'gov', 'edu'].includes(secondLevel);
+  return labels.slice(twoLabelSuffix ? -3 : -2).join('.');
+}
 
-  console.log('isRegistered:', isRegistered);
-  console.log('deviceId:', deviceId);
-  if (!isRegistered || isWhitelisted(url)) {
-    return { block: false };
+async function loadResultCache() {
+  if (resultCache === null) {
+    const stored = await chrome.storage.local.get(RESULT_CACHE_KEY);
+    resultCache = stored[RESULT_CACHE_KEY] || {};
   }
+  return resultCache;
+}
 
-  try {
-    const response = await fetch('http://127.0.0.1:8000/api/classify/', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        domain:url,
-        text_content:text,
-        device_id: deviceId
-      })
-    });
-
-    if (!response.ok) {
-      throw new Error(`API error: ${response.status}`);
+// Expired verdicts are kept until evicted so they can stand in while rate limited
+async function getCachedResult(domain, allowExpired = false) {
+  const cache = await loadResultCache();
+  const entry = cache[domain];
+  if (!entry || (entry.expiresAt <= Date.now() && !allowExpired)) {
+    return null;
+  }
+  entry.usedAt = Date.now();
+  return entry.result;
+}
+
+async function cacheResult(domain, result, ttlSeconds) {
+  const cache = await loadResultCache();
+  const now = Date.now();
+  cache[domain] = { result, expiresAt: now + ttlSeconds * 1000, usedAt: now };
+
+  // Beyond the bound, evict expired entries first, then the least recently used
+  const domains = Object.keys(cache);
+  if (domains.length > RESULT_CACHE_MAX_ENTRIES) {
+    const expired = key => (cache[key].expiresAt <= now ? 0 : 1);
+    domains
+      .sort((a, b) => expired(a) - expired(b) || cache[a].usedAt - cache[b].usedAt)
+      .slice(0, domains.length - RESULT_CACHE_MAX_ENTRIES)
+      .forEach(key => delete cache[key]);
+  }
+  await chrome.storage.local.set({ [RESULT_CACHE_KEY]: cache });
+}
+
+async function clearResultCache() {
+  resultCache = {};
+  await chrome.storage.local.remove(RESULT_CACHE_KEY);
+}
+
+// Cached verdicts are only valid for the model version that produced them
+async function checkModelVersion(version) {
+  if (!version) {
+    return;
+  }
+  if (cachedModelVersion === null) {
+    const stored = await chrome.storage.local.get('modelVersion');
+    cachedModelVersion = stored.modelVersion || null;
+  }
+  if (version === cachedModelVersion) {
+    return;
+  }
+  if (cachedModelVersion !== null) {
+    await clearResultCache();
+  }
+  cachedModelVersion = version;
+  await chrome.storage.local.set({ modelVersion: version });
+}
+
+// Seconds the server allows this result to be reused for
+function cacheTtl(response) {
+  const cacheControl = response.headers.get('Cache-Control') || '';
+  if (/no-store|no-cache/.test(cacheControl)) {
+    return 0;
+  }
+  const maxAge = cacheControl.match(/max-age=(\d+)/);
+  return maxAge ? parseInt(maxAge[1], 10) : RESULT_CACHE_DEFAULT_TTL;
+}
+
+// Give up on the backend after this long; the server is asked to answer
+// with a partial verdict a little earlier so the reply still arrives in time
+const REQUEST_TIMEOUT_MS = 3000;
+const SERVER_DEADLINE_MARGIN_MS = 500;
+
+// Waits for Retry-After before giving up on a domain with no verdict at all
+const MAX_THROTTLED_RETRIES = 2;
+const MAX_RETRY_AFTER_SECONDS = 30;
+
+class ThrottledError extends Error {
+  constructor(retryAfter) {
+    super(`Rate limited for ${retryAfter}s`);
+    this.retryAfter = retryAfter;
+  }
+}
+
+// Bodies smaller than this are sent uncompressed
+const COMPRESS_MIN_BYTES = 1024;
+
+async function encodeBody(payload) {
+  const body = JSON.stringify(payload);
+  if (body.length < COMPRESS_MIN_BYTES || typeof CompressionStream === 'undefined') {
+    return { body, headers: { 'Content-Type': 'application/json' } };
+  }
+  const stream = new Blob([body]).stream().pipeThrough(new CompressionStream('gzip'));
+  return {
+    body: await new Response(stream).arrayBuffer(),
+    headers: { 'Content-Type': 'application/json', 'Content-Encoding': 'gzip' }
+  };
+}
+
+// POST a payload and cache the verdict for as long as the server allows
+async function fetchVerdict(endpoint, domain, payload) {
+  const { body, headers } = await encodeBody(payload);
+  headers['X-Request-Deadline-Ms'] = String(REQUEST_TIMEOUT_MS - SERVER_DEADLINE_MARGIN_MS);
+  const response = await fetch(endpoint, {
+    method: 'POST',
+    headers,
+    body,
+    signal: AbortSignal.timeout(REQUEST_TIMEOUT_MS)
+  });
+
+  if (response.status === 429) {
+    const retryAfter = Math.min(
+      parseInt(response.headers.get('Retry-After'), 10) || 1,
+      MAX_RETRY_AFTER_SECONDS
+    );
+    throttledUntil = Math.max(throttledUntil, Date.now() + retryAfter * 1000);
+    throw new ThrottledError(retryAfter);
+  }
+  if (!response.ok) {
+    throw new Error(`API error: ${response.status}`);
+  }
+
+  const result = await response.json();
+  await checkModelVersion(response.headers.get('X-Model-Version'));
+  const ttl = cacheTtl(response);
+  if (ttl > 0) {
+    await cacheResult(domain, result, ttl);
+  }
+  return result;
+}
+
+// While rate limited, keep enforcing the last verdict for the domain, even an
+// expired one; without one, wait until Retry-After has passed and ask again
+async function whileThrottled(domain, request) {
+  for (let attempt = 0; ; attempt++) {
+    const wait = throttledUntil - Date.now();
+    if (wait > 0) {
+      const stale = await getCachedResult(domain, true);
+      if (stale) {
+        return stale;
+      }
+      if (attempt > MAX_THROTTLED_RETRIES) {
+        throw new Error('Still rate limited');
+      }
+      await new Promise(resolve => setTimeout(resolve, wait));
+    }
+    try {
+      return await request();
+    } catch (error) {
+      if (!(error instanceof ThrottledError)) {
+        throw error;
+      }
     }
+  }
+}
+
+async function requestPrecheck(domain, url) {
+  const cached = await getCachedResult(domain);
+  if (cached) {
+    return cached;
+  }
+
+  try {
+    return await whileThrottled(domain, () =>
+      fetchVerdict(PRECHECK_URL, domain, { domain: url, device_id: deviceId })
+    );
+  } catch (error) {
+    console.error('Precheck failed:', error);
+    return { need_content: true }; // Fall back to full classification
+  }
+}
+
+async function requestClassification(domain, url, sample) {
+  const cached = await getCachedResult(domain);
+  if (cached) {
+    return cached;
+  }
 
-    return await response.json();
+  try {
+    // Compact payload: the sample's fields replace text_content
+    return await whileThrottled(domain, () => fetchVerdict(CLASSIFY_URL, domain, {
+      domain: url,
+      device_id: deviceId,
+      ...sample
+    }));
   } catch (error) {
     console.error('Classification failed:', error);
-    return { block: false }; // Fail open
+    return { block: false }; // Fail open, without caching the failure
+  }
+}
+
+// Share one in-flight request per domain and stage across tabs
+function coalesce(key, request) {
+  if (!inFlight.has(key)) {
+    inFlight.set(key, request().finally(() => inFlight.delete(key)));
+  }
+  return inFlight.get(key);
+}
+
+// Cheap first stage: URL only, answered from blocklists and the domain index
+async function precheckDomain(url) {
+  if (!isRegistered || isWhitelisted(url)) {
+    return { need_content: false, block: false };
   }
+  const domain = registrableDomain(url);
+  return coalesce(`precheck:${domain}`, () => requestPrecheck(domain, url));
+}
+
+// Handle content classification
+async function classifyContent(url, sample) {
+  if (!isRegistered || isWhitelisted(url)) {
+    return { block: false };
+  }
+  const domain = registrableDomain(url);
+  return coalesce(`classify:${domain}`, () => requestClassification(domain, url, sample));
 }
 
 // Message handling
 chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
   switch (request.type) {
+    case 'precheckDomain':
+      precheckDomain(request.url)
+        .then(result => sendResponse(result))
+        .catch(error => {
+          console.error('Precheck error:', error);
+          sendResponse({ need_content: true });
+        });
+      return true; // Keep message channel open
+
     case 'classifyContent':
-      classifyContent(request.url, request.text)
+      classifyContent(request.url, request.sample)
         .then(result => sendResponse(result))
         .catch(error => {
           console.error('Classification error:', error);
@@ -70,6 +298,8 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
     case 'updateRegistration':
       isRegistered = request.registered;
       deviceId = request.deviceId;
+      // Cached verdicts belong to the previous device's policy
+      clearResultCache();
       sendResponse({ success: true });
       break;
 
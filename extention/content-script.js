@@ -1,11 +1,41 @@
-// Capture page text content
-function extractText() {
-  // Remove script and style elements
-  const elementsToRemove = document.querySelectorAll('script, style, noscript, iframe');
-  elementsToRemove.forEach(el => el.remove());
-  
-  // Get all text content
-  return document.body.innerText || '';
+// Bounds on the text sample sent for classification
+const MAX_SAMPLE_WORDS = 2000;
+const MAX_HEADINGS = 30;
+
+function uniqueLines(lines) {
+  const seen = new Set();
+  return lines
+    .map(line => line.replace(/\s+/g, ' ').trim())
+    .filter(line => line && !seen.has(line) && seen.add(line));
+}
+
+// Capture a compact, deduplicated sample of the page: title, description,
+// headings and the first words of visible text. innerText already skips
+// scripts, styles and hidden elements, so the page is left untouched.
+function extractSample() {
+  const description = document.querySelector('meta[name="description"], meta[property="og:description"]');
+  const headings = uniqueLines(
+    Array.from(document.querySelectorAll('h1, h2, h3'), heading => heading.innerText || '')
+  ).slice(0, MAX_HEADINGS);
+
+  const words = [];
+  const skip = new Set(headings);
+  for (const line of uniqueLines((document.body.innerText || '').split('\n'))) {
+    if (skip.has(line)) {
+      continue;
+    }
+    words.push(...line.split(' '));
+    if (words.length >= MAX_SAMPLE_WORDS) {
+      break;
+    }
+  }
+
+  return {
+    title: document.title || '',
+    description: description ? description.content || '' : '',
+    headings,
+    text: words.slice(0, MAX_SAMPLE_WORDS).join(' ')
+  };
 }
 
 // Check if URL is from a search engine
@@ -47,12 +77,28 @@ async function checkPage() {
     return;
   }
 
-  const text = extractText();
+  // Stage one runs at document_start with the URL alone
+  const precheck = await chrome.runtime.sendMessage({
+    type: 'precheckDomain',
+    url
+  });
+  if (!precheck.need_content) {
+    if (precheck.block) {
+      await blockPage();
+    }
+    return;
+  }
+
+  // Stage two needs the page text
+  if (document.readyState === 'loading') {
+    await new Promise(resolve => document.addEventListener('DOMContentLoaded', resolve, { once: true }));
+  }
+  const sample = extractSample();
   const response = await chrome.runtime.sendMessage({
     action: 'checkContent',
     type: 'classifyContent',
     url,
-    text
+    sample
   });
   
   if (response.block) {
@@ -60,9 +106,4 @@ async function checkPage() {
   }
 }
 
-// Run check when DOM starts loading
-if (document.readyState === 'loading') {
-  document.addEventListener('DOMContentLoaded', checkPage);
-} else {
-  checkPage();
-}
\ No newline at end of file
+checkPage();